@@ -0,0 +1,63 @@
+def asignacion_minima(costos):
+    """Resuelve el problema de asignación con el algoritmo húngaro.
+
+    ``costos`` es una matriz (lista de listas) de ``n`` filas y ``m`` columnas
+    con ``n <= m``.  Devuelve una lista de longitud ``n`` cuyo elemento ``i`` es
+    la columna asignada a la fila ``i``, sin repetir columnas y minimizando la
+    suma de costos.  El tiempo es O(n² · m).
+    """
+    n = len(costos)
+    if n == 0:
+        return []
+    m = len(costos[0])
+    if m < n:
+        raise ValueError("Se requieren al menos tantas columnas como filas")
+
+    infinito = float("inf")
+    u = [0] * (n + 1)
+    v = [0] * (m + 1)
+    # ``fila_de[j]`` es la fila (empezando en 1) asignada a la columna ``j``.
+    fila_de = [0] * (m + 1)
+    camino = [0] * (m + 1)
+    for i in range(1, n + 1):
+        fila_de[0] = i
+        j0 = 0
+        minimos = [infinito] * (m + 1)
+        usadas = [False] * (m + 1)
+        while True:
+            usadas[j0] = True
+            i0 = fila_de[j0]
+            fila = costos[i0 - 1]
+            delta = infinito
+            j1 = 0
+            for j in range(1, m + 1):
+                if usadas[j]:
+                    continue
+                actual = fila[j - 1] - u[i0] - v[j]
+                if actual < minimos[j]:
+                    minimos[j] = actual
+                    camino[j] = j0
+                if minimos[j] < delta:
+                    delta = minimos[j]
+                    j1 = j
+            for j in range(m + 1):
+                if usadas[j]:
+                    u[fila_de[j]] += delta
+                    v[j] -= delta
+                else:
+                    minimos[j] -= delta
+            j0 = j1
+            if fila_de[j0] == 0:
+                break
+        while True:
+            j1 = camino[j0]
+            fila_de[j0] = fila_de[j1]
+            j0 = j1
+            if j0 == 0:
+                break
+
+    asignacion = [0] * n
+    for j in range(1, m + 1):
+        if fila_de[j]:
+            asignacion[fila_de[j] - 1] = j - 1
+    return asignacion
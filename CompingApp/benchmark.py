@@ -0,0 +1,389 @@
+"""Mediciones de rendimiento de las rutas críticas de CompingApp.
+
+Uso::
+
+    python benchmark.py                       # suite completa, 8 a 2048 compases
+    python benchmark.py --rapido              # tamaños reducidos
+    python benchmark.py --salida base.json
+    python benchmark.py --salida nuevo.json --comparar base.json
+
+Los cifrados y las referencias son sintéticos y se generan con una semilla
+fija, de modo que dos ejecuciones miden exactamente el mismo trabajo.  Los
+resultados se guardan como JSON para comparar commits entre sí.  No requiere Tk
+ni puertos MIDI; ``procesa_midi`` con el archivo de referencia solo se mide si
+``pretty_midi`` está instalado.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import cifrado_utils
+import procesa_midi as pm
+from cifrado_utils import analizar_cifrado
+from escritor_midi import codificar_midi, leer_cabecera
+from notas_columnares import NotasColumnares
+from procesa_midi import (
+    Spread,
+    aplicar_rotaciones,
+    compilar_plantilla,
+    enlazar_notas,
+    notas_midi_acorde,
+    reordenar_ventanas,
+    voicear_notas,
+    voicear_plantilla,
+)
+
+COMPASES = (8, 32, 128, 512, 2048)
+COMPASES_RAPIDO = (8, 32, 128)
+DENSIDADES = (1, 2, 4)
+VOCES = (4, 6, 8, 10, 12, 16)
+
+REFERENCIA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reference_comping.mid")
+
+_FUNDAMENTALES = ("C", "Db", "D", "Eb", "E", "F", "F#", "G", "Ab", "A", "Bb", "B")
+_CUALIDADES = ("∆", "7", "m7", "m7(b5)", "7(b9)", "6", "m6", "7sus4", "∆(#11)", "7(13)")
+
+
+def cifrado_sintetico(compases, semilla=0):
+    """Cifrado aleatorio de ``compases`` compases con uno o dos acordes cada uno."""
+    rng = random.Random(semilla)
+    barras = []
+    for _ in range(compases):
+        acordes = [
+            rng.choice(_FUNDAMENTALES) + rng.choice(_CUALIDADES)
+            for _ in range(rng.choice((1, 1, 2)))
+        ]
+        barras.append(" ".join(acordes))
+    return " | ".join(barras)
+
+
+def referencia_sintetica(compases, notas_por_corchea=4, semilla=0, dur_corchea=0.25):
+    """Ritmo de referencia con ``notas_por_corchea`` notas en cada ataque.
+
+    Alrededor de un tercio de las corcheas quedan en silencio y algunas notas se
+    prolongan a la corchea siguiente, como en una referencia tocada.
+    """
+    rng = random.Random(semilla)
+    notas = NotasColumnares()
+    for i in range(compases * 8):
+        if rng.random() < 0.35:
+            continue
+        inicio = i * dur_corchea
+        duracion = dur_corchea * rng.choice((0.5, 0.9, 0.9, 1.5))
+        for _ in range(notas_por_corchea):
+            notas.agregar(inicio, inicio + duracion, rng.randint(48, 76), rng.randint(40, 110))
+    return notas
+
+
+def _enlazar_exhaustivo(previas, nuevas):
+    """Búsqueda por permutaciones usada antes del algoritmo húngaro."""
+    mejor, mejor_costo = None, None
+    for cand in itertools.permutations(nuevas, len(previas)):
+        costo = sum(abs(p - q) for p, q in zip(cand, previas))
+        if mejor_costo is None or costo < mejor_costo:
+            mejor, mejor_costo = cand, costo
+    return list(mejor)
+
+
+def _cronometrar(funcion, repeticiones, preparar=None):
+    """Devuelve el tiempo medio y el mínimo por llamada, en segundos.
+
+    ``preparar`` se ejecuta antes de cada llamada fuera del cronómetro y su
+    resultado se pasa a ``funcion``.
+    """
+    tiempos = []
+    for _ in range(repeticiones):
+        argumento = preparar() if preparar else None
+        inicio = time.perf_counter()
+        if preparar:
+            funcion(argumento)
+        else:
+            funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return {"media": sum(tiempos) / len(tiempos), "minimo": min(tiempos)}
+
+
+def _fila(caso, parametros, tiempos, repeticiones):
+    return {"caso": caso, "parametros": parametros, "repeticiones": repeticiones, **tiempos}
+
+
+def bench_enlazar_notas(voces=VOCES, repeticiones=20, semilla=0):
+    """Mide ``enlazar_notas`` para distintos números de voces.
+
+    La búsqueda exhaustiva solo se mide hasta ocho voces.
+    """
+    rng = random.Random(semilla)
+    resultados = []
+    for n in voces:
+        previas = [rng.randint(36, 96) for _ in range(n)]
+        nuevas = [rng.randint(36, 96) for _ in range(n)]
+        tiempos = _cronometrar(lambda: enlazar_notas(previas, nuevas), repeticiones)
+        resultados.append(_fila("enlazar_notas", {"voces": n}, tiempos, repeticiones))
+        if n <= 8:
+            tiempos = _cronometrar(lambda: _enlazar_exhaustivo(previas, nuevas), 1)
+            resultados.append(_fila("enlazar_exhaustivo", {"voces": n}, tiempos, 1))
+    return resultados
+
+
+def bench_notas_midi_acorde(repeticiones=5, semilla=0):
+    """Mide ``notas_midi_acorde`` sobre una progresión (caché fría y caliente) y la tabla de voicings."""
+    acordes = [
+        cifrado_utils.analizar_acorde(a)
+        for a in cifrado_sintetico(256, semilla).replace("|", " ").split()
+    ]
+
+    def progresion():
+        bajo = None
+        for fundamental, grados in acordes:
+            bajo = notas_midi_acorde(fundamental, grados, prev_bajo=bajo)[0]
+
+    tabla = pm.tabla_voicings()
+    clases = [(pm.notas_naturales.get(f, 0), g) for f, g in acordes]
+
+    def progresion_tabla():
+        bajo = None
+        for clase, grados in clases:
+            bajo = tabla.voicing(clase, grados, bajo)[0]
+
+    parametros = {"acordes": len(acordes)}
+    frio = _cronometrar(lambda _: progresion(), repeticiones, pm.limpiar_cache_voicings)
+    caliente = _cronometrar(progresion, repeticiones)
+    progresion_tabla()
+    con_tabla = _cronometrar(progresion_tabla, repeticiones)
+    return [
+        _fila("notas_midi_acorde_frio", parametros, frio, repeticiones),
+        _fila("notas_midi_acorde", parametros, caliente, repeticiones),
+        _fila("tabla_voicings", parametros, con_tabla, repeticiones),
+    ]
+
+
+def bench_analizar_cifrado(compases=COMPASES, repeticiones=3, semilla=0):
+    """Mide ``analizar_cifrado`` con la caché de símbolos fría y caliente."""
+    resultados = []
+    for n in compases:
+        cifrado = cifrado_sintetico(n, semilla)
+        frio = _cronometrar(
+            lambda _: analizar_cifrado(cifrado),
+            repeticiones,
+            cifrado_utils._analizar_token.cache_clear,
+        )
+        caliente = _cronometrar(lambda: analizar_cifrado(cifrado), repeticiones)
+        resultados.append(_fila("analizar_cifrado_frio", {"compases": n}, frio, repeticiones))
+        resultados.append(_fila("analizar_cifrado", {"compases": n}, caliente, repeticiones))
+    return resultados
+
+
+def bench_reordenar_ventanas(compases=COMPASES, densidades=DENSIDADES, repeticiones=3, semilla=0):
+    """Mide ``reordenar_ventanas`` invirtiendo el orden de todas las ventanas."""
+    resultados = []
+    for n, densidad in itertools.product(compases, densidades):
+        referencia = referencia_sintetica(n, densidad, semilla)
+        orden = list(range(n, 0, -1))
+        tiempos = _cronometrar(
+            lambda notas: reordenar_ventanas(notas, 0.25, 8, orden),
+            repeticiones,
+            referencia.copia,
+        )
+        parametros = {"compases": n, "notas_por_corchea": densidad, "notas": len(referencia)}
+        resultados.append(_fila("reordenar_ventanas", parametros, tiempos, repeticiones))
+    return resultados
+
+
+def _voicing_sintetico(compases, densidad, semilla):
+    referencia = referencia_sintetica(compases, densidad, semilla)
+    cifrado = cifrado_sintetico(compases, semilla)
+    return voicear_notas(referencia, cifrado)
+
+
+def bench_voicing(compases=COMPASES, densidades=DENSIDADES, repeticiones=3, semilla=0):
+    """Mide ``voicear_notas``, el núcleo de ``procesa_midi``, sin caché de etapas.
+
+    También se mide por separado la compilación de la plantilla rítmica y la
+    asignación de alturas sobre una plantilla ya compilada, que es lo que hace
+    cada render cuando la plantilla está en caché.
+    """
+    resultados = []
+    for n, densidad in itertools.product(compases, densidades):
+        referencia = referencia_sintetica(n, densidad, semilla)
+        cifrado = cifrado_sintetico(n, semilla)
+        tiempos = _cronometrar(
+            lambda notas: voicear_notas(notas, cifrado), repeticiones, referencia.copia
+        )
+        parametros = {"compases": n, "notas_por_corchea": densidad}
+        resultados.append(_fila("voicear_notas", parametros, tiempos, repeticiones))
+        tiempos = _cronometrar(lambda: compilar_plantilla(referencia), repeticiones)
+        resultados.append(_fila("compilar_plantilla", parametros, tiempos, repeticiones))
+        plantilla = compilar_plantilla(referencia)
+        tiempos = _cronometrar(
+            lambda: list(voicear_plantilla(plantilla, cifrado)), repeticiones
+        )
+        resultados.append(_fila("voicear_plantilla", parametros, tiempos, repeticiones))
+    return resultados
+
+
+def bench_rotaciones_y_spread(compases=COMPASES, repeticiones=3, semilla=0):
+    """Mide ``aplicar_rotaciones`` y ``Spread`` sobre notas ya voiceadas."""
+    resultados = []
+    for n in compases:
+        notas, indices, inicio = _voicing_sintetico(n, 4, semilla)
+        rotaciones = {i: (i % 3) - 1 for i in range(0, max(indices) + 1, 2)}
+        octavas = {i: 1 for i in range(0, max(indices) + 1, 5)}
+        parametros = {"compases": n, "notas": len(notas)}
+        tiempos = _cronometrar(
+            lambda copia: aplicar_rotaciones(
+                copia, 1, rotaciones, octavas, indices, 0.25, inicio
+            ),
+            repeticiones,
+            notas.copia,
+        )
+        resultados.append(_fila("aplicar_rotaciones", parametros, tiempos, repeticiones))
+        tiempos = _cronometrar(Spread, repeticiones, notas.copia)
+        resultados.append(_fila("Spread", parametros, tiempos, repeticiones))
+    return resultados
+
+
+def bench_escritura(compases=COMPASES, repeticiones=3, semilla=0):
+    """Mide ``codificar_midi`` con el tempo y compás de la referencia incluida."""
+    cabecera = leer_cabecera(REFERENCIA)
+    resultados = []
+    for n in compases:
+        notas, _, _ = _voicing_sintetico(n, 4, semilla)
+        tiempos = _cronometrar(lambda: codificar_midi(cabecera, notas), repeticiones)
+        resultados.append(
+            _fila("codificar_midi", {"compases": n, "notas": len(notas)}, tiempos, repeticiones)
+        )
+    return resultados
+
+
+def bench_procesa_midi(compases=COMPASES, repeticiones=3, semilla=0):
+    """Mide ``procesa_midi(save=False)`` con la referencia incluida, sin caché de etapas.
+
+    Devuelve una lista vacía si ``pretty_midi`` no está instalado.  Se usa una
+    copia temporal de la referencia para que la plantilla rítmica que el render
+    guarda junto a ella no quede en el repositorio.
+    """
+    try:
+        import pretty_midi  # noqa: F401
+    except ImportError:
+        return []
+    resultados = []
+    with tempfile.TemporaryDirectory() as directorio:
+        referencia = os.path.join(directorio, os.path.basename(REFERENCIA))
+        shutil.copyfile(REFERENCIA, referencia)
+        for n in compases:
+            cifrado = cifrado_sintetico(n, semilla)
+            tiempos = _cronometrar(
+                lambda _: pm.procesa_midi(referencia, cifrado, save=False),
+                repeticiones,
+                pm.limpiar_cache_etapas,
+            )
+            resultados.append(_fila("procesa_midi", {"compases": n}, tiempos, repeticiones))
+    return resultados
+
+
+def _commit():
+    try:
+        salida = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return salida.stdout.strip() or None
+
+
+def ejecutar(compases=COMPASES, densidades=DENSIDADES, voces=VOCES, repeticiones=3, semilla=0):
+    """Ejecuta la suite completa y devuelve un diccionario serializable a JSON."""
+    resultados = []
+    resultados += bench_analizar_cifrado(compases, repeticiones, semilla)
+    resultados += bench_notas_midi_acorde(repeticiones, semilla)
+    resultados += bench_enlazar_notas(voces, repeticiones * 10, semilla)
+    resultados += bench_reordenar_ventanas(compases, densidades, repeticiones, semilla)
+    resultados += bench_voicing(compases, densidades, repeticiones, semilla)
+    resultados += bench_rotaciones_y_spread(compases, repeticiones, semilla)
+    resultados += bench_escritura(compases, repeticiones, semilla)
+    resultados += bench_procesa_midi(compases, repeticiones, semilla)
+    return {
+        "commit": _commit(),
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "semilla": semilla,
+        "resultados": resultados,
+    }
+
+
+def _clave(fila):
+    return fila["caso"], json.dumps(fila["parametros"], sort_keys=True)
+
+
+def comparar_resultados(base, nuevo, umbral=1.25):
+    """Compara dos ejecuciones y devuelve las filas comunes.
+
+    Cada fila es ``(caso, parametros, segundos_base, segundos_nuevo, razon)``
+    usando el tiempo mínimo; se marcan como regresión las razones mayores que
+    ``umbral``.  Devuelve ``(filas, regresiones)``.
+    """
+    anteriores = {_clave(f): f for f in base["resultados"]}
+    filas = []
+    regresiones = []
+    for fila in nuevo["resultados"]:
+        anterior = anteriores.get(_clave(fila))
+        if anterior is None:
+            continue
+        razon = fila["minimo"] / anterior["minimo"] if anterior["minimo"] else float("inf")
+        datos = (fila["caso"], fila["parametros"], anterior["minimo"], fila["minimo"], razon)
+        filas.append(datos)
+        if razon > umbral:
+            regresiones.append(datos)
+    return filas, regresiones
+
+
+def _describir(parametros):
+    return ", ".join(f"{k}={v}" for k, v in parametros.items())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mide el rendimiento de CompingApp.")
+    parser.add_argument("--salida", help="Archivo JSON donde guardar los resultados")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior")
+    parser.add_argument("--umbral", type=float, default=1.25,
+                        help="Razón a partir de la cual se informa una regresión")
+    parser.add_argument("--rapido", action="store_true", help="Solo hasta 128 compases")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    compases = COMPASES_RAPIDO if args.rapido else COMPASES
+    datos = ejecutar(compases, repeticiones=args.repeticiones)
+    for fila in datos["resultados"]:
+        print(f"{fila['caso']:<24} {_describir(fila['parametros']):<50} "
+              f"{fila['minimo'] * 1e3:10.3f} ms")
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(datos, f, indent=2, ensure_ascii=False)
+
+    if not args.comparar:
+        return 0
+    with open(args.comparar, encoding="utf-8") as f:
+        base = json.load(f)
+    _, regresiones = comparar_resultados(base, datos, args.umbral)
+    for caso, parametros, antes, ahora, razon in regresiones:
+        print(f"Regresión en {caso} ({_describir(parametros)}): "
+              f"{antes * 1e3:.3f} ms -> {ahora * 1e3:.3f} ms (x{razon:.2f})",
+              file=sys.stderr)
+    return 1 if regresiones else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
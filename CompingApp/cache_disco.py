@@ -0,0 +1,269 @@
+"""Caché persistente de artefactos precalculados, compartida entre procesos.
+
+Cada artefacto es un archivo con un formato binario de disposición fija
+(``escribir_columnas``): una cabecera, unos pocos valores escalares y una tabla
+de columnas numéricas alineadas a 8 bytes en little-endian.  Los archivos se
+abren con ``mmap`` (``abrir_columnas``) y las columnas se exponen como
+``memoryview`` sobre el mapa, de modo que varios procesos que leen el mismo
+artefacto comparten las páginas del sistema en lugar de analizarlo cada uno.
+
+``CacheDisco`` organiza los artefactos en una carpeta, indexados por tipo y
+por una firma del contenido de origen (por ejemplo el hash del ``.mid``), por
+lo que un archivo modificado simplemente produce otra entrada.  Cada lectura
+actualiza la fecha de modificación de la entrada y, al escribir, se borran las
+menos usadas hasta respetar el tamaño máximo.
+
+La carpeta por defecto es ``~/.cache/compingapp``; la variable de entorno
+``COMPINGAPP_CACHE`` la cambia y, vacía, desactiva la caché.
+``COMPINGAPP_CACHE_MB`` fija el tamaño máximo en megabytes.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+from pathlib import Path
+
+# Tamaño máximo por defecto de la carpeta de caché, en bytes.
+TAMANO_MAXIMO = 512 * 1024 * 1024
+
+EXTENSION = ".bin"
+
+_CABECERA = struct.Struct("<4sHHII32s")
+_ENTRADA = struct.Struct("<24sc7xQQ")
+_ESCALAR = struct.Struct("<d")
+_ALINEACION = 8
+
+
+def tipo_columna(columna):
+    """Código de tipo de ``array`` de una columna (``array`` o ``memoryview``)."""
+    return columna.typecode if isinstance(columna, array) else columna.format
+
+
+def _alinear(n):
+    return (n + _ALINEACION - 1) // _ALINEACION * _ALINEACION
+
+
+def escribir_columnas(ruta, magia, version, columnas, escalares=(), firma=b"", modo=None):
+    """Escribe ``columnas`` (nombre → ``array``) en ``ruta`` de forma atómica.
+
+    ``magia`` identifica el tipo de artefacto (4 bytes) y ``firma`` (hasta 32
+    bytes) el contenido del que se obtuvo.  Los ``escalares`` se guardan como
+    dobles.  El archivo queda con los permisos ``modo`` o, si no se indica,
+    solo legible por el usuario, como los de ``tempfile.mkstemp``.
+    """
+    ruta = Path(ruta)
+    tabla = _CABECERA.size + len(escalares) * _ESCALAR.size
+    datos = _alinear(tabla + len(columnas) * _ENTRADA.size)
+    entradas = []
+    desplazamiento = datos
+    for nombre, columna in columnas.items():
+        entradas.append((nombre, columna, desplazamiento))
+        desplazamiento = _alinear(desplazamiento + len(columna) * columna.itemsize)
+
+    descriptor, temporal = tempfile.mkstemp(dir=ruta.parent, prefix=f".{ruta.name}-")
+    try:
+        with os.fdopen(descriptor, "wb") as f:
+            f.write(_CABECERA.pack(
+                magia, version, len(columnas), len(escalares), 0, firma.ljust(32, b"\0")
+            ))
+            for valor in escalares:
+                f.write(_ESCALAR.pack(valor))
+            for nombre, columna, inicio in entradas:
+                f.write(_ENTRADA.pack(
+                    nombre.encode(), tipo_columna(columna).encode(), inicio, len(columna)
+                ))
+            for nombre, columna, inicio in entradas:
+                f.write(b"\0" * (inicio - f.tell()))
+                if sys.byteorder != "little":
+                    columna = array(tipo_columna(columna), columna)
+                    columna.byteswap()
+                f.write(columna.tobytes())
+            f.write(b"\0" * (desplazamiento - f.tell()))
+        if modo is not None:
+            os.chmod(temporal, modo)
+        os.replace(temporal, ruta)
+    except BaseException:
+        try:
+            os.unlink(temporal)
+        except OSError:
+            pass
+        raise
+
+
+def abrir_columnas(ruta, magia, version, firma=None):
+    """Abre un archivo de ``escribir_columnas`` con ``mmap``.
+
+    Devuelve ``(escalares, columnas)``, donde cada columna es un ``memoryview``
+    de solo lectura sobre el mapa (o un ``array`` en máquinas big-endian), o
+    ``None`` si el archivo no existe, es de otro tipo o versión, su firma no
+    coincide o está truncado.
+    """
+    try:
+        with open(ruta, "rb") as f:
+            mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    vista = memoryview(mapa)
+    if len(vista) < _CABECERA.size:
+        return None
+    leida, ver, n_columnas, n_escalares, _, firma_leida = _CABECERA.unpack_from(vista)
+    if leida != magia or ver != version:
+        return None
+    if firma is not None and firma_leida != firma.ljust(32, b"\0"):
+        return None
+    desplazamiento = _CABECERA.size
+    fin_tabla = desplazamiento + n_escalares * _ESCALAR.size + n_columnas * _ENTRADA.size
+    if fin_tabla > len(vista):
+        return None
+    escalares = tuple(
+        _ESCALAR.unpack_from(vista, desplazamiento + k * _ESCALAR.size)[0]
+        for k in range(n_escalares)
+    )
+    desplazamiento += n_escalares * _ESCALAR.size
+    columnas = {}
+    for _ in range(n_columnas):
+        nombre, tipo, inicio, longitud = _ENTRADA.unpack_from(vista, desplazamiento)
+        desplazamiento += _ENTRADA.size
+        tipo = tipo.decode()
+        tamano = array(tipo).itemsize
+        if inicio + longitud * tamano > len(vista):
+            return None
+        columna = vista[inicio:inicio + longitud * tamano].cast(tipo)
+        if sys.byteorder != "little":
+            columna = array(tipo, columna)
+            columna.byteswap()
+        columnas[nombre.rstrip(b"\0").decode()] = columna
+    return escalares, columnas
+
+
+def firma_archivo(ruta):
+    """Hash SHA-256 del contenido de ``ruta`` (32 bytes)."""
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    return h.digest()
+
+
+class CacheDisco:
+    """Carpeta de artefactos con tamaño máximo y expulsión LRU.
+
+    Las entradas se identifican por ``tipo`` (cuatro letras, usado también como
+    firma mágica del archivo) y una ``clave`` de bytes; el nombre del archivo
+    es un hash de ambos.  Es seguro usarla desde varios procesos: las
+    escrituras son atómicas y las entradas borradas por otro proceso siguen
+    siendo legibles para quien ya las tenía mapeadas.
+    """
+
+    def __init__(self, directorio, tamano_maximo=TAMANO_MAXIMO):
+        self.directorio = Path(directorio)
+        self.tamano_maximo = tamano_maximo
+        self._lock = threading.Lock()
+
+    def _ruta(self, tipo, clave):
+        nombre = hashlib.sha256(tipo + b"\0" + clave).hexdigest()[:40]
+        return self.directorio / f"{tipo.decode()}-{nombre}{EXTENSION}"
+
+    def leer(self, tipo, clave, version=1):
+        """Devuelve ``(escalares, columnas)`` de la entrada o ``None``."""
+        ruta = self._ruta(tipo, clave)
+        resultado = abrir_columnas(ruta, tipo, version, _firma_clave(clave))
+        if resultado is not None:
+            try:
+                os.utime(ruta)
+            except OSError:
+                pass
+        return resultado
+
+    def escribir(self, tipo, clave, columnas, escalares=(), version=1):
+        """Guarda una entrada y expulsa las menos usadas si se supera el máximo.
+
+        Los errores de escritura se ignoran: la caché es solo una optimización.
+        """
+        try:
+            self.directorio.mkdir(parents=True, exist_ok=True)
+            escribir_columnas(
+                self._ruta(tipo, clave), tipo, version, columnas, escalares,
+                _firma_clave(clave),
+            )
+        except OSError:
+            return False
+        self.podar()
+        return True
+
+    def entradas(self):
+        """Lista ``(fecha_uso, tamaño, ruta)`` de las entradas, de más antigua a más reciente."""
+        resultado = []
+        try:
+            iterador = os.scandir(self.directorio)
+        except OSError:
+            return resultado
+        with iterador:
+            for entrada in iterador:
+                if not entrada.name.endswith(EXTENSION) or entrada.name.startswith("."):
+                    continue
+                try:
+                    info = entrada.stat()
+                except OSError:
+                    continue
+                resultado.append((info.st_mtime_ns, info.st_size, entrada.path))
+        resultado.sort()
+        return resultado
+
+    def podar(self):
+        """Borra las entradas menos usadas hasta no superar ``tamano_maximo``."""
+        with self._lock:
+            entradas = self.entradas()
+            total = sum(tamano for _, tamano, _ in entradas)
+            for _, tamano, ruta in entradas:
+                if total <= self.tamano_maximo:
+                    break
+                try:
+                    os.unlink(ruta)
+                except OSError:
+                    continue
+                total -= tamano
+
+    def limpiar(self):
+        for _, _, ruta in self.entradas():
+            try:
+                os.unlink(ruta)
+            except OSError:
+                pass
+
+
+def _firma_clave(clave):
+    return hashlib.sha256(clave).digest()
+
+
+_cache = None
+_configurada = False
+_lock = threading.Lock()
+
+
+def configurar(directorio, tamano_maximo=TAMANO_MAXIMO):
+    """Usa ``directorio`` como caché en disco del proceso (``None`` la desactiva)."""
+    global _cache, _configurada
+    with _lock:
+        _cache = CacheDisco(directorio, tamano_maximo) if directorio else None
+        _configurada = True
+    return _cache
+
+
+def cache_por_defecto():
+    """Devuelve la ``CacheDisco`` del proceso o ``None`` si está desactivada."""
+    global _cache, _configurada
+    with _lock:
+        if not _configurada:
+            directorio = os.environ.get(
+                "COMPINGAPP_CACHE", str(Path.home() / ".cache" / "compingapp")
+            )
+            megas = os.environ.get("COMPINGAPP_CACHE_MB")
+            tamano = int(megas) * 1024 * 1024 if megas else TAMANO_MAXIMO
+            _cache = CacheDisco(directorio, tamano) if directorio else None
+            _configurada = True
+        return _cache
@@ -1,104 +1,163 @@
 import re
+from functools import lru_cache
 from acordes_dict import acordes
+from perfil import registrar_cache
+
+# Número máximo de símbolos de acorde memorizados por ``analizar_acorde``.
+TAMANO_CACHE_CIFRADOS = 4096
+
+_PATRON_TOKEN = re.compile(r'^([A-G][#b]?)(.*)$')
+_PATRON_PARENTESIS = re.compile(r'\((.*?)\)')
+_EXTENSIONES = ['b9', '#9', '9', '#11', '11', 'b13', '13']
+_EXT_MAP = {
+    "9": 2, "b9": 1, "#9": 3,
+    "11": 5, "#11": 6,
+    "13": 9, "b13": 8
+}
+
+_ALIAS_PATTERNS = [
+    ("m7(b5)", ["m7(b5)", "m7b5", "min7b5", "mi7b5", "-7b5", "ø7", "ø"]),
+    ("m6", ["m6"]),
+    ("6", ["6"]),
+    ("m", ["min", "mi", "m", "-"]),
+    ("∆", ["maj", "major", "maj", "m", "∆"]),
+    ("º", ["dim", "º", "o"]),
+    ("+", ["aug", "+"]),
+    ("sus", ["sus4", "sus"]),
+]
+
+# Alias -> (prioridad, base).  La prioridad reproduce el orden de
+# ``_ALIAS_PATTERNS``: si varios alias son prefijo del sufijo gana el primero
+# de la lista, igual que en un recorrido lineal.
+_ALIAS = {}
+for _base_idx, (_base, _pats) in enumerate(_ALIAS_PATTERNS):
+    for _pat_idx, _pat in enumerate(_pats):
+        _ALIAS.setdefault(_pat, ((_base_idx, _pat_idx), _base))
+_LARGO_ALIAS = max(len(p) for p in _ALIAS)
+
 
 def alias_a_clave_acordes(resto):
     suf = resto.replace(" ", "").replace('[', '(').replace(']', ')').lower()
 
-    alias_patterns = [
-        ("m7(b5)", ["m7(b5)", "m7b5", "min7b5", "mi7b5", "-7b5", "ø7", "ø"]),
-        ("m6", ["m6"]),
-        ("6", ["6"]),
-        ("m", ["min", "mi", "m", "-"]),
-        ("∆", ["maj", "major", "maj", "m", "∆"]),
-        ("º", ["dim", "º", "o"]),
-        ("+", ["aug", "+"]),
-        ("sus", ["sus4", "sus"]),
-    ]
-
-    for base, pats in alias_patterns:
-        for pat in pats:
-            if suf.startswith(pat):
-                return base, resto[len(pat):]
-    return None, resto
+    mejor = None
+    for largo in range(1, min(_LARGO_ALIAS, len(suf)) + 1):
+        encontrado = _ALIAS.get(suf[:largo])
+        if encontrado is not None and (mejor is None or encontrado[0] < mejor[0]):
+            mejor = encontrado + (largo,)
+    if mejor is None:
+        return None, resto
+    _, base, largo = mejor
+    return base, resto[largo:]
 
 def analizar_cifrado(cifrado):
+    """Analiza un cifrado y devuelve una lista ``(fundamental, grados)``.
+
+    Cada símbolo se analiza con ``analizar_acorde``, que memoriza el resultado
+    para todo el proceso.  Los símbolos que no se pueden analizar se omiten.
+    """
     resultado = []
-    tokens = cifrado.split()
-    for token in tokens:
-        m = re.match(r'^([A-G][#b]?)(.*)$', token)
-        if not m:
-            print(f"No se pudo analizar el token: {token}")
-            continue
-        fundamental, sufijo = m.groups()
-        sufijo = sufijo.strip()
-        extensiones = []
-
-        # Detectar la base del acorde antes de procesar extensiones
-        base, resto = alias_a_clave_acordes(sufijo)
-        if base == 'm':
-            base = 'm7'
-        elif base == '+':
-            base = '+7'
-        elif base == 'º':
-            base = 'º7'
-        elif base == 'sus':
-            base = '7sus4'
-        if not base or base not in acordes:
-            if sufijo == '' or sufijo.startswith('7'):
-                base = '7'
-                resto = sufijo[1:] if sufijo.startswith('7') else ''
-            else:
-                base = '7'
-                resto = sufijo
-                conocidos = ['b9', '#9', '9', '#11', '11', 'b13', '13']
-                if not any(tag in sufijo for tag in conocidos):
-                    print(f"¡Acorde no reconocido: {sufijo}! Usando 7 por defecto.")
-
-        if resto.startswith('7'):
-            resto = resto[1:]
-
-        # Extraer extensiones en paréntesis del resto
-        sufijo_base = resto
-        if '(' in sufijo_base:
-            parentesis = re.findall(r'\((.*?)\)', sufijo_base)
-            for contenido in parentesis:
-                for ext in contenido.split(','):
-                    ext = ext.strip()
-                    if ext:
-                        extensiones.append(ext)
-            sufijo_base = re.sub(r'\(.*?\)', '', sufijo_base).strip()
-
-        # Extraer extensiones pegadas fuera de paréntesis
-        for ext_tag in ['b9', '#9', '9', '#11', '11', 'b13', '13']:
-            if ext_tag in sufijo_base:
-                extensiones.append(ext_tag)
-                sufijo_base = sufijo_base.replace(ext_tag, '')
-
-        sufijo_base = sufijo_base.strip()
-        if sufijo_base:
-            print(f"¡Acorde no reconocido: {sufijo_base}! Usando 7 por defecto.")
-
-        grados_base = acordes[base][:]
-
-        e_9 = next((e for e in extensiones if '9' in e), None)
-        e_11 = next((e for e in extensiones if '11' in e), None)
-        e_13 = next((e for e in extensiones if '13' in e), None)
-
-        ext_map = {
-            "9": 2, "b9": 1, "#9": 3,
-            "11": 5, "#11": 6,
-            "13": 9, "b13": 8
-        }
-
-        grados_final = grados_base[:]
-        if e_13:
-            grados_final[2] = ext_map.get(e_13, 9)
-            grados_final[0] = ext_map.get(e_9, 2)
-        elif e_11:
-            grados_final[2] = ext_map.get(e_11, 5)
-            grados_final[0] = ext_map.get(e_9, 2)
-        elif e_9:
-            grados_final[0] = ext_map.get(e_9, 2)
-
-        resultado.append((fundamental, grados_final))
+    for token in cifrado.split():
+        analizado = _analizar_token(token)
+        if analizado is not None:
+            resultado.append((analizado[0], list(analizado[1])))
     return resultado
+
+
+def analizar_acorde(simbolo):
+    """Devuelve ``(fundamental, grados)`` del símbolo de acorde ``simbolo``.
+
+    ``grados`` es una tupla.  El resultado se guarda en una caché acotada
+    compartida por todo el proceso, por lo que analizar de nuevo un símbolo
+    conocido no repite el trabajo.  Lanza ``ValueError`` si el símbolo no se
+    puede analizar.
+    """
+    analizado = _analizar_token(simbolo)
+    if analizado is None:
+        raise ValueError(f"No se pudo analizar el acorde: {simbolo}")
+    return analizado
+
+
+def estadisticas_cache_cifrados():
+    """Devuelve aciertos, fallos y ocupación de la caché de símbolos."""
+    return _analizar_token.cache_info()
+
+
+def _aciertos_cifrados():
+    info = _analizar_token.cache_info()
+    return info.hits, info.misses
+
+
+registrar_cache("cifrados", _aciertos_cifrados)
+
+
+@lru_cache(maxsize=TAMANO_CACHE_CIFRADOS)
+def _analizar_token(token):
+    m = _PATRON_TOKEN.match(token)
+    if not m:
+        print(f"No se pudo analizar el token: {token}")
+        return None
+    fundamental, sufijo = m.groups()
+    sufijo = sufijo.strip()
+    extensiones = []
+
+    # Detectar la base del acorde antes de procesar extensiones
+    base, resto = alias_a_clave_acordes(sufijo)
+    if base == 'm':
+        base = 'm7'
+    elif base == '+':
+        base = '+7'
+    elif base == 'º':
+        base = 'º7'
+    elif base == 'sus':
+        base = '7sus4'
+    if not base or base not in acordes:
+        if sufijo == '' or sufijo.startswith('7'):
+            base = '7'
+            resto = sufijo[1:] if sufijo.startswith('7') else ''
+        else:
+            base = '7'
+            resto = sufijo
+            if not any(tag in sufijo for tag in _EXTENSIONES):
+                print(f"¡Acorde no reconocido: {sufijo}! Usando 7 por defecto.")
+
+    if resto.startswith('7'):
+        resto = resto[1:]
+
+    # Extraer extensiones en paréntesis del resto
+    sufijo_base = resto
+    if '(' in sufijo_base:
+        parentesis = _PATRON_PARENTESIS.findall(sufijo_base)
+        for contenido in parentesis:
+            for ext in contenido.split(','):
+                ext = ext.strip()
+                if ext:
+                    extensiones.append(ext)
+        sufijo_base = _PATRON_PARENTESIS.sub('', sufijo_base).strip()
+
+    # Extraer extensiones pegadas fuera de paréntesis
+    for ext_tag in _EXTENSIONES:
+        if ext_tag in sufijo_base:
+            extensiones.append(ext_tag)
+            sufijo_base = sufijo_base.replace(ext_tag, '')
+
+    sufijo_base = sufijo_base.strip()
+    if sufijo_base:
+        print(f"¡Acorde no reconocido: {sufijo_base}! Usando 7 por defecto.")
+
+    grados_base = acordes[base][:]
+
+    e_9 = next((e for e in extensiones if '9' in e), None)
+    e_11 = next((e for e in extensiones if '11' in e), None)
+    e_13 = next((e for e in extensiones if '13' in e), None)
+
+    grados_final = grados_base[:]
+    if e_13:
+        grados_final[2] = _EXT_MAP.get(e_13, 9)
+        grados_final[0] = _EXT_MAP.get(e_9, 2)
+    elif e_11:
+        grados_final[2] = _EXT_MAP.get(e_11, 5)
+        grados_final[0] = _EXT_MAP.get(e_9, 2)
+    elif e_9:
+        grados_final[0] = _EXT_MAP.get(e_9, 2)
+
+    return fundamental, tuple(grados_final)
@@ -2,8 +2,10 @@ import tkinter as tk
 from tkinter import messagebox, ttk, filedialog, colorchooser
 import tkinter.font as tkfont
 import os
-from procesa_midi import procesa_midi, notas_midi_acorde, notas_naturales
-from cifrado_utils import analizar_cifrado
+from procesa_midi import procesa_midi, renderizar_por_compases
+from reproductor import Reproductor
+from plan_voicing import extraer_acordes, plan_acordes, plan_cifrado
+from referencia import precargar_referencia
 import threading
 
 # Colores y fuente para un aspecto moderno
@@ -16,6 +18,8 @@ ENTRY_BACKGROUND = "#23252b"  # entradas de texto
 COMBOBOX_BG = "#ffffff"  # color de fondo de los comboboxes
 COMBOBOX_FG = "#000000"  # texto de los comboboxes en negro
 FONT = ("Monaco", 18)
+# Pausa tras la última tecla antes de analizar el cifrado (milisegundos)
+RETARDO_ANALISIS_MS = 150
 
 try:
     import mido
@@ -104,7 +108,7 @@ class MidiApp(tk.Tk):
             font=self.font,
         )
         self.cifrado_entry.pack(fill="x", padx=10)
-        self.cifrado_entry.bind("<KeyRelease>", lambda e: self.update_chord_list())
+        self.cifrado_entry.bind("<KeyRelease>", lambda e: self.programar_analisis())
 
         self.reference_midi_path = "reference_comping.mid"
         self.midi_label = tk.Label(
@@ -129,6 +133,8 @@ class MidiApp(tk.Tk):
             bd=0,
         )
         self.midi_btn.pack(pady=5, fill="x", padx=10)
+        if os.path.exists(self.reference_midi_path):
+            precargar_referencia(self.reference_midi_path)
 
         self.rotacion = 0
         # Rotaciones individuales por acorde (índice de corchea -> rotación)
@@ -138,6 +144,11 @@ class MidiApp(tk.Tk):
         self.chords = []
         # Inversiones base calculadas a partir de la nota más grave de cada acorde
         self.base_inversions = []
+        # Plan de voicing del último análisis (``plan_voicing.PlanVoicing``),
+        # reutilizado al editar y compartido con el render
+        self.plan = None
+        self._analisis_pendiente = None
+        self._generacion_analisis = 0
         self.rot_label = tk.Label(
             self.left_panel,
             text="Rotar: 0",
@@ -205,6 +216,23 @@ class MidiApp(tk.Tk):
         )
         self.spread_btn.pack(pady=5)
 
+        # Voicing de movimiento mínimo sobre todo el cifrado en lugar del
+        # enlace acorde a acorde.
+        self.optimo_var = tk.BooleanVar(value=False)
+        self.optimo_btn = tk.Checkbutton(
+            self.left_panel,
+            text="Voicing óptimo",
+            variable=self.optimo_var,
+            command=self.cambiar_voicing_optimo,
+            bg=self.panel_bg_color,
+            fg=self.fg_color,
+            selectcolor=self.accent_color,
+            activebackground=self.panel_bg_color,
+            activeforeground=self.fg_color,
+            font=self.font,
+        )
+        self.optimo_btn.pack(pady=5)
+
         self.variation_btn = tk.Button(
             self.left_panel,
             text="Generar variación",
@@ -353,48 +381,67 @@ class MidiApp(tk.Tk):
 
     def calcular_inversiones(self):
         """Calcula la inversión base de cada acorde según su nota más grave."""
-        self.base_inversions = []
-        prev_bajo = None
-        cache = {}
-        for acorde in self.chords:
-            if acorde not in cache:
-                cache[acorde] = analizar_cifrado(acorde)[0]
-            fundamental, grados = cache[acorde]
-            if prev_bajo is None:
-                inv_escogida = 0
-                notas = None
-                for inv in range(4):
-                    cand = notas_midi_acorde(
-                        fundamental, grados, base_octava=4, prev_bajo=None, inversion=inv
-                    )
-                    notas = cand
-                    if cand[0] >= 57:
-                        inv_escogida = inv
-                        break
-                prev_bajo = notas[0]
-                self.base_inversions.append(inv_escogida)
-            else:
-                notas = notas_midi_acorde(
-                    fundamental, grados, base_octava=4, prev_bajo=prev_bajo
-                )
-                prev_bajo = notas[0]
-                base = 48 + notas_naturales.get(fundamental, 0)
-                diff = (notas[0] - base) % 12
-                grados_mod = [g % 12 for g in grados]
-                inv_idx = grados_mod.index(diff) if diff in grados_mod else 0
-                self.base_inversions.append(inv_idx)
+        self.plan = plan_acordes(self.chords, self.optimo_var.get(), self.plan)
+        self.base_inversions = self.plan.inversiones
+
+    def cambiar_voicing_optimo(self):
+        # Los análisis en curso son del modo anterior y se descartan.
+        self._generacion_analisis += 1
+        self.update_chord_list()
+
+    def _plan(self, cifrado):
+        """Plan de voicing de ``cifrado`` para el render.
+
+        Si es el texto analizado en la interfaz se reutiliza el mismo plan de
+        la caché de ``plan_voicing``.
+        """
+        return plan_cifrado(cifrado, self.optimo_var.get(), self.plan)
 
     def update_chord_list(self):
+        """Analiza el cifrado en el hilo principal y actualiza la lista."""
         text = self.cifrado_entry.get("1.0", tk.END)
-        chords = [a.strip() for a in text.replace("|", " ").split() if a.strip()]
+        self.chords = extraer_acordes(text)
+        self.calcular_inversiones()
+        self._mostrar_acordes()
+
+    def programar_analisis(self):
+        """Reprograma el análisis del cifrado tras una pausa al escribir."""
+        if self._analisis_pendiente is not None:
+            self.after_cancel(self._analisis_pendiente)
+        self._analisis_pendiente = self.after(RETARDO_ANALISIS_MS, self._lanzar_analisis)
+
+    def _lanzar_analisis(self):
+        """Calcula las inversiones en un hilo y devuelve el resultado con ``after``."""
+        self._analisis_pendiente = None
+        self._generacion_analisis += 1
+        generacion = self._generacion_analisis
+        chords = extraer_acordes(self.cifrado_entry.get("1.0", tk.END))
+        previo = self.plan
+        optimo = self.optimo_var.get()
+
+        def analizar():
+            plan = plan_acordes(chords, optimo, previo)
+            self.after(0, lambda: self._aplicar_analisis(generacion, chords, plan))
+
+        threading.Thread(target=analizar, daemon=True).start()
+
+    def _aplicar_analisis(self, generacion, chords, plan):
+        # Descartar resultados de pulsaciones anteriores a la última.
+        if generacion != self._generacion_analisis:
+            return
         self.chords = chords
+        self.plan = plan
+        self.base_inversions = plan.inversiones
+        self._mostrar_acordes()
+
+    def _mostrar_acordes(self):
+        chords = self.chords
         self.rotaciones_forzadas = {
             i: r for i, r in self.rotaciones_forzadas.items() if i < len(chords)
         }
         self.octavas_forzadas = {
             i: o for i, o in self.octavas_forzadas.items() if i < len(chords)
         }
-        self.calcular_inversiones()
         display = [f"{i+1}: {c}" for i, c in enumerate(chords)]
         self.chord_combo["values"] = display
         if display:
@@ -499,9 +546,12 @@ class MidiApp(tk.Tk):
             messagebox.showerror("Error", "Selecciona un puerto MIDI.")
             return
 
+        plan = self._plan(cifrado)
+
         def run_preview():
             try:
-                midi_obj = procesa_midi(
+                # Los compases se calculan mientras suenan los anteriores.
+                bloques = renderizar_por_compases(
                     self.reference_midi_path,
                     cifrado,
                     rotacion=self.rotacion,
@@ -509,19 +559,13 @@ class MidiApp(tk.Tk):
                     octavas=self.octavas_forzadas,
                     spread=self.spread_var.get(),
                     window_order=self.window_order,
-                    save=False,
+                    plan=plan,
                 )
-                import io
-
-                midi_bytes = io.BytesIO()
-                midi_obj.write(midi_bytes)
-                midi_bytes.seek(0)
-                mid = mido.MidiFile(file=midi_bytes)
                 with mido.open_output(port_name) as port:
-                    for msg in mid.play():
-                        if self.stop_preview.is_set():
-                            break
-                        port.send(msg)
+                    reproductor = Reproductor(port, evento_detener=self.stop_preview)
+                    reproductor.reproducir(
+                        nota for bloque in bloques for nota in sorted(bloque.tuplas())
+                    )
             except Exception as e:
                 messagebox.showerror("Error", f"Ocurrió un error al previsualizar:\n{e}")
             finally:
@@ -554,6 +598,7 @@ class MidiApp(tk.Tk):
                 octavas=self.octavas_forzadas,
                 spread=self.spread_var.get(),
                 window_order=self.window_order,
+                plan=self._plan(cifrado),
             )
             print(f"Archivo exportado: {out_path}")
         except Exception as e:
@@ -566,6 +611,7 @@ class MidiApp(tk.Tk):
             self.midi_label.config(
                 text=f"Archivo MIDI de referencia: {os.path.basename(path)}"
             )
+            precargar_referencia(path)
 
     def open_appearance_window(self):
         win = tk.Toplevel(self)
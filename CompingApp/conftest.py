@@ -0,0 +1,77 @@
+import os
+import shutil
+
+import pytest
+
+import cache_disco
+
+
+@pytest.fixture(autouse=True)
+def cache_disco_temporal(tmp_path_factory):
+    """Cada prueba usa una caché en disco propia y vacía."""
+    cache_disco.configurar(tmp_path_factory.mktemp("cache"))
+    yield
+    cache_disco.configurar(None)
+
+
+@pytest.fixture
+def referencia_temporal(tmp_path):
+    """Copia de ``reference_comping.mid`` en un directorio temporal.
+
+    El render guarda la plantilla rítmica junto a la referencia; con la copia
+    las pruebas no escriben en el repositorio.
+    """
+    ruta = tmp_path / "reference_comping.mid"
+    shutil.copyfile(os.path.join(os.path.dirname(__file__), "reference_comping.mid"), ruta)
+    return str(ruta)
+
+
+
+@pytest.fixture
+def ritmo_humanizado():
+    """Ritmo de 16 compases tocado "a mano", fuera de la rejilla de corcheas.
+
+    Mezcla acordes con los inicios desplazados hasta 30 ms y duraciones
+    irregulares, corcheas en silencio y anticipaciones: notas sueltas que
+    empiezan menos de un milisegundo antes de la corchea siguiente.
+    """
+    import random
+
+    from notas_columnares import NotasColumnares
+
+    azar = random.Random(2024)
+    # La primera nota marca el origen de la rejilla.
+    notas = [(0.05, 0.2, 60, 80)]
+    for i in range(16 * 8):
+        t = 0.05 + i * 0.25
+        tirada = azar.random()
+        if tirada < 0.2:
+            continue
+        if tirada < 0.35:
+            inicio = t + 0.25 - azar.uniform(0.0002, 0.0008)
+            notas.append((inicio, inicio + azar.uniform(0.1, 0.4), 64, azar.randint(60, 100)))
+            continue
+        for altura in azar.sample(range(55, 76), azar.choice((2, 3, 4, 4, 5))):
+            inicio = max(0.05, t + azar.uniform(-0.03, 0.03))
+            notas.append((inicio, inicio + azar.uniform(0.08, 0.45), altura, azar.randint(40, 110)))
+    return NotasColumnares.desde_tuplas(notas)
+
+
+@pytest.fixture
+def referencia_humanizada(tmp_path, ritmo_humanizado):
+    """``ritmo_humanizado`` escrito como archivo MIDI.
+
+    Usa la cabecera de ``reference_comping.mid`` con otro tempo, de modo que
+    las corcheas no caen en ticks enteros y algunas anticipaciones quedan en
+    el mismo tick que la corchea siguiente.
+    """
+    from escritor_midi import META_TEMPO, ArchivoMidi, leer_cabecera
+
+    original = leer_cabecera(os.path.join(os.path.dirname(__file__), "reference_comping.mid"))
+    metaeventos = tuple(
+        (tick, tipo, (512000).to_bytes(3, "big") if tipo == META_TEMPO else datos)
+        for tick, tipo, datos in original.metaeventos
+    )
+    ruta = tmp_path / "humanizada.mid"
+    ArchivoMidi(original._replace(metaeventos=metaeventos), ritmo_humanizado).write(ruta)
+    return str(ruta)
@@ -0,0 +1,303 @@
+"""Escritura directa de archivos MIDI estándar (SMF) a partir de notas columnares.
+
+La exportación solo produce una pista de notas sobre el tempo y el compás de
+la referencia, así que no hace falta construir un ``PrettyMIDI`` ni pasar por
+``mido``.  ``leer_cabecera`` extrae de la referencia, sin ``pretty_midi``, lo
+que hay que conservar: la resolución, los metaeventos de tempo, compás y
+tonalidad, y el programa y el nombre de la pista con notas.
+``codificar_midi`` convierte las columnas de un ``NotasColumnares`` en los
+bytes del archivo: un ``bytearray`` reservado de antemano con el tamaño
+máximo posible, tiempos delta en VLQ y *running status* (los finales de nota
+se escriben como ``note_on`` con velocidad 0, así que toda la pista comparte
+el mismo estado).
+
+El archivo tiene el formato 1 que escribe ``pretty_midi``: una pista de
+tempo y otra con las notas en el canal 0.
+"""
+import struct
+from bisect import bisect_right
+from collections import namedtuple
+
+MARCA_ARCHIVO = b"MThd"
+MARCA_PISTA = b"MTrk"
+
+# Tempo por omisión del estándar (120 negras por minuto).
+TEMPO_POR_OMISION = 500000
+
+# Metaeventos de la referencia que se copian a la pista de tempo.
+META_TEMPO = 0x51
+META_COMPAS = 0x58
+META_TONALIDAD = 0x59
+META_NOMBRE_PISTA = 0x03
+META_FIN_PISTA = 0x2F
+_METAEVENTOS_COPIADOS = (META_TEMPO, META_COMPAS, META_TONALIDAD)
+_FIN_PISTA = bytes((0, 0xFF, META_FIN_PISTA, 0))
+
+# Compás 4/4 que ``pretty_midi`` añade si no hay ninguno al principio.
+_COMPAS_POR_OMISION = bytes((4, 2, 24, 8))
+
+CabeceraMidi = namedtuple("CabeceraMidi", "resolucion metaeventos programa nombre")
+CabeceraMidi.__doc__ = """Lo que se conserva de la referencia al escribir.
+
+``resolucion`` son los ticks por negra, ``metaeventos`` una tupla ordenada
+de ``(tick, tipo, datos)`` con los cambios de tempo, compás y tonalidad,
+``programa`` el del canal de la primera nota y ``nombre`` el de su pista
+(``b""`` si no tiene).
+"""
+
+
+def _leer_vlq(datos, i):
+    valor = 0
+    while True:
+        byte = datos[i]
+        i += 1
+        valor = (valor << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            return valor, i
+
+
+def leer_cabecera(datos):
+    """Extrae la ``CabeceraMidi`` de los bytes de un archivo MIDI estándar.
+
+    ``datos`` también puede ser la ruta del archivo.  Solo se decodifica la
+    estructura de los eventos; las notas se saltan.  Lanza ``ValueError`` si
+    el archivo no es un SMF válido.
+    """
+    if not isinstance(datos, (bytes, bytearray, memoryview)):
+        with open(datos, "rb") as f:
+            datos = f.read()
+    datos = bytes(datos)
+    if datos[:4] != MARCA_ARCHIVO or len(datos) < 14:
+        raise ValueError("No es un archivo MIDI estándar")
+    largo_cabecera, = struct.unpack(">I", datos[4:8])
+    _, pistas, division = struct.unpack(">HHH", datos[8:14])
+    if division & 0x8000:
+        raise ValueError("Las divisiones SMPTE no están soportadas")
+
+    metaeventos = []
+    programa = None
+    nombre = b""
+    i = 8 + largo_cabecera
+    for _ in range(pistas):
+        if datos[i:i + 4] != MARCA_PISTA:
+            raise ValueError("Pista MIDI inválida")
+        largo, = struct.unpack(">I", datos[i + 4:i + 8])
+        j, fin = i + 8, i + 8 + largo
+        i = fin
+        tick = 0
+        estado = None
+        nombre_pista = b""
+        programas = [0] * 16
+        try:
+            while j < fin:
+                delta, j = _leer_vlq(datos, j)
+                tick += delta
+                byte = datos[j]
+                if byte == 0xFF:
+                    tipo = datos[j + 1]
+                    largo_meta, j = _leer_vlq(datos, j + 2)
+                    carga = datos[j:j + largo_meta]
+                    j += largo_meta
+                    if tipo in _METAEVENTOS_COPIADOS:
+                        metaeventos.append((tick, tipo, carga))
+                    elif tipo == META_NOMBRE_PISTA:
+                        nombre_pista = carga
+                    continue
+                if byte in (0xF0, 0xF7):
+                    largo_sysex, j = _leer_vlq(datos, j + 1)
+                    j += largo_sysex
+                    continue
+                if byte & 0x80:
+                    estado = byte
+                    j += 1
+                elif estado is None:
+                    raise ValueError("Evento MIDI sin estado")
+                tipo, canal = estado & 0xF0, estado & 0x0F
+                if tipo in (0xC0, 0xD0):
+                    if tipo == 0xC0:
+                        programas[canal] = datos[j]
+                    j += 1
+                    continue
+                if tipo == 0x90 and datos[j + 1] and programa is None:
+                    programa = programas[canal]
+                    nombre = nombre_pista
+                j += 2
+        except IndexError:
+            raise ValueError("Pista MIDI truncada") from None
+    metaeventos.sort(key=lambda evento: evento[0])
+    return CabeceraMidi(division, tuple(metaeventos), programa or 0, nombre)
+
+
+def _escribir_vlq(destino, k, valor):
+    """Escribe ``valor`` en VLQ en ``destino[k:]`` y devuelve la nueva posición."""
+    if valor < 0x80:
+        destino[k] = valor
+        return k + 1
+    grupos = []
+    while True:
+        grupos.append(valor & 0x7F)
+        valor >>= 7
+        if not valor:
+            break
+    for grupo in reversed(grupos[1:]):
+        destino[k] = grupo | 0x80
+        k += 1
+    destino[k] = grupos[0]
+    return k + 1
+
+
+def _bytes_vlq(valor):
+    destino = bytearray(4)
+    return bytes(destino[:_escribir_vlq(destino, 0, valor)])
+
+
+def segundos_a_ticks(cabecera):
+    """Devuelve una función que convierte segundos en el tick más cercano.
+
+    Reproduce ``PrettyMIDI.time_to_tick`` sobre el mapa de tempo de
+    ``cabecera``, con la misma aritmética de coma flotante: sin cambio de
+    tempo en el tick 0 se usan 120 negras por minuto hasta el primero, y un
+    tiempo a mitad de camino entre dos ticks va al posterior salvo que el
+    redondeo deje más cerca el anterior.  (Pasado el último tick de la
+    referencia ``pretty_midi`` redondea al par; ahí un empate puede caer en
+    el tick vecino.)
+    """
+    resolucion = cabecera.resolucion
+    ticks, tiempos, escalas = [0], [0.0], [60.0 / (120.0 * resolucion)]
+    for tick, tipo, datos in cabecera.metaeventos:
+        if tipo != META_TEMPO:
+            continue
+        escala = 60.0 / ((6e7 / int.from_bytes(datos, "big")) * resolucion)
+        if tick == 0:
+            escalas[0] = escala
+        elif escala != escalas[-1]:
+            tiempos.append(tiempos[-1] + escalas[-1] * (tick - ticks[-1]))
+            ticks.append(tick)
+            escalas.append(escala)
+
+    def convertir(segundos):
+        if segundos <= 0:
+            return 0
+        k = bisect_right(tiempos, segundos) - 1
+        base, origen, escala = ticks[k], tiempos[k], escalas[k]
+        # Primer tick cuyo tiempo no es menor que ``segundos``; el tramo del
+        # tempo ``k`` llega hasta el tick del cambio siguiente inclusive.
+        siguiente = int((segundos - origen) / escala)
+        while origen + escala * siguiente < segundos:
+            siguiente += 1
+        while siguiente > 0 and origen + escala * (siguiente - 1) >= segundos:
+            siguiente -= 1
+        if siguiente and (
+            abs(segundos - (origen + escala * (siguiente - 1)))
+            < abs(segundos - (origen + escala * siguiente))
+        ):
+            siguiente -= 1
+        return base + siguiente
+
+    return convertir
+
+
+def _pista(contenido):
+    return MARCA_PISTA + struct.pack(">I", len(contenido)) + contenido
+
+
+def _pista_tempo(cabecera):
+    eventos = list(cabecera.metaeventos)
+    if not any(tick == 0 and tipo == META_COMPAS for tick, tipo, _ in eventos):
+        eventos.insert(0, (0, META_COMPAS, _COMPAS_POR_OMISION))
+    contenido = bytearray()
+    anterior = 0
+    for tick, tipo, datos in eventos:
+        contenido += _bytes_vlq(tick - anterior)
+        contenido += bytes((0xFF, tipo)) + _bytes_vlq(len(datos)) + datos
+        anterior = tick
+    contenido += _FIN_PISTA
+    return _pista(bytes(contenido))
+
+
+def codificar_midi(cabecera, notas, canal=0):
+    """Devuelve los bytes del archivo MIDI con ``notas`` sobre ``cabecera``.
+
+    ``notas`` es un ``NotasColumnares`` (o cualquier objeto con las columnas
+    ``start``/``end``/``pitch``/``velocity``), en cualquier orden.  Los
+    eventos de un mismo tick se ordenan como en ``PrettyMIDI.write``: por
+    altura y velocidad, así que el final de una nota (velocidad 0) va antes
+    que cualquier inicio de la misma altura en ese tick, también el de una
+    nota de duración nula.  Lanza ``ValueError`` si una altura o velocidad no cabe en 7 bits.
+    """
+    a_ticks = segundos_a_ticks(cabecera)
+    starts, ends, pitches, velocities = notas.start, notas.end, notas.pitch, notas.velocity
+    n = len(starts)
+
+    # Cada evento se codifica en un entero: tick, altura y velocidad (0 para
+    # los finales), de modo que ordenar los enteros ordena los eventos.
+    eventos = []
+    for k in range(n):
+        altura, velocidad = pitches[k], velocities[k]
+        if not (0 <= altura < 128 and 0 <= velocidad < 128):
+            raise ValueError(f"Nota fuera de rango: altura {altura}, velocidad {velocidad}")
+        inicio = a_ticks(starts[k])
+        fin = max(inicio, a_ticks(ends[k]))
+        eventos.append((inicio << 16) | (altura << 7) | velocidad)
+        eventos.append((fin << 16) | (altura << 7))
+    eventos.sort()
+
+    nombre = cabecera.nombre
+    # Tamaño máximo: cada evento ocupa a lo sumo 4 bytes de delta VLQ y 3 de
+    # mensaje, más el nombre, el cambio de programa y el fin de pista.
+    contenido = bytearray(7 * len(eventos) + len(nombre) + 20)
+    k = 0
+    if nombre:
+        contenido[0:3] = b"\x00\xff\x03"
+        k = _escribir_vlq(contenido, 3, len(nombre))
+        contenido[k:k + len(nombre)] = nombre
+        k += len(nombre)
+    contenido[k:k + 3] = bytes((0, 0xC0 | canal, cabecera.programa))
+    k += 3
+    primera = True
+    anterior = 0
+    for evento in eventos:
+        tick = evento >> 16
+        delta = tick - anterior
+        anterior = tick
+        if delta < 0x80:
+            contenido[k] = delta
+            k += 1
+        else:
+            k = _escribir_vlq(contenido, k, delta)
+        if primera:
+            # El estado ``note_on`` se escribe una sola vez.
+            contenido[k] = 0x90 | canal
+            k += 1
+            primera = False
+        contenido[k] = (evento >> 7) & 0x7F
+        contenido[k + 1] = evento & 0x7F
+        k += 2
+    contenido[k:k + 4] = _FIN_PISTA
+    k += 4
+    pista = memoryview(contenido)[:k]
+
+    cabecera_archivo = MARCA_ARCHIVO + struct.pack(">IHHH", 6, 1, 2, cabecera.resolucion)
+    return b"".join((
+        cabecera_archivo, _pista_tempo(cabecera), MARCA_PISTA, struct.pack(">I", k), pista,
+    ))
+
+
+class ArchivoMidi:
+    """Notas listas para escribir con ``write(ruta)``, como un ``PrettyMIDI``.
+
+    Sirve como argumento de ``salida.EscritorSalida.escribir``.
+    """
+
+    __slots__ = ("cabecera", "notas")
+
+    def __init__(self, cabecera, notas):
+        self.cabecera = cabecera
+        self.notas = notas
+
+    def codificar(self):
+        return codificar_midi(self.cabecera, self.notas)
+
+    def write(self, ruta):
+        with open(ruta, "wb") as f:
+            f.write(self.codificar())
@@ -0,0 +1,63 @@
+import heapq
+from bisect import bisect_left
+
+
+class IndiceNotas:
+    """Índice de intervalos para consultar las notas activas en un segmento.
+
+    Se construye a partir de los instantes de inicio y fin de cada nota y
+    devuelve las posiciones (índices en la secuencia original) de las notas que
+    se solapan con ``[t0, t1)``, es decir, aquellas que cumplen
+    ``not (fin <= t0 or inicio >= t1)``.  Las posiciones se devuelven en el
+    orden original para que el resultado coincida con un filtrado lineal.
+
+    Las consultas con ``t0`` no decreciente, como las del recorrido por
+    corcheas de ``procesa_midi``, se resuelven con una línea de barrido en
+    O(log M + k) amortizado.  Una consulta que retrocede en el tiempo reinicia
+    el barrido desde el principio.
+
+    El índice conserva los tiempos con los que fue construido.  Si las notas se
+    acortan después (por ejemplo con ``recortar_notas_a_segmento``) las
+    consultas devuelven un superconjunto de las notas activas y el llamador
+    debe volver a comprobar los tiempos actuales.
+    """
+
+    def __init__(self, inicios, finales):
+        orden = sorted(range(len(inicios)), key=inicios.__getitem__)
+        self._orden = orden
+        self._inicios = [inicios[p] for p in orden]
+        self._finales = [finales[p] for p in orden]
+        self._reiniciar()
+
+    @classmethod
+    def desde_notas(cls, notas):
+        """Construye el índice a partir de objetos con ``start`` y ``end``."""
+        return cls([n.start for n in notas], [n.end for n in notas])
+
+    def __len__(self):
+        return len(self._orden)
+
+    def _reiniciar(self):
+        self._siguiente = 0
+        self._activas = []
+        self._ultimo = None
+
+    def activas(self, t0, t1):
+        """Devuelve las posiciones de las notas activas en ``[t0, t1)``."""
+        if self._ultimo is not None and (t0 < self._ultimo[0] or t1 < self._ultimo[1]):
+            self._reiniciar()
+        self._ultimo = (t0, t1)
+
+        inicios = self._inicios
+        finales = self._finales
+        orden = self._orden
+        activas = self._activas
+        fin_orden = bisect_left(inicios, t1, lo=self._siguiente)
+        for k in range(self._siguiente, fin_orden):
+            if finales[k] > t0:
+                heapq.heappush(activas, (finales[k], orden[k]))
+        self._siguiente = fin_orden
+
+        while activas and activas[0][0] <= t0:
+            heapq.heappop(activas)
+        return sorted(p for _, p in activas)
@@ -0,0 +1,157 @@
+from array import array
+
+
+def _nueva_columna(tipo, valores):
+    if isinstance(valores, memoryview) and valores.format == tipo:
+        columna = array(tipo)
+        columna.frombytes(valores.cast("B"))
+        return columna
+    return array(tipo, valores)
+
+
+def _columna(nombre):
+    def leer(self):
+        return getattr(self._notas, nombre)[self._i]
+
+    def escribir(self, valor):
+        getattr(self._notas, nombre)[self._i] = valor
+
+    return property(leer, escribir)
+
+
+class NotaColumnar:
+    """Vista de una nota dentro de ``NotasColumnares``.
+
+    Expone ``start``, ``end``, ``pitch`` y ``velocity`` como atributos, igual
+    que ``pretty_midi.Note``, pero lee y escribe directamente en las columnas
+    del almacén.  Permite reutilizar funciones escritas para objetos nota, como
+    ``recortar_notas_a_segmento``, sin crear copias.
+    """
+
+    __slots__ = ("_notas", "_i")
+
+    def __init__(self, notas, i):
+        self._notas = notas
+        self._i = i
+
+    start = _columna("start")
+    end = _columna("end")
+    pitch = _columna("pitch")
+    velocity = _columna("velocity")
+
+    def __repr__(self):
+        return (
+            f"NotaColumnar(start={self.start}, end={self.end}, "
+            f"pitch={self.pitch}, velocity={self.velocity})"
+        )
+
+
+class NotasColumnares:
+    """Almacén columnar de notas con arrays paralelos.
+
+    ``start`` y ``end`` se guardan como dobles, ``pitch`` como entero con signo
+    (las rotaciones pueden sacar notas de rango de forma temporal) y
+    ``velocity`` como byte.  Las funciones del procesamiento aceptan tanto este
+    almacén como listas de objetos nota; la conversión a ``pretty_midi`` se hace
+    solo al escribir con ``a_notas``.
+    """
+
+    __slots__ = ("start", "end", "pitch", "velocity")
+
+    def __init__(self, start=(), end=(), pitch=(), velocity=()):
+        self.start = _nueva_columna("d", start)
+        self.end = _nueva_columna("d", end)
+        self.pitch = _nueva_columna("h", pitch)
+        self.velocity = _nueva_columna("B", velocity)
+
+    @classmethod
+    def sobre_buffers(cls, start, end, pitch, velocity):
+        """Crea un almacén de solo lectura sobre buffers existentes, sin copiarlos.
+
+        Pensado para columnas mapeadas con ``mmap`` (ver ``cache_disco``):
+        admite todas las operaciones de lectura, y ``copia`` devuelve un
+        almacén normal que se puede modificar.
+        """
+        notas = cls.__new__(cls)
+        notas.start, notas.end, notas.pitch, notas.velocity = start, end, pitch, velocity
+        return notas
+
+    @classmethod
+    def desde_notas(cls, notas):
+        """Crea el almacén a partir de objetos con ``start``/``end``/``pitch``/``velocity``."""
+        return cls(
+            [n.start for n in notas],
+            [n.end for n in notas],
+            [n.pitch for n in notas],
+            [n.velocity for n in notas],
+        )
+
+    @classmethod
+    def desde_tuplas(cls, tuplas):
+        """Crea el almacén a partir de tuplas ``(start, end, pitch, velocity)``."""
+        columnas = tuple(zip(*tuplas)) or ((), (), (), ())
+        return cls(*columnas)
+
+    def __len__(self):
+        return len(self.start)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self.start)
+        if not 0 <= i < len(self.start):
+            raise IndexError(i)
+        return NotaColumnar(self, i)
+
+    def __iter__(self):
+        for i in range(len(self.start)):
+            yield NotaColumnar(self, i)
+
+    def tuplas(self):
+        """Itera las notas como tuplas ``(start, end, pitch, velocity)``."""
+        return zip(self.start, self.end, self.pitch, self.velocity)
+
+    def agregar(self, start, end, pitch, velocity):
+        """Añade una nota al final y devuelve su posición."""
+        self.start.append(start)
+        self.end.append(end)
+        self.pitch.append(pitch)
+        self.velocity.append(velocity)
+        return len(self.start) - 1
+
+    def extender(self, otras):
+        """Añade al final las notas de otro ``NotasColumnares``."""
+        self.start.extend(otras.start)
+        self.end.extend(otras.end)
+        self.pitch.extend(otras.pitch)
+        self.velocity.extend(otras.velocity)
+
+    def copia(self):
+        return NotasColumnares(self.start, self.end, self.pitch, self.velocity)
+
+    def seleccionar(self, posiciones):
+        """Devuelve un almacén nuevo con las notas de ``posiciones``, en ese orden."""
+        return NotasColumnares(
+            [self.start[p] for p in posiciones],
+            [self.end[p] for p in posiciones],
+            [self.pitch[p] for p in posiciones],
+            [self.velocity[p] for p in posiciones],
+        )
+
+    def ordenar_por_inicio(self):
+        """Ordena las notas por ``start`` de forma estable, en el mismo almacén."""
+        orden = sorted(range(len(self.start)), key=self.start.__getitem__)
+        ordenadas = self.seleccionar(orden)
+        self.start = ordenadas.start
+        self.end = ordenadas.end
+        self.pitch = ordenadas.pitch
+        self.velocity = ordenadas.velocity
+
+    def a_notas(self, cls=None):
+        """Convierte el almacén en una lista de notas (``pretty_midi.Note`` por defecto)."""
+        if cls is None:
+            import pretty_midi
+
+            cls = pretty_midi.Note
+        return [
+            cls(velocity=v, pitch=p, start=s, end=e) for s, e, p, v in self.tuplas()
+        ]
@@ -0,0 +1,150 @@
+"""Medición opcional del tiempo de cada etapa de ``procesa_midi``.
+
+Uso::
+
+    from perfil import perfilar
+
+    with perfilar() as p:
+        procesa_midi("reference_comping.mid", "Dm7 G7 | C∆", save=False)
+    print(p.como_dict())
+
+Mientras hay un ``perfilar`` activo en el hilo actual, cada etapa instrumentada
+acumula segundos, llamadas y elementos procesados, y al salir se calculan los
+aciertos de las cachés registradas con ``registrar_cache``.  Los resultados se
+publican además a los sumideros añadidos con ``registrar_sumidero`` (por
+ejemplo, un registro o un servicio de métricas).  Sin perfil activo cada punto
+de medición se reduce a una consulta de atributo, por lo que el coste es
+despreciable.
+
+Los tiempos de etapas anidadas se incluyen en la etapa exterior.  Las cachés
+son globales al proceso, así que si otros hilos renderizan a la vez sus
+aciertos también se cuentan.
+"""
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+_actual = threading.local()
+_NULO = nullcontext()
+_caches = {}
+_sumideros = []
+_lock = threading.Lock()
+
+
+class Perfil:
+    """Acumula las mediciones de un render."""
+
+    def __init__(self):
+        self.etapas = {}
+        self.caches = {}
+        self.segundos = 0.0
+
+    def _entrada(self, nombre):
+        entrada = self.etapas.get(nombre)
+        if entrada is None:
+            entrada = self.etapas[nombre] = {"segundos": 0.0, "llamadas": 0, "elementos": 0}
+        return entrada
+
+    def como_dict(self):
+        """Devuelve las mediciones como un diccionario serializable a JSON."""
+        return {
+            "segundos": self.segundos,
+            "etapas": {nombre: dict(valores) for nombre, valores in self.etapas.items()},
+            "caches": {nombre: dict(valores) for nombre, valores in self.caches.items()},
+        }
+
+
+def perfil_actual():
+    """Devuelve el ``Perfil`` activo en este hilo o ``None``."""
+    return getattr(_actual, "perfil", None)
+
+
+@contextmanager
+def _medir(perfil, nombre, elementos):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        entrada = perfil._entrada(nombre)
+        entrada["segundos"] += time.perf_counter() - inicio
+        entrada["llamadas"] += 1
+        entrada["elementos"] += elementos
+
+
+def etapa(nombre, elementos=0):
+    """Contexto que mide la etapa ``nombre`` si hay un perfil activo."""
+    perfil = getattr(_actual, "perfil", None)
+    if perfil is None:
+        return _NULO
+    return _medir(perfil, nombre, elementos)
+
+
+def contar(nombre, elementos):
+    """Suma ``elementos`` a la etapa ``nombre`` sin medir tiempo."""
+    perfil = getattr(_actual, "perfil", None)
+    if perfil is not None:
+        perfil._entrada(nombre)["elementos"] += elementos
+
+
+def registrar_cache(nombre, estadisticas):
+    """Registra una caché cuya tasa de aciertos se incluirá en los perfiles.
+
+    ``estadisticas`` debe devolver una tupla ``(aciertos, fallos)`` acumulada.
+    """
+    with _lock:
+        _caches[nombre] = estadisticas
+
+
+def registrar_sumidero(sumidero):
+    """Añade una función que recibe ``Perfil.como_dict()`` al terminar cada perfil."""
+    with _lock:
+        _sumideros.append(sumidero)
+
+
+def quitar_sumidero(sumidero):
+    with _lock:
+        _sumideros.remove(sumidero)
+
+
+def _contadores_caches():
+    with _lock:
+        caches = dict(_caches)
+    return {nombre: estadisticas() for nombre, estadisticas in caches.items()}
+
+
+@contextmanager
+def perfilar(publicar=True):
+    """Activa un ``Perfil`` en el hilo actual y lo devuelve.
+
+    Si ``publicar`` es ``True`` el resultado se envía a los sumideros
+    registrados al salir del bloque.  Los perfiles se pueden anidar: el
+    interior sustituye al exterior mientras está activo.
+    """
+    perfil = Perfil()
+    anterior = getattr(_actual, "perfil", None)
+    antes = _contadores_caches()
+    inicio = time.perf_counter()
+    _actual.perfil = perfil
+    try:
+        yield perfil
+    finally:
+        _actual.perfil = anterior
+        perfil.segundos = time.perf_counter() - inicio
+        for nombre, (aciertos, fallos) in _contadores_caches().items():
+            aciertos0, fallos0 = antes.get(nombre, (0, 0))
+            aciertos, fallos = aciertos - aciertos0, fallos - fallos0
+            # Un contador reiniciado durante el perfil se toma desde cero.
+            if aciertos < 0 or fallos < 0:
+                aciertos, fallos = aciertos + aciertos0, fallos + fallos0
+            total = aciertos + fallos
+            perfil.caches[nombre] = {
+                "aciertos": aciertos,
+                "fallos": fallos,
+                "tasa_aciertos": aciertos / total if total else None,
+            }
+        if publicar:
+            with _lock:
+                sumideros = list(_sumideros)
+            datos = perfil.como_dict()
+            for sumidero in sumideros:
+                sumidero(datos)
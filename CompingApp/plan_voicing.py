@@ -0,0 +1,370 @@
+import threading
+from collections import OrderedDict, namedtuple
+
+from cifrado_utils import analizar_acorde
+from perfil import registrar_cache
+from procesa_midi import (
+    CadenaVoicing,
+    _primer_voicing,
+    compases_cifrado,
+    notas_midi_acorde,
+    notas_naturales,
+    tabla_voicings,
+)
+
+# Registro de los voicings (D3–C5) y salto máximo del bajo entre dos acordes,
+# las mismas reglas que aplica ``notas_midi_acorde``.
+NOTA_MINIMA = 50
+NOTA_MAXIMA = 72
+SALTO_MAXIMO_BAJO = 5
+
+# Número máximo de planes memorizados por ``plan_cifrado``.
+MAX_PLANES = 64
+
+# Corcheas de un acorde que se calculan de antemano en el enlace voraz si el
+# voicing no se estabiliza antes (una cadena suele estabilizarse en dos).
+MAX_PASOS_CADENA = 8
+
+InversionAcorde = namedtuple(
+    "InversionAcorde", "acorde prev_bajo notas inversion fundamental grados",
+    defaults=(None, None),
+)
+InversionAcorde.__doc__ = """Voicing calculado para un acorde del cifrado.
+
+``prev_bajo`` es el bajo del acorde anterior con el que se calculó (``None``
+para el primero), ``notas`` las alturas MIDI elegidas (``None`` si el símbolo
+no se pudo analizar) e ``inversion`` el índice de la inversión base según la
+nota más grave.  ``fundamental`` y ``grados`` son el resultado de
+``analizar_acorde`` (``None`` si no se pudo analizar).
+"""
+
+
+def extraer_acordes(texto):
+    """Devuelve la lista de símbolos de acorde de un cifrado con barras.
+
+    Las marcas de ensayo (``[A]``) no cuentan como acordes, de modo que la
+    posición de cada símbolo coincide con ``SegmentoAcorde.indice``.
+    """
+    return [acorde for compas in compases_cifrado(texto)[0] for acorde in compas]
+
+
+def _analizar(acorde, prev_bajo):
+    try:
+        fundamental, grados = analizar_acorde(acorde)
+    except ValueError:
+        return InversionAcorde(acorde, prev_bajo, None, 0)
+
+    if prev_bajo is None:
+        inv_escogida = 0
+        notas = None
+        for inv in range(4):
+            cand = notas_midi_acorde(
+                fundamental, grados, base_octava=4, prev_bajo=None, inversion=inv
+            )
+            notas = cand
+            if cand[0] >= 57:
+                inv_escogida = inv
+                break
+        return InversionAcorde(acorde, prev_bajo, notas, inv_escogida, fundamental, grados)
+
+    notas = notas_midi_acorde(fundamental, grados, base_octava=4, prev_bajo=prev_bajo)
+    inversion = _indice_inversion(fundamental, grados, notas)
+    return InversionAcorde(acorde, prev_bajo, notas, inversion, fundamental, grados)
+
+
+def _indice_inversion(fundamental, grados, notas):
+    base = 48 + notas_naturales.get(fundamental, 0)
+    diff = (notas[0] - base) % 12
+    grados_mod = [g % 12 for g in grados]
+    return grados_mod.index(diff) if diff in grados_mod else 0
+
+
+def analizar_inversiones(acordes, previo=()):
+    """Calcula el voicing y la inversión base de cada acorde.
+
+    Cada acorde se enlaza con el bajo del anterior.  ``previo`` es el resultado
+    de una llamada anterior: las entradas cuyo símbolo y bajo de partida no
+    cambiaron se reutilizan sin recalcular, de modo que editar un acorde solo
+    recalcula ese acorde y los siguientes cuyo bajo de partida se vea afectado.
+    Los símbolos que no se pueden analizar no modifican el bajo de partida del
+    siguiente acorde.
+    """
+    entradas = []
+    prev_bajo = None
+    for i, acorde in enumerate(acordes):
+        anterior = previo[i] if i < len(previo) else None
+        if (
+            anterior is not None
+            and anterior.acorde == acorde
+            and anterior.prev_bajo == prev_bajo
+        ):
+            entrada = anterior
+        else:
+            entrada = _analizar(acorde, prev_bajo)
+        entradas.append(entrada)
+        if entrada.notas is not None:
+            prev_bajo = entrada.notas[0]
+    return entradas
+
+
+def cadena_voicing(fundamental, grados, bajo_entrada=None):
+    """Calcula la ``CadenaVoicing`` del enlace voraz de un acorde.
+
+    Hace las mismas búsquedas en ``tabla_voicings`` que el render, corchea a
+    corchea, hasta que el voicing se repite o se llega a
+    ``MAX_PASOS_CADENA``.
+    """
+    tabla = tabla_voicings()
+    clase = notas_naturales.get(fundamental, 0)
+    if bajo_entrada is None:
+        voicing = _primer_voicing(tabla, clase, grados)
+    else:
+        voicing = tabla.voicing(clase, grados, bajo_entrada)
+    voicings = [voicing]
+    while len(voicings) < MAX_PASOS_CADENA:
+        siguiente = tabla.voicing(clase, grados, voicing[0])
+        if siguiente == voicing:
+            return CadenaVoicing(bajo_entrada, tuple(voicings), True)
+        voicings.append(siguiente)
+        voicing = siguiente
+    return CadenaVoicing(bajo_entrada, tuple(voicings), False)
+
+
+def cadenas_voraces(entradas, previo=None):
+    """Devuelve la ``CadenaVoicing`` de cada entrada de ``analizar_inversiones``.
+
+    Cada acorde se enlaza con el último voicing de la cadena del anterior,
+    que es con el que lo alcanza el render si el anterior dura lo bastante.
+    ``previo`` es un ``PlanVoicing`` voraz anterior: sus cadenas se
+    reutilizan si el símbolo y el bajo de entrada no cambiaron.  Los
+    símbolos que no se pueden analizar quedan como ``None``.
+    """
+    anteriores = {}
+    if previo is not None and previo.cadenas is not None:
+        anteriores = {
+            (acorde, cadena.bajo_entrada): cadena
+            for acorde, cadena in zip(previo.acordes, previo.cadenas)
+            if cadena is not None
+        }
+    cadenas = []
+    bajo = None
+    for entrada in entradas:
+        if entrada.grados is None:
+            cadenas.append(None)
+            continue
+        cadena = anteriores.get((entrada.acorde, bajo))
+        if cadena is None:
+            cadena = cadena_voicing(entrada.fundamental, entrada.grados, bajo)
+        cadenas.append(cadena)
+        bajo = cadena.voicings[-1][0]
+    return tuple(cadenas)
+
+
+def candidatos_voicing(fundamental, grados):
+    """Devuelve los voicings posibles de un acorde, sin repetir.
+
+    Recorre la misma rejilla que ``notas_midi_acorde`` (cada inversión
+    desplazada de -2 a +2 octavas), cierra cada candidato en una octava y
+    descarta los que salen del registro D3–C5.
+    """
+    base = 48 + notas_naturales.get(fundamental, 0)
+    grados = list(grados)
+    candidatos = []
+    for k in range(len(grados)):
+        inv = grados[k:] + [g + 12 for g in grados[:k]]
+        for sh in range(-2, 3):
+            cand = sorted(base + g + 12 * sh for g in inv)
+            while cand[-1] - cand[0] > 12:
+                cand[-1] -= 12
+                cand.sort()
+            cand = tuple(cand)
+            if cand[0] < NOTA_MINIMA or cand[-1] > NOTA_MAXIMA or cand in candidatos:
+                continue
+            candidatos.append(cand)
+    return candidatos
+
+
+def distancia_voces(previo, siguiente):
+    """Movimiento total de las voces entre dos voicings de cuatro notas.
+
+    Empareja las voces en orden de altura, que en una dimensión es el
+    emparejamiento de movimiento mínimo (el mismo coste que minimiza
+    ``procesa_midi.enlazar_notas``).
+    """
+    return sum(abs(a - b) for a, b in zip(sorted(previo), sorted(siguiente)))
+
+
+def planificar_voicings(acordes_analizados):
+    """Elige el voicing de cada acorde minimizando el movimiento total.
+
+    ``acordes_analizados`` es una lista de ``(fundamental, grados)`` o
+    ``None`` para los símbolos que no se pudieron analizar, que se saltan
+    (el enlace continúa con el acorde siguiente) y quedan como ``None`` en
+    el resultado.  A diferencia de ``notas_midi_acorde``, que decide acorde a
+    acorde, se busca el camino de menor ``distancia_voces`` acumulada sobre
+    todo el cifrado (Viterbi, O(acordes × estados²)).  Los estados de cada
+    acorde son sus ``candidatos_voicing`` y entre dos acordes solo se
+    permiten saltos del bajo de hasta cinco semitonos, salvo que ningún
+    voicing anterior lo permita.  Los empates se resuelven a favor del
+    candidato que aparece antes en la rejilla.
+    """
+    plan = [None] * len(acordes_analizados)
+    capas = []
+    for k, analizado in enumerate(acordes_analizados):
+        if analizado is None:
+            continue
+        candidatos = candidatos_voicing(*analizado)
+        if not candidatos:
+            candidatos = [tuple(notas_midi_acorde(*analizado))]
+        if not capas:
+            costes = [0] * len(candidatos)
+            previos = [None] * len(candidatos)
+        else:
+            _, anteriores, costes_anteriores, _ = capas[-1]
+            costes = []
+            previos = []
+            for cand in candidatos:
+                permitidos = [
+                    j for j, ant in enumerate(anteriores)
+                    if abs(ant[0] - cand[0]) <= SALTO_MAXIMO_BAJO
+                ] or range(len(anteriores))
+                mejor = min(
+                    permitidos,
+                    key=lambda j: (costes_anteriores[j] + distancia_voces(anteriores[j], cand), j),
+                )
+                costes.append(costes_anteriores[mejor] + distancia_voces(anteriores[mejor], cand))
+                previos.append(mejor)
+        capas.append((k, candidatos, costes, previos))
+
+    if capas:
+        _, _, costes, _ = capas[-1]
+        estado = min(range(len(costes)), key=lambda j: (costes[j], j))
+        for k, candidatos, _, previos in reversed(capas):
+            plan[k] = candidatos[estado]
+            estado = previos[estado]
+    return plan
+
+
+def planificar_inversiones(acordes):
+    """Versión de ``analizar_inversiones`` con los voicings de ``planificar_voicings``.
+
+    Devuelve una ``InversionAcorde`` por símbolo; ``prev_bajo`` es el bajo del
+    voicing planificado para el acorde anterior.
+    """
+    analizados = []
+    for acorde in acordes:
+        try:
+            analizados.append(analizar_acorde(acorde))
+        except ValueError:
+            analizados.append(None)
+    entradas = []
+    prev_bajo = None
+    for acorde, analizado, notas in zip(acordes, analizados, planificar_voicings(analizados)):
+        if notas is None:
+            entradas.append(InversionAcorde(acorde, prev_bajo, None, 0))
+            continue
+        fundamental, grados = analizado
+        inversion = _indice_inversion(fundamental, grados, notas)
+        entradas.append(
+            InversionAcorde(acorde, prev_bajo, list(notas), inversion, fundamental, grados)
+        )
+        prev_bajo = notas[0]
+    return entradas
+
+
+class PlanVoicing:
+    """Voicing de cada acorde de un cifrado, compartido por la interfaz y el render.
+
+    ``entradas`` tiene una ``InversionAcorde`` por símbolo de ``acordes``
+    (fundamental, grados, alturas e inversión base).  Con ``optimo`` las
+    alturas son las de ``planificar_voicings`` y el render las usa tal cual
+    (ver ``voicings``); sin él son las del enlace voraz acorde a acorde, que
+    sirven para mostrar las inversiones, y ``cadenas`` guarda las búsquedas
+    que hará el render al enlazar corchea a corchea (ver
+    ``cadenas_voraces``), para que no las repita.  Los planes se comparten:
+    no deben modificarse.
+    """
+
+    def __init__(self, acordes, entradas, optimo=False, cadenas=None):
+        self.acordes = tuple(acordes)
+        self.entradas = tuple(entradas)
+        self.optimo = optimo
+        self.cadenas = cadenas
+
+    def __len__(self):
+        return len(self.entradas)
+
+    @property
+    def inversiones(self):
+        """Inversión base de cada acorde."""
+        return [e.inversion for e in self.entradas]
+
+    @property
+    def voicings(self):
+        """Alturas fijas de cada acorde para el render o, sin ``optimo``, sus ``cadenas``."""
+        if not self.optimo:
+            return self.cadenas
+        return tuple(tuple(e.notas) if e.notas is not None else None for e in self.entradas)
+
+
+_planes = OrderedDict()
+_estadisticas = {"aciertos": 0, "fallos": 0}
+_lock = threading.Lock()
+
+
+def plan_cifrado(texto, optimo=False, previo=None):
+    """Devuelve el ``PlanVoicing`` de ``texto``, calculándolo una sola vez.
+
+    Los planes se memorizan por la secuencia de símbolos del cifrado y
+    ``optimo``, así que la interfaz, al escribir, y el render, al
+    previsualizar o exportar el mismo texto, comparten el cálculo.  En el modo
+    voraz ``previo`` (el plan anterior de la interfaz) permite reutilizar las
+    entradas que no cambiaron (ver ``analizar_inversiones``).
+    """
+    return plan_acordes(extraer_acordes(texto), optimo, previo)
+
+
+def plan_acordes(acordes, optimo=False, previo=None):
+    """Como ``plan_cifrado`` a partir de la lista de símbolos ya extraída."""
+    acordes = tuple(acordes)
+    clave = (acordes, optimo)
+    with _lock:
+        plan = _planes.get(clave)
+        if plan is not None:
+            _planes.move_to_end(clave)
+            _estadisticas["aciertos"] += 1
+            return plan
+        _estadisticas["fallos"] += 1
+    if optimo:
+        plan = PlanVoicing(acordes, planificar_inversiones(acordes), optimo)
+    else:
+        if previo is not None and previo.optimo:
+            previo = None
+        entradas = analizar_inversiones(acordes, previo.entradas if previo is not None else ())
+        plan = PlanVoicing(acordes, entradas, optimo, cadenas_voraces(entradas, previo))
+    with _lock:
+        _planes[clave] = plan
+        while len(_planes) > MAX_PLANES:
+            _planes.popitem(last=False)
+    return plan
+
+
+def estadisticas_cache_planes():
+    """Devuelve aciertos, fallos y número de planes memorizados."""
+    with _lock:
+        return dict(_estadisticas, planes=len(_planes))
+
+
+def limpiar_cache_planes():
+    """Olvida los planes memorizados y reinicia sus estadísticas."""
+    with _lock:
+        _planes.clear()
+        _estadisticas.update(aciertos=0, fallos=0)
+
+
+def _aciertos_planes():
+    with _lock:
+        return _estadisticas["aciertos"], _estadisticas["fallos"]
+
+
+registrar_cache("planes_voicing", _aciertos_planes)
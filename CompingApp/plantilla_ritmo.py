@@ -0,0 +1,179 @@
+"""Plantilla rítmica precompilada de una referencia.
+
+La parte del voicing que no depende del cifrado (qué notas suenan en cada
+corchea, cómo se recortan, qué notas se duplican y cuándo quedan fijadas) se
+calcula una sola vez por referencia, ``window_order`` y duración de corchea con
+``procesa_midi.compilar_plantilla``.  Renderizar un cifrado consiste entonces
+en recorrer la plantilla asignando alturas.
+
+Cada corchea es una ranura con:
+
+* ``miembros``: posiciones de las cuatro notas que la tocan (ninguna si es un
+  silencio) y el ``start``/``end`` que quedan tras recortarlas a la corchea;
+* ``duplicados``: posición de la nota de la que se copia cada nota nueva que
+  se crea en la ranura (las nuevas se numeran a continuación de las
+  existentes, en orden de creación);
+* ``emitidas``: notas que quedan fijadas al terminar la ranura, ordenadas por
+  inicio;
+* ``pendientes``: notas ya empezadas que aún no están fijadas tras la ranura.
+
+Las listas se guardan en formato CSR: un array con todos los valores y otro
+con el desplazamiento donde empieza cada ranura.
+
+En disco la plantilla se guarda con el formato de columnas de
+``cache_disco`` (ver ``guardar`` y ``cargar``) y se abre con ``mmap``.  La de
+la referencia sin reordenar va junto al ``.mid``, con sus mismos permisos; si
+la referencia cambia, la firma de la cabecera deja de coincidir y la
+plantilla se vuelve a compilar.  Las de cada ``window_order`` van a la
+``cache_disco.CacheDisco``, que limita su tamaño total y borra las menos
+usadas, para no dejar un archivo por orden junto a la referencia.
+"""
+import hashlib
+import struct
+from array import array
+
+from cache_disco import abrir_columnas, escribir_columnas, tipo_columna
+from notas_columnares import NotasColumnares
+
+MAGIA = b"CRIT"
+VERSION = 2
+EXTENSION = ".ritmo"
+
+# Columnas en el orden en que se guardan, con su tipo de ``array``.
+COLUMNAS = (
+    ("start", "d"),
+    ("end", "d"),
+    ("pitch", "h"),
+    ("velocity", "B"),
+    ("inicio_miembros", "i"),
+    ("miembros", "i"),
+    ("start_miembros", "d"),
+    ("end_miembros", "d"),
+    ("inicio_duplicados", "i"),
+    ("duplicados", "i"),
+    ("inicio_emitidas", "i"),
+    ("emitidas", "i"),
+    ("inicio_pendientes", "i"),
+    ("pendientes", "i"),
+)
+
+
+class PlantillaRitmo:
+    """Esqueleto rítmico de una referencia, listo para asignar alturas.
+
+    ``start``/``end``/``pitch``/``velocity`` son las notas de la referencia
+    (ya reordenadas por ventanas) antes del voicing.  El resto de columnas
+    describen las ranuras como se explica en el módulo.
+    """
+
+    __slots__ = ("dur_corchea", "tiempo_inicio") + tuple(nombre for nombre, _ in COLUMNAS)
+
+    def __init__(self, dur_corchea, tiempo_inicio, **columnas):
+        self.dur_corchea = dur_corchea
+        self.tiempo_inicio = tiempo_inicio
+        for nombre, tipo in COLUMNAS:
+            setattr(self, nombre, array(tipo, columnas.get(nombre, ())))
+        for nombre in ("inicio_miembros", "inicio_duplicados", "inicio_emitidas",
+                       "inicio_pendientes"):
+            if not getattr(self, nombre):
+                getattr(self, nombre).append(0)
+
+    def __reduce__(self):
+        # Las columnas pueden ser ``memoryview`` sobre un ``mmap``; al enviar la
+        # plantilla a otro proceso se copian a ``array``.
+        columnas = {nombre: array(tipo, getattr(self, nombre)) for nombre, tipo in COLUMNAS}
+        return PlantillaRitmo.desde_columnas, ((self.dur_corchea, self.tiempo_inicio), columnas)
+
+    def __len__(self):
+        """Número de ranuras (corcheas) de la plantilla."""
+        return len(self.inicio_miembros) - 1
+
+    def notas_base(self):
+        """Devuelve un ``NotasColumnares`` nuevo con las notas antes del voicing."""
+        return NotasColumnares(self.start, self.end, self.pitch, self.velocity)
+
+    def _rango(self, inicios, i):
+        if i >= len(inicios) - 1:
+            return 0, 0
+        return inicios[i], inicios[i + 1]
+
+    def miembros_de(self, i):
+        """Devuelve ``(desde, hasta)`` de la ranura ``i`` en ``miembros``."""
+        return self._rango(self.inicio_miembros, i)
+
+    def duplicados_de(self, i):
+        a, b = self._rango(self.inicio_duplicados, i)
+        return self.duplicados[a:b]
+
+    def emitidas_de(self, i):
+        a, b = self._rango(self.inicio_emitidas, i)
+        return self.emitidas[a:b]
+
+    def pendientes_de(self, i):
+        a, b = self._rango(self.inicio_pendientes, i)
+        return self.pendientes[a:b]
+
+    def guardar(self, ruta, clave_referencia=(0, 0), modo=None):
+        """Escribe la plantilla en ``ruta`` de forma atómica.
+
+        ``clave_referencia`` es ``(st_mtime_ns, st_size)`` del ``.mid`` del que
+        se obtuvo, para detectar al cargar que la referencia cambió.  ``modo``
+        son los permisos del archivo (ver ``cache_disco.escribir_columnas``).
+        """
+        escribir_columnas(
+            ruta, MAGIA, VERSION, self.columnas(),
+            (self.dur_corchea, self.tiempo_inicio), _firma(clave_referencia), modo,
+        )
+
+    def columnas(self):
+        """Devuelve las columnas por nombre, en el orden de ``COLUMNAS``."""
+        return {nombre: getattr(self, nombre) for nombre, _ in COLUMNAS}
+
+    @classmethod
+    def desde_columnas(cls, escalares, columnas):
+        """Crea la plantilla sobre columnas leídas con ``abrir_columnas``, sin copiarlas."""
+        if len(escalares) != 2 or set(columnas) != {nombre for nombre, _ in COLUMNAS}:
+            return None
+        for nombre, tipo in COLUMNAS:
+            if tipo_columna(columnas[nombre]) != tipo:
+                return None
+        plantilla = cls.__new__(cls)
+        plantilla.dur_corchea, plantilla.tiempo_inicio = escalares
+        for nombre, columna in columnas.items():
+            setattr(plantilla, nombre, columna)
+        return plantilla
+
+    @classmethod
+    def cargar(cls, ruta, clave_referencia=None):
+        """Abre una plantilla con ``mmap``.
+
+        Devuelve ``None`` si el archivo no es válido o está desactualizado.  Las
+        columnas quedan mapeadas en memoria y son de solo lectura, de modo
+        que los procesos que usan la misma plantilla comparten sus páginas.
+        """
+        firma = _firma(clave_referencia) if clave_referencia is not None else None
+        leido = abrir_columnas(ruta, MAGIA, VERSION, firma)
+        if leido is None:
+            return None
+        return cls.desde_columnas(*leido)
+
+    @classmethod
+    def desde_cache(cls, cache, clave):
+        """Lee la plantilla de una ``cache_disco.CacheDisco`` o devuelve ``None``."""
+        leido = cache.leer(MAGIA, clave, VERSION)
+        return cls.desde_columnas(*leido) if leido is not None else None
+
+    def guardar_en_cache(self, cache, clave):
+        cache.escribir(
+            MAGIA, clave, self.columnas(), (self.dur_corchea, self.tiempo_inicio), VERSION
+        )
+
+
+def _firma(clave_referencia):
+    return struct.pack("<QQ", *clave_referencia)
+
+
+def ruta_plantilla(ruta_midi, dur_corchea):
+    """Ruta de la plantilla de ``ruta_midi`` sin reordenar, para una duración de corchea."""
+    firma = hashlib.sha1(repr(float(dur_corchea)).encode()).hexdigest()[:12]
+    return f"{ruta_midi}.{firma}{EXTENSION}"
@@ -0,0 +1,185 @@
+"""Render por lotes de cifrados contra una misma referencia.
+
+Uso::
+
+    python procesa_lote.py manifiesto.json --salida renders --procesos 4
+
+El manifiesto es un JSON con la forma::
+
+    {
+        "referencia": "reference_comping.mid",
+        "opciones": {"spread": true},
+        "cifrados": [
+            {"nombre": "blues", "cifrado": "C7 | F7 | C7 | G7"},
+            {"cifrado": "Dm7 G7 | C∆", "rotacion": 1, "rotaciones": {"1": -1}}
+        ]
+    }
+
+``opciones`` define valores por defecto para todas las entradas y cada entrada
+puede sobrescribirlos.  Las opciones admitidas son ``rotacion``,
+``rotaciones``, ``octavas``, ``spread`` y ``window_order``.  Cada resultado se
+escribe como ``NNNN-nombre.mid`` en la carpeta de salida, donde ``NNNN`` es la
+posición de la entrada en el manifiesto.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+OPCIONES = ("rotacion", "rotaciones", "octavas", "spread", "window_order")
+
+
+def _normalizar_opciones(opciones):
+    """Convierte las claves de ``rotaciones`` y ``octavas`` a enteros."""
+    resultado = {}
+    for clave in OPCIONES:
+        if clave not in opciones:
+            continue
+        valor = opciones[clave]
+        if clave in ("rotaciones", "octavas") and valor:
+            valor = {int(k): int(v) for k, v in valor.items()}
+        resultado[clave] = valor
+    return resultado
+
+
+def nombre_salida(posicion, nombre=None):
+    """Nombre de archivo determinista para la entrada ``posicion`` (desde 0)."""
+    limpio = re.sub(r"[^\w.-]+", "_", nombre).strip("_") if nombre else ""
+    if limpio:
+        return f"{posicion + 1:04d}-{limpio}.mid"
+    return f"{posicion + 1:04d}.mid"
+
+
+def leer_manifiesto(ruta):
+    """Lee el manifiesto y devuelve ``(referencia, trabajos)``.
+
+    Cada trabajo es una tupla ``(nombre_archivo, cifrado, opciones)``.  La
+    referencia relativa se resuelve respecto a la carpeta del manifiesto.
+    """
+    with open(ruta, encoding="utf-8") as f:
+        datos = json.load(f)
+    referencia = datos.get("referencia")
+    if referencia and not os.path.isabs(referencia):
+        referencia = os.path.join(os.path.dirname(os.path.abspath(ruta)), referencia)
+    por_defecto = datos.get("opciones", {})
+    trabajos = []
+    for posicion, entrada in enumerate(datos.get("cifrados", [])):
+        if isinstance(entrada, str):
+            entrada = {"cifrado": entrada}
+        if not entrada.get("cifrado", "").strip():
+            raise ValueError(f"La entrada {posicion + 1} no tiene cifrado.")
+        opciones = _normalizar_opciones({**por_defecto, **entrada})
+        trabajos.append(
+            (nombre_salida(posicion, entrada.get("nombre")), entrada["cifrado"], opciones)
+        )
+    return referencia, trabajos
+
+
+def resumen_latencias(latencias, duracion_total):
+    """Calcula rendimiento y percentiles de latencia (en segundos)."""
+    if not latencias:
+        return {"cifrados": 0, "cifrados_por_segundo": 0.0}
+    ordenadas = sorted(latencias)
+
+    def percentil(p):
+        return ordenadas[min(len(ordenadas) - 1, int(round(p * (len(ordenadas) - 1))))]
+
+    return {
+        "cifrados": len(ordenadas),
+        "cifrados_por_segundo": len(ordenadas) / duracion_total if duracion_total else 0.0,
+        "media": sum(ordenadas) / len(ordenadas),
+        "p50": percentil(0.50),
+        "p95": percentil(0.95),
+        "maxima": ordenadas[-1],
+    }
+
+
+_referencia_trabajador = None
+
+
+def _iniciar_trabajador(referencia):
+    """Analiza la referencia una vez por proceso trabajador."""
+    global _referencia_trabajador
+    from referencia import cargar_referencia
+
+    _referencia_trabajador = referencia
+    cargar_referencia(referencia)
+
+
+def _renderizar(salida, nombre, cifrado, opciones):
+    from escritor_midi import ArchivoMidi
+    from perfil import etapa
+    from procesa_midi import renderizar_notas
+    from referencia import cargar_referencia
+
+    inicio = time.perf_counter()
+    notas = renderizar_notas(_referencia_trabajador, cifrado, **opciones)
+    ruta = os.path.join(salida, nombre)
+    with etapa("escritura", len(notas)):
+        cabecera = cargar_referencia(_referencia_trabajador).cabecera_midi()
+        ArchivoMidi(cabecera, notas).write(ruta)
+    return ruta, time.perf_counter() - inicio
+
+
+def procesa_lote(referencia, trabajos, salida, procesos=None):
+    """Renderiza ``trabajos`` en un grupo de procesos.
+
+    Devuelve ``(rutas, errores, resumen)``; ``errores`` es una lista de tuplas
+    ``(nombre, mensaje)`` para los cifrados que fallaron.
+    """
+    os.makedirs(salida, exist_ok=True)
+    rutas = []
+    errores = []
+    latencias = []
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=procesos, initializer=_iniciar_trabajador, initargs=(referencia,)
+    ) as ejecutor:
+        futuros = [
+            (nombre, ejecutor.submit(_renderizar, salida, nombre, cifrado, opciones))
+            for nombre, cifrado, opciones in trabajos
+        ]
+        for nombre, futuro in futuros:
+            try:
+                ruta, latencia = futuro.result()
+            except Exception as e:
+                errores.append((nombre, str(e)))
+                continue
+            rutas.append(ruta)
+            latencias.append(latencia)
+    resumen = resumen_latencias(latencias, time.perf_counter() - inicio)
+    return rutas, errores, resumen
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Renderiza un lote de cifrados.")
+    parser.add_argument("manifiesto", help="Archivo JSON con los cifrados")
+    parser.add_argument("--salida", default="output", help="Carpeta de salida")
+    parser.add_argument("--referencia", help="MIDI de referencia (sustituye al del manifiesto)")
+    parser.add_argument("--procesos", type=int, default=None, help="Número de procesos")
+    args = parser.parse_args(argv)
+
+    referencia, trabajos = leer_manifiesto(args.manifiesto)
+    referencia = args.referencia or referencia or "reference_comping.mid"
+    rutas, errores, resumen = procesa_lote(referencia, trabajos, args.salida, args.procesos)
+
+    for nombre, mensaje in errores:
+        print(f"Error en {nombre}: {mensaje}", file=sys.stderr)
+    print(f"Cifrados exportados: {len(rutas)} de {len(trabajos)}")
+    if resumen["cifrados"]:
+        print(f"Rendimiento: {resumen['cifrados_por_segundo']:.2f} cifrados/s")
+        print(
+            "Latencia por cifrado: "
+            f"media {resumen['media'] * 1e3:.1f} ms, "
+            f"p50 {resumen['p50'] * 1e3:.1f} ms, "
+            f"p95 {resumen['p95'] * 1e3:.1f} ms, "
+            f"máx {resumen['maxima'] * 1e3:.1f} ms"
+        )
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
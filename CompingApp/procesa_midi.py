@@ -1,9 +1,24 @@
+import math
 import os
-import itertools
-from pathlib import Path
-from collections import defaultdict
+import re
+import threading
+from array import array
+from collections import OrderedDict, defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import chain
 from acordes_dict import acordes
-from cifrado_utils import analizar_cifrado
+import cache_disco
+from cifrado_utils import analizar_acorde
+from escritor_midi import ArchivoMidi
+from indice_notas import IndiceNotas
+from asignacion import asignacion_minima
+from referencia import cargar_referencia
+from notas_columnares import NotasColumnares
+from perfil import contar, etapa, registrar_cache
+from plantilla_ritmo import PlantillaRitmo, ruta_plantilla
+from salida import escritor_salida
+from tabla_voicings import TablaVoicings
 
 notas_naturales = {
     'C': 0, 'C#': 1, 'Db': 1,
@@ -15,6 +30,112 @@ notas_naturales = {
     'B': 11
 }
 
+# Número máximo de voicings memorizados por ``notas_midi_acorde``.
+TAMANO_CACHE_VOICINGS = 4096
+
+# Separación (en segundos) que deja ``evitar_solapamientos`` entre dos notas
+# consecutivas de la misma altura.
+MARGEN_SOLAPAMIENTO = 0.01
+
+# Fracción de corchea que se tolera por redondeo al decidir en qué corchea
+# empieza una nota: un inicio calculado como ``tiempo_inicio + i * dur`` puede
+# quedar apenas por debajo de la corchea ``i``.
+TOLERANCIA_CORCHEA = 1e-6
+
+SegmentoAcorde = namedtuple("SegmentoAcorde", "acorde indice inicio largo")
+SegmentoAcorde.__doc__ = """Tramo de corcheas consecutivas con el mismo acorde del cifrado.
+
+``acorde`` es el símbolo, ``indice`` su posición al recorrer el cifrado de
+izquierda a derecha, ``inicio`` la primera corchea del tramo y ``largo`` el
+número de corcheas.
+"""
+
+CadenaVoicing = namedtuple("CadenaVoicing", "bajo_entrada voicings estable")
+CadenaVoicing.__doc__ = """Voicings del enlace voraz de un acorde, corchea a corchea.
+
+Dentro de un acorde cada corchea busca su voicing con el bajo de la
+anterior.  ``voicings`` son, en orden, los de las corcheas voiceadas del
+acorde cuando se llega a él con el bajo ``bajo_entrada`` (``None`` si el
+acorde abre el cifrado y se voicea con ``_primer_voicing``).  Con
+``estable`` el último se repite en el resto del acorde.
+"""
+
+
+_DOBLE_BARRA = re.compile(r"(\|\|)|\|")
+_MARCA_ENSAYO = re.compile(r"^\[[^\[\]]*\]$")
+
+
+def compases_cifrado(cifrado_texto):
+    """Divide un cifrado en compases.
+
+    Devuelve ``(compases, inicios_seccion)``: la lista de compases, cada uno
+    como lista de símbolos de acorde, y los índices de los compases en que
+    empieza una sección nueva, es decir, tras una doble barra ``||`` o con
+    una marca de ensayo como ``[A]``.  Las marcas no cuentan como acordes.
+    """
+    compases = []
+    inicios_seccion = []
+    nueva_seccion = False
+    for trozo in _DOBLE_BARRA.split(cifrado_texto):
+        if trozo is None:
+            continue
+        if trozo == "||":
+            nueva_seccion = True
+            continue
+        simbolos = []
+        for simbolo in trozo.split():
+            if _MARCA_ENSAYO.match(simbolo):
+                nueva_seccion = True
+            else:
+                simbolos.append(simbolo)
+        if not simbolos:
+            continue
+        if nueva_seccion and compases:
+            inicios_seccion.append(len(compases))
+        nueva_seccion = False
+        compases.append(simbolos)
+    return compases, inicios_seccion
+
+
+def secciones_cifrado(cifrado_texto, total_corcheas=256, corcheas_por_compas=8):
+    """Devuelve las corcheas ``(desde, hasta)`` de cada sección del cifrado."""
+    _, inicios_seccion = compases_cifrado(cifrado_texto)
+    limites = [0] + [
+        c * corcheas_por_compas for c in inicios_seccion
+        if c * corcheas_por_compas < total_corcheas
+    ] + [total_corcheas]
+    return [(a, b) for a, b in zip(limites, limites[1:]) if a < b]
+
+
+def segmentar_cifrado(cifrado_texto, total_corcheas=256, corcheas_por_compas=8):
+    """Divide un cifrado en tramos de corcheas, uno por acorde.
+
+    Devuelve una lista de ``SegmentoAcorde`` que cubre exactamente
+    ``total_corcheas`` corcheas: si el cifrado es más corto el último acorde
+    se prolonga y si es más largo se recorta.  Los acordes que no llegan a
+    ocupar ninguna corchea se omiten, aunque cuentan para ``indice``.
+    """
+    segmentos = []
+    inicio = 0
+    acorde_idx = 0
+    for acordes_compas in compases_cifrado(cifrado_texto)[0]:
+        n_acordes = len(acordes_compas)
+        corcheas_por_acorde = corcheas_por_compas // n_acordes
+        resto = corcheas_por_compas - corcheas_por_acorde * n_acordes
+        for i, acorde in enumerate(acordes_compas):
+            extra = 1 if i < resto else 0
+            repeticiones = corcheas_por_acorde + extra
+            if repeticiones and inicio < total_corcheas:
+                repeticiones = min(repeticiones, total_corcheas - inicio)
+                segmentos.append(SegmentoAcorde(acorde, acorde_idx, inicio, repeticiones))
+                inicio += repeticiones
+            acorde_idx += 1
+    if inicio < total_corcheas:
+        ultimo = segmentos[-1]
+        segmentos[-1] = ultimo._replace(largo=ultimo.largo + total_corcheas - inicio)
+    return segmentos
+
+
 def expandir_cifrado_a_corcheas(
     cifrado_texto,
     total_corcheas=256,
@@ -27,39 +148,23 @@ def expandir_cifrado_a_corcheas(
     índice del acorde correspondiente a cada corchea.  Este índice coincide con
     el orden en que aparecen los acordes al recorrer el cifrado de izquierda a
     derecha, independientemente de si dos acordes consecutivos comparten el
-    mismo nombre.
+    mismo nombre.  ``segmentar_cifrado`` da la misma información por tramos.
     """
-
-    compases = [c.strip() for c in cifrado_texto.split('|') if c.strip()]
+    segmentos = segmentar_cifrado(cifrado_texto, total_corcheas, corcheas_por_compas)
     resultado = []
-    indices = []
-    acorde_idx = 0
-    for compas in compases:
-        acordes_compas = [a.strip() for a in compas.split() if a.strip()]
-        n_acordes = len(acordes_compas)
-        if n_acordes == 0:
-            raise ValueError("Compás vacío en cifrado.")
-        corcheas_por_acorde = corcheas_por_compas // n_acordes
-        resto = corcheas_por_compas - corcheas_por_acorde * n_acordes
-        for i, acorde in enumerate(acordes_compas):
-            extra = 1 if i < resto else 0
-            repeticiones = corcheas_por_acorde + extra
-            resultado += [acorde] * repeticiones
-            if return_indices:
-                indices += [acorde_idx] * repeticiones
-            acorde_idx += 1
-    if len(resultado) < total_corcheas:
-        resultado += [resultado[-1]] * (total_corcheas - len(resultado))
-        if return_indices:
-            indices += [indices[-1]] * (total_corcheas - len(indices))
-    if len(resultado) > total_corcheas:
-        resultado = resultado[:total_corcheas]
-        if return_indices:
-            indices = indices[:total_corcheas]
+    for segmento in segmentos:
+        resultado += [segmento.acorde] * segmento.largo
     if return_indices:
-        return resultado, indices
+        return resultado, _indices_por_corchea(segmentos)
     return resultado
 
+
+def _indices_por_corchea(segmentos):
+    indices = []
+    for segmento in segmentos:
+        indices += [segmento.indice] * segmento.largo
+    return indices
+
 def notas_midi_acorde(fundamental, grados, base_octava=4, prev_bajo=None, inversion=0):
     """Devuelve las notas MIDI del acorde.
 
@@ -70,14 +175,70 @@ def notas_midi_acorde(fundamental, grados, base_octava=4, prev_bajo=None, invers
     El resultado siempre contiene cuatro notas en posición cerrada dentro del
     registro D3–C5. ``grados`` debe describir exactamente cuatro alturas
     distintas del acorde.
+
+    El resultado depende únicamente de los argumentos, por lo que se memoriza
+    en una caché LRU acotada (ver ``estadisticas_cache_voicings``).  Cada
+    llamada devuelve una lista nueva que el llamador puede modificar.
     """
     if fundamental not in notas_naturales:
         fundamental = 'C'
-    base = 12 * base_octava + notas_naturales[fundamental]
-
-    grados = list(grados)
+    grados = tuple(grados)
     if len(grados) != 4:
         raise ValueError("Se requieren cuatro grados para construir el acorde")
+    # ``inversion`` solo se usa para el primer acorde; normalizarla evita
+    # entradas duplicadas en la caché.
+    inversion = inversion % len(grados) if prev_bajo is None else 0
+
+    resultado = _notas_midi_acorde(
+        notas_naturales[fundamental], grados, base_octava, prev_bajo, inversion
+    )
+    return list(resultado) if resultado is not None else None
+
+
+def estadisticas_cache_voicings():
+    """Devuelve aciertos, fallos y ocupación de la caché de ``notas_midi_acorde``."""
+    return _notas_midi_acorde.cache_info()
+
+
+def limpiar_cache_voicings():
+    """Vacía la caché de ``notas_midi_acorde`` y reinicia sus estadísticas."""
+    _notas_midi_acorde.cache_clear()
+
+
+def _aciertos_voicings():
+    info = _notas_midi_acorde.cache_info()
+    return info.hits, info.misses
+
+
+_tabla_voicings = None
+_lock_tabla_voicings = threading.Lock()
+
+
+def tabla_voicings():
+    """Devuelve la ``TablaVoicings`` del proceso, creándola en el primer uso.
+
+    Si la caché en disco contiene la tabla completa (ver ``python
+    tabla_voicings.py``) se abre con ``mmap``; si no, las entradas se calculan
+    a medida que se consultan.
+    """
+    global _tabla_voicings
+    with _lock_tabla_voicings:
+        if _tabla_voicings is None:
+            _tabla_voicings = TablaVoicings(
+                _notas_midi_acorde.__wrapped__, cache_disco.cache_por_defecto()
+            )
+        return _tabla_voicings
+
+
+def _aciertos_tabla_voicings():
+    tabla = _tabla_voicings
+    return (tabla.aciertos, tabla.fallos) if tabla is not None else (0, 0)
+
+
+@lru_cache(maxsize=TAMANO_CACHE_VOICINGS)
+def _notas_midi_acorde(clase_fundamental, grados, base_octava, prev_bajo, inversion):
+    base = 12 * base_octava + clase_fundamental
+    grados = list(grados)
 
     mejor_inversion = None
     mejor_dist = None
@@ -184,7 +345,7 @@ def notas_midi_acorde(fundamental, grados, base_octava=4, prev_bajo=None, invers
             mejor_inversion[max_idx] -= 12
             mejor_inversion.sort()
 
-    return mejor_inversion
+    return tuple(mejor_inversion) if mejor_inversion else None
 
 def enlazar_notas(previas, nuevas):
     """Asigna las notas de ``nuevas`` a ``previas`` minimizando el movimiento.
@@ -193,42 +354,90 @@ def enlazar_notas(previas, nuevas):
     es una nueva lista con la misma longitud que ``previas`` donde cada elemento
     corresponde a la altura del acorde destino más cercana posible a la nota
     previa, evitando reutilizar alturas cuando sea posible.
+
+    Si hay al menos tantas notas nuevas como previas se resuelve una asignación
+    sin repeticiones con el algoritmo húngaro (O(n³)); si no, cada voz toma
+    independientemente la altura más cercana.  Entre asignaciones de igual costo
+    se elige la misma que la búsqueda exhaustiva original: la primera en orden
+    lexicográfico de posiciones dentro de ``nuevas``.
     """
     if not previas:
         return []
 
     n_prev = len(previas)
-    if len(nuevas) >= n_prev:
-        candidatos = itertools.permutations(nuevas, n_prev)
-    else:
-        candidatos = itertools.product(nuevas, repeat=n_prev)
-
-    mejor_asignacion = None
-    mejor_costo = None
-    for cand in candidatos:
-        costo = sum(abs(p - q) for p, q in zip(cand, previas))
-        if mejor_costo is None or costo < mejor_costo:
-            mejor_costo = costo
-            mejor_asignacion = cand
+    n_nuevas = len(nuevas)
+    if n_nuevas < n_prev:
+        return [
+            nuevas[min(range(n_nuevas), key=lambda j: (abs(nuevas[j] - p), j))]
+            for p in previas
+        ]
 
-    return list(mejor_asignacion)
+    # Ponderar cada costo para que, a igual movimiento total, gane la
+    # asignación lexicográficamente menor: la suma de pesos codifica en base
+    # ``n_nuevas`` la tupla de posiciones elegidas.
+    escala = n_nuevas ** n_prev
+    costos = [
+        [
+            abs(q - p) * escala + j * n_nuevas ** (n_prev - 1 - i)
+            for j, q in enumerate(nuevas)
+        ]
+        for i, p in enumerate(previas)
+    ]
+    return [nuevas[j] for j in asignacion_minima(costos)]
 
 
-def evitar_solapamientos(notas, margen=0.01):
-    """Acorta una nota si la siguiente tiene la misma altura.
+def evitar_solapamientos(notas, margen=MARGEN_SOLAPAMIENTO):
+    """Acorta cada nota que se solapa con la siguiente de su misma altura.
 
-    Recorre ``notas`` en orden temporal y, cuando dos notas consecutivas
-    comparten ``pitch`` y la primera se extiende más allá del inicio de la
-    segunda, reduce la duración de la primera para que finalice un pequeño
-    margen antes de la siguiente.  El ``margen`` se expresa en segundos.
+    Recorre ``notas`` en orden temporal llevando, para cada una de las 128
+    alturas MIDI, la última nota abierta.  Cuando una nota empieza antes de
+    que termine la anterior de su misma altura, aunque entre ambas suenen
+    otras notas, la anterior se acorta para que finalice un pequeño margen
+    antes de la nueva.  Basta comparar con la última: las anteriores ya se
+    recortaron contra ella.  El costo total es el del ordenamiento.  El
+    ``margen`` se expresa en segundos.  ``notas`` puede ser una lista de notas
+    o un ``NotasColumnares``.
     """
+    if isinstance(notas, NotasColumnares):
+        notas.ordenar_por_inicio()
+        _recortar_por_altura(
+            notas.start, notas.end, notas.pitch, range(len(notas.start)), margen
+        )
+        return
+
     notas.sort(key=lambda n: n.start)
-    for actual, siguiente in zip(notas, notas[1:]):
-        if actual.pitch == siguiente.pitch and actual.end > siguiente.start:
-            nuevo_fin = min(actual.end, siguiente.start - margen)
-            if nuevo_fin < actual.start:
-                nuevo_fin = actual.start
-            actual.end = nuevo_fin
+    finales = [n.end for n in notas]
+    _recortar_por_altura(
+        [n.start for n in notas], finales, [n.pitch for n in notas],
+        range(len(notas)), margen,
+    )
+    for n, fin in zip(notas, finales):
+        if n.end != fin:
+            n.end = fin
+
+
+def _recortar_por_altura(inicios, finales, alturas, orden, margen, abiertas=None):
+    """Recorta, en el ``orden`` dado, cada nota contra la anterior de su altura.
+
+    ``abiertas`` es la tabla de la última nota por altura (128 posiciones);
+    se crea si no se indica y se devuelve actualizada, de modo que un
+    recorrido se puede continuar por partes.  Las alturas fuera de 0–127 no
+    se recortan.
+    """
+    if abiertas is None:
+        abiertas = [None] * 128
+    for p in orden:
+        altura = alturas[p]
+        if not 0 <= altura < 128:
+            continue
+        anterior = abiertas[altura]
+        if anterior is not None and finales[anterior] > inicios[p]:
+            nuevo_fin = min(finales[anterior], inicios[p] - margen)
+            if nuevo_fin < inicios[anterior]:
+                nuevo_fin = inicios[anterior]
+            finales[anterior] = nuevo_fin
+        abiertas[altura] = p
+    return abiertas
 
 
 def recortar_notas_a_segmento(notas, inicio, fin):
@@ -249,54 +458,93 @@ def recortar_notas_a_segmento(notas, inicio, fin):
 
 
 def reordenar_ventanas(notas, dur_corchea=0.25, ventana_corcheas=8, orden=None):
-    """Reordena "ventanas" de ``ventana_corcheas`` corcheas en ``notas``."""
+    """Reordena "ventanas" de ``ventana_corcheas`` corcheas en ``notas``.
+
+    Con un ``NotasColumnares`` se devuelve otro almacén columnar; con una lista
+    de notas se devuelven objetos ``pretty_midi.Note`` nuevos.  Las notas se
+    reparten en ventanas una sola vez (``dividir_en_ventanas``) y el nuevo
+    orden se compone desplazando cada ventana (``componer_ventanas``).
+    """
+    columnar = isinstance(notas, NotasColumnares)
     if not orden:
-        return list(notas)
-    import pretty_midi
+        return notas if columnar else list(notas)
+
+    fuente = notas if columnar else NotasColumnares.desde_notas(notas)
+    inicio, dur_ventana, ventanas = dividir_en_ventanas(
+        fuente, dur_corchea, ventana_corcheas
+    )
+    nuevas = componer_ventanas(ventanas, inicio, dur_ventana, orden)
+    return nuevas if columnar else nuevas.a_notas()
+
+
+def dividir_en_ventanas(notas, dur_corchea=0.25, ventana_corcheas=8):
+    """Reparte ``notas`` en ventanas completas con una sola pasada.
 
-    inicio = min(n.start for n in notas)
-    fin = max(n.end for n in notas)
+    Devuelve ``(inicio, dur_ventana, ventanas)`` donde cada ventana es un
+    ``NotasColumnares`` con tiempos relativos al comienzo de la ventana.  Las
+    notas que cruzan el límite entre ventanas se recortan en cada una.  Si la
+    primera o la última corchea de una ventana quedan vacías se añade una nota
+    "dummy" (altura 0, velocidad 1) para conservar la duración al reordenar.
+    """
+    starts, ends = notas.start, notas.end
+    pitches, velocities = notas.pitch, notas.velocity
+    inicio = min(starts)
+    fin = max(ends)
     dur_ventana = ventana_corcheas * dur_corchea
     num_ventanas = int((fin - inicio) // dur_ventana)
-    ventanas = []
-    for i in range(num_ventanas):
-        v_ini = inicio + i * dur_ventana
-        v_fin = v_ini + dur_ventana
-        grupo = []
-        for n in notas:
-            if n.end <= v_ini or n.start >= v_fin:
+    limites = [inicio + i * dur_ventana for i in range(num_ventanas)]
+    ventanas = [NotasColumnares() for _ in range(num_ventanas)]
+
+    for p in range(len(starts)):
+        start, end = starts[p], ends[p]
+        # La división da la ventana aproximada; el margen de una ventana a cada
+        # lado absorbe los errores de redondeo y la comprobación exacta es la
+        # misma que la de un recorrido ventana por ventana.
+        primera = max(0, int((start - inicio) // dur_ventana) - 1)
+        ultima = min(num_ventanas - 1, int((end - inicio) // dur_ventana) + 1)
+        for i in range(primera, ultima + 1):
+            v_ini = limites[i]
+            v_fin = v_ini + dur_ventana
+            if end <= v_ini or start >= v_fin:
                 continue
-            start = max(n.start, v_ini) - v_ini
-            end = min(n.end, v_fin) - v_ini
-            grupo.append(
-                pretty_midi.Note(velocity=n.velocity, pitch=n.pitch, start=start, end=end)
-            )
-        # Si la primera o última corchea están vacías, añadir notas "dummy"
-        first_end = dur_corchea
-        last_start = dur_ventana - dur_corchea
-        if not any(n.start < first_end and n.end > 0 for n in grupo):
-            grupo.append(
-                pretty_midi.Note(velocity=1, pitch=0, start=0, end=first_end)
+            ventanas[i].agregar(
+                max(start, v_ini) - v_ini,
+                min(end, v_fin) - v_ini,
+                pitches[p],
+                velocities[p],
             )
-        if not any(n.start < dur_ventana and n.end > last_start for n in grupo):
-            grupo.append(
-                pretty_midi.Note(velocity=1, pitch=0, start=last_start, end=dur_ventana)
-            )
-        ventanas.append(grupo)
-    nuevas = []
+
+    first_end = dur_corchea
+    last_start = dur_ventana - dur_corchea
+    for ventana in ventanas:
+        v_starts, v_ends = ventana.start, ventana.end
+        rango = range(len(v_starts))
+        primera_vacia = not any(v_starts[k] < first_end and v_ends[k] > 0 for k in rango)
+        ultima_vacia = not any(
+            v_starts[k] < dur_ventana and v_ends[k] > last_start for k in rango
+        )
+        if primera_vacia:
+            ventana.agregar(0, first_end, 0, 1)
+        if ultima_vacia:
+            ventana.agregar(last_start, dur_ventana, 0, 1)
+    return inicio, dur_ventana, ventanas
+
+
+def componer_ventanas(ventanas, inicio, dur_ventana, orden):
+    """Concatena ``ventanas`` según ``orden`` a partir del instante ``inicio``.
+
+    Los índices de ``orden`` fuera de rango se ignoran.
+    """
+    nuevas = NotasColumnares()
     cursor = inicio
     for idx in orden:
         if idx >= len(ventanas):
             continue
-        for n in ventanas[idx]:
-            nuevas.append(
-                pretty_midi.Note(
-                    velocity=n.velocity,
-                    pitch=n.pitch,
-                    start=cursor + n.start,
-                    end=cursor + n.end,
-                )
-            )
+        ventana = ventanas[idx]
+        nuevas.start.extend([cursor + s for s in ventana.start])
+        nuevas.end.extend([cursor + e for e in ventana.end])
+        nuevas.pitch.extend(ventana.pitch)
+        nuevas.velocity.extend(ventana.velocity)
         cursor += dur_ventana
     return nuevas
 
@@ -322,62 +570,135 @@ def aplicar_rotaciones(
     representa el instante de inicio de la primera corchea (en segundos).  Cuando
     ``indices`` es ``None`` se mantiene el comportamiento anterior, interpretando
     que cada grupo de notas representa un nuevo acorde consecutivo.
+    ``notas`` puede ser una lista de notas o un ``NotasColumnares``.
+
+    Las notas se agrupan por la corchea en la que empiezan (ver
+    ``corchea_de_inicio``) y cada rotación se aplica de una vez: ``rot > 0``
+    sube una octava las ``rot`` voces más graves y ``rot < 0`` baja las más
+    agudas.
     """
+    if isinstance(notas, NotasColumnares):
+        _rotar_alturas(
+            notas.start, notas.pitch, rotacion, rotaciones, octavas,
+            indices, dur_corchea, tiempo_inicio,
+        )
+        return notas
 
-    grupos = defaultdict(list)
-    for n in notas:
-        grupos[n.start].append(n)
+    alturas = [n.pitch for n in notas]
+    _rotar_alturas(
+        [n.start for n in notas], alturas, rotacion, rotaciones, octavas,
+        indices, dur_corchea, tiempo_inicio,
+    )
+    for n, altura in zip(notas, alturas):
+        if n.pitch != altura:
+            n.pitch = altura
+    return notas
 
-    if not grupos:
-        return notas
 
-    if indices is None:
-        for idx, start in enumerate(sorted(grupos)):
-            rot = rotacion
-            if rotaciones and idx in rotaciones:
-                rot += rotaciones[idx]
-            oct = octavas.get(idx, 0) if octavas else 0
+def corchea_de_inicio(start, tiempo_inicio, dur_corchea):
+    """Devuelve la corchea en la que empieza una nota que empieza en ``start``.
 
-            g = grupos[start]
-            if oct:
-                for n in g:
-                    n.pitch += 12 * oct
-            if rot > 0:
-                for _ in range(rot):
-                    bajo = min(g, key=lambda n: n.pitch)
-                    bajo.pitch += 12
-            elif rot < 0:
-                for _ in range(-rot):
-                    alto = max(g, key=lambda n: n.pitch)
-                    alto.pitch -= 12
-    else:
-        for start in sorted(grupos):
-            corchea_idx = int(round((start - tiempo_inicio) / dur_corchea))
-            rot = rotacion
-            oct = 0
-            if (
-                rotaciones
-                and 0 <= corchea_idx < len(indices)
-            ):
-                acorde_idx = indices[corchea_idx]
-                rot += rotaciones.get(acorde_idx, 0)
-                if octavas:
-                    oct = octavas.get(acorde_idx, 0)
+    Es la mayor ``i`` con ``tiempo_inicio + i * dur_corchea <= start``, con
+    un margen de ``TOLERANCIA_CORCHEA`` por redondeo: las corcheas son los
+    mismos intervalos que recorre el voicing, así que una nota que empieza
+    en la segunda mitad de una corchea pertenece a ella y no a la siguiente.
+    """
+    return math.floor((start - tiempo_inicio) / dur_corchea + TOLERANCIA_CORCHEA)
+
+
+def _rotar_alturas(
+    inicios, alturas, rotacion, rotaciones, octavas, indices, dur_corchea, tiempo_inicio
+):
+    if not inicios:
+        return
+
+    # Un solo recorrido sobre las notas ordenadas por (corchea, altura): cada
+    # tramo consecutivo con la misma corchea es un acorde.  La corchea se
+    # calcula una vez por inicio distinto; las notas ya vienen casi siempre
+    # ordenadas por inicio.
+    corcheas = []
+    previo = None
+    for start in inicios:
+        if start != previo:
+            corchea = corchea_de_inicio(start, tiempo_inicio, dur_corchea)
+            previo = start
+        corcheas.append(corchea)
+    orden = sorted(
+        range(len(inicios)), key=lambda i: (corcheas[i] << 10) + alturas[i]
+    )
 
-            g = grupos[start]
+    desde = 0
+    n_grupo = 0
+    total = len(orden)
+    while desde < total:
+        corchea = corcheas[orden[desde]]
+        hasta = desde + 1
+        while hasta < total and corcheas[orden[hasta]] == corchea:
+            hasta += 1
+
+        rot = rotacion
+        oct = 0
+        if indices is None:
+            if rotaciones and n_grupo in rotaciones:
+                rot += rotaciones[n_grupo]
+            oct = octavas.get(n_grupo, 0) if octavas else 0
+        elif rotaciones and 0 <= corchea < len(indices):
+            acorde_idx = indices[corchea]
+            rot += rotaciones.get(acorde_idx, 0)
+            if octavas:
+                oct = octavas.get(acorde_idx, 0)
+        if rot or oct:
+            grupo = orden[desde:hasta]
             if oct:
-                for n in g:
-                    n.pitch += 12 * oct
-            if rot > 0:
-                for _ in range(rot):
-                    bajo = min(g, key=lambda n: n.pitch)
-                    bajo.pitch += 12
-            elif rot < 0:
-                for _ in range(-rot):
-                    alto = max(g, key=lambda n: n.pitch)
-                    alto.pitch -= 12
+                for i in grupo:
+                    alturas[i] += 12 * oct
+            if rot:
+                _rotar_grupo(alturas, grupo, rot)
+        desde = hasta
+        n_grupo += 1
 
-    return notas
+
+def _rotar_grupo(alturas, grupo, rot):
+    """Sube la voz más grave una octava ``rot`` veces (o baja la más aguda si ``rot < 0``).
+
+    ``grupo`` son las posiciones del acorde ordenadas por (altura, posición).
+    Equivale a repetir ``rot`` veces ``min``/``max`` sobre el grupo, con los
+    empates resueltos a favor de la primera nota, pero en forma cerrada.  Cada
+    voz recorre alturas separadas por una octava y los pasos toman, en orden,
+    las de menor (octava, distancia dentro de la octava, posición) medidas
+    desde el extremo del grupo.  En un acorde cerrado todas las voces están en
+    la primera octava y basta repartir ``rot`` entre ellas.
+    """
+    n = len(grupo)
+    if rot > 0:
+        signo, pasos, extremo = 1, rot, alturas[grupo[0]]
+        orden = grupo
+    else:
+        signo, pasos, extremo = -1, -rot, alturas[grupo[-1]]
+        orden = sorted(grupo, key=lambda i: -alturas[i])
+    if signo * (alturas[orden[-1]] - extremo) < 12:
+        vueltas, resto = divmod(pasos, n)
+        for k, i in enumerate(orden):
+            alturas[i] += 12 * signo * (vueltas + (k < resto))
+        return
+
+    distancias = {i: signo * (alturas[i] - extremo) for i in grupo}
+    orden = sorted(grupo, key=lambda i: (distancias[i] % 12, i))
+    movimientos = dict.fromkeys(grupo, 0)
+    nivel = 0
+    while pasos:
+        voces = [i for i in orden if distancias[i] // 12 <= nivel]
+        if len(voces) == n:
+            vueltas, resto = divmod(pasos, n)
+            for k, i in enumerate(voces):
+                movimientos[i] += vueltas + (k < resto)
+            break
+        for i in voces[:pasos]:
+            movimientos[i] += 1
+        pasos -= min(pasos, len(voces))
+        nivel += 1
+    for i, veces in movimientos.items():
+        alturas[i] += 12 * signo * veces
 
 
 def Spread(notas):
@@ -385,39 +706,781 @@ def Spread(notas):
 
     Se duplica la segunda nota del acorde una y dos octavas arriba y se
     agrega una de las notas del acorde una octava arriba, ubicada entre las
-    dos notas duplicadas anteriores.
+    dos notas duplicadas anteriores.  ``notas`` puede ser una lista de notas o
+    un ``NotasColumnares``; las nuevas notas se añaden al final.
     """
+    columnar = isinstance(notas, NotasColumnares)
+    if columnar:
+        inicios, alturas = notas.start, notas.pitch
+    else:
+        inicios = [n.start for n in notas]
+        alturas = [n.pitch for n in notas]
 
     grupos = defaultdict(list)
-    for n in notas:
-        grupos[n.start].append(n)
+    for i, start in enumerate(inicios):
+        grupos[start].append(i)
 
-    nuevas = []
+    duplicados = []
     for grupo in grupos.values():
         if len(grupo) < 2:
             continue
-        ordenado = sorted(grupo, key=lambda n: n.pitch)
+        ordenado = sorted(grupo, key=alturas.__getitem__)
         segunda = ordenado[1]
         # Selecciona la nota más aguda del acorde para el agregado intermedio.
         extra = ordenado[-1]
+        duplicados += [(segunda, 12), (extra, 12), (segunda, 24)]
 
-        cls = segunda.__class__
-        duplicados = (
-            (segunda, 12),
-            (extra, 12),
-            (segunda, 24),
-        )
-        for nota, desplazamiento in duplicados:
-            nueva = cls(
-                velocity=getattr(nota, "velocity", 0),
-                pitch=nota.pitch + desplazamiento,
-                start=nota.start,
-                end=nota.end,
+    if columnar:
+        for i, desplazamiento in duplicados:
+            notas.agregar(
+                notas.start[i],
+                notas.end[i],
+                notas.pitch[i] + desplazamiento,
+                notas.velocity[i],
             )
-            nuevas.append(nueva)
+        return notas
+
+    nuevas = []
+    for i, desplazamiento in duplicados:
+        nota = notas[i]
+        cls = nota.__class__
+        nueva = cls(
+            velocity=getattr(nota, "velocity", 0),
+            pitch=nota.pitch + desplazamiento,
+            start=nota.start,
+            end=nota.end,
+        )
+        nuevas.append(nueva)
     notas.extend(nuevas)
     return notas
 
+# Número máximo de resultados intermedios guardados por ``procesa_midi``.
+MAX_ETAPAS = 32
+
+_cache_etapas = OrderedDict()
+_estadisticas_etapas = defaultdict(lambda: {"aciertos": 0, "fallos": 0})
+_lock_etapas = threading.Lock()
+
+
+def _etapa(nombre, clave, calcular):
+    """Devuelve el resultado de la etapa ``nombre`` para ``clave``.
+
+    Los resultados se comparten entre llamadas y no deben modificarse.
+    """
+    encontrado, resultado = _buscar_etapa(nombre, clave)
+    if not encontrado:
+        resultado = calcular()
+        _guardar_etapa(nombre, clave, resultado)
+    return resultado
+
+
+def _buscar_etapa(nombre, clave):
+    """Devuelve ``(True, resultado)`` si la etapa está en caché o ``(False, None)``."""
+    clave = (nombre,) + clave
+    with _lock_etapas:
+        if clave in _cache_etapas:
+            _cache_etapas.move_to_end(clave)
+            _estadisticas_etapas[nombre]["aciertos"] += 1
+            return True, _cache_etapas[clave]
+        _estadisticas_etapas[nombre]["fallos"] += 1
+    return False, None
+
+
+def _guardar_etapa(nombre, clave, resultado):
+    with _lock_etapas:
+        _cache_etapas[(nombre,) + clave] = resultado
+        while len(_cache_etapas) > MAX_ETAPAS:
+            _cache_etapas.popitem(last=False)
+
+
+def estadisticas_cache_etapas():
+    """Devuelve aciertos y fallos de la caché de etapas, por etapa."""
+    with _lock_etapas:
+        return {nombre: dict(valores) for nombre, valores in _estadisticas_etapas.items()}
+
+
+def limpiar_cache_etapas():
+    """Vacía la caché de etapas de ``procesa_midi`` y sus estadísticas."""
+    with _lock_etapas:
+        _cache_etapas.clear()
+        _estadisticas_etapas.clear()
+
+
+def _aciertos_etapa(nombre):
+    def estadisticas():
+        with _lock_etapas:
+            valores = _estadisticas_etapas.get(nombre, {"aciertos": 0, "fallos": 0})
+            return valores["aciertos"], valores["fallos"]
+
+    return estadisticas
+
+
+registrar_cache("voicings", _aciertos_voicings)
+registrar_cache("tabla_voicings", _aciertos_tabla_voicings)
+registrar_cache("etapa_plantilla", _aciertos_etapa("plantilla"))
+registrar_cache("etapa_voicing", _aciertos_etapa("voicing"))
+
+
+def normalizar_plan(plan):
+    """Convierte un plan de voicings en una tupla de tuplas (o ``None``) hashable.
+
+    ``plan[k]`` son las alturas del acorde ``k`` del cifrado (el
+    ``SegmentoAcorde.indice``), una ``CadenaVoicing`` ya calculada del enlace
+    voraz o ``None`` para voicearlo de forma voraz.  También acepta un
+    ``plan_voicing.PlanVoicing``, del que se toman sus ``voicings``.
+    """
+    plan = getattr(plan, "voicings", plan)
+    if plan is None:
+        return None
+    return tuple(
+        notas if notas is None or isinstance(notas, CadenaVoicing) else tuple(notas)
+        for notas in plan
+    )
+
+
+def _primer_voicing(tabla, clase, grados):
+    """Voicing de la primera corchea del cifrado: la primera inversión con el bajo desde La3."""
+    for inv in range(4):
+        cand = tabla.voicing(clase, grados, None, inv)
+        if cand[0] >= 57:
+            break
+    return cand
+
+
+def _segmentos_cifrado(cifrado, corcheas_por_compas):
+    """Devuelve ``(total_corcheas, segmentos, acordes_analizados)``.
+
+    ``acordes_analizados[k]`` es ``(fundamental, grados)`` de ``segmentos[k]``.
+    """
+    total_corcheas = len(compases_cifrado(cifrado)[0]) * corcheas_por_compas
+    with etapa("cifrado", total_corcheas):
+        segmentos = segmentar_cifrado(cifrado, total_corcheas, corcheas_por_compas)
+        acordes_analizados = [analizar_acorde(s.acorde) for s in segmentos]
+    return total_corcheas, segmentos, acordes_analizados
+
+
+def compilar_plantilla(notas, dur_corchea=0.25):
+    """Compila el esqueleto rítmico de ``notas`` en una ``PlantillaRitmo``.
+
+    Recorre las corcheas desde la primera nota igual que el voicing: toma las
+    notas activas con ``velocity > 1`` (como máximo cuatro), duplica la primera
+    si hay menos, las recorta a la corchea y, al final de cada corchea, fija
+    las notas que ninguna corchea posterior puede recortar.  Nada de esto
+    depende del cifrado.  Se detiene cuando ya no quedan notas por sonar, de
+    modo que la plantilla sirve para cifrados de cualquier longitud.  ``notas``
+    no se modifica.
+    """
+    notas = notas.copia()
+    base = notas.copia()
+    starts, ends, velocities = notas.start, notas.end, notas.velocity
+    tiempo_inicio = min(starts)
+    ultimo_fin = max(ends)
+
+    # El índice solo cubre las notas de la referencia.  Las notas duplicadas en
+    # una corchea terminan al final de la misma, por lo que únicamente las de la
+    # corchea anterior pueden seguir activas por redondeo.
+    indice = IndiceNotas(starts, ends)
+    por_inicio = sorted(range(len(starts)), key=base.start.__getitem__)
+    plantilla = PlantillaRitmo(
+        dur_corchea, tiempo_inicio,
+        start=base.start, end=base.end, pitch=base.pitch, velocity=base.velocity,
+    )
+    siguiente = 0
+    pendientes = []
+    duplicadas = []
+    i = 0
+    while True:
+        t0 = tiempo_inicio + i * dur_corchea
+        t1 = t0 + dur_corchea
+        # Nuevo filtrado para incluir notas activas en el segmento
+        # (no solo las que inician)
+        candidatas = indice.activas(t0, t1) + duplicadas
+        duplicadas = []
+        posiciones = [
+            p for p in candidatas
+            if not (ends[p] <= t0 or starts[p] >= t1) and velocities[p] > 1
+        ]
+
+        # Mantener silencios del midi de referencia
+        if posiciones:
+            if len(posiciones) > 4:
+                posiciones = posiciones[:4]
+            elif len(posiciones) < 4:
+                # Duplicar notas existentes para garantizar cuatro eventos
+                primera = posiciones[0]
+                for _ in range(4 - len(posiciones)):
+                    nueva = notas.agregar(t0, t1, 0, velocities[primera])
+                    plantilla.duplicados.append(primera)
+                    posiciones.append(nueva)
+                    duplicadas.append(nueva)
+                    pendientes.append(nueva)
+                ultimo_fin = max(ultimo_fin, t1)
+
+            # Evitar legato forzando las notas a encajar en los límites del segmento
+            recortar_notas_a_segmento([notas[p] for p in posiciones], t0, t1)
+            for p in posiciones:
+                plantilla.miembros.append(p)
+                plantilla.start_miembros.append(starts[p])
+                plantilla.end_miembros.append(ends[p])
+
+        # Fijar las notas que ninguna corchea posterior puede tocar.  La
+        # corchea siguiente empieza en ``tiempo_inicio + (i + 1) * dur``, que
+        # puede quedar por redondeo justo antes de ``t1``: una nota que
+        # termina en ``t1`` aún puede ser miembro de ella.
+        while siguiente < len(por_inicio) and base.start[por_inicio[siguiente]] < t1:
+            pendientes.append(por_inicio[siguiente])
+            siguiente += 1
+        t0_siguiente = tiempo_inicio + (i + 1) * dur_corchea
+        final = t0_siguiente >= ultimo_fin and siguiente == len(por_inicio)
+        frontera = float("inf") if final else t1
+        if not final:
+            for p in indice.activas(t0_siguiente, t0_siguiente + dur_corchea) + duplicadas:
+                if ends[p] > t0_siguiente and velocities[p] > 1 and starts[p] < frontera:
+                    frontera = starts[p]
+        fijadas = [p for p in pendientes if starts[p] < frontera]
+        pendientes = [p for p in pendientes if starts[p] >= frontera]
+        fijadas.sort(key=lambda p: (starts[p], p))
+        plantilla.emitidas.extend(fijadas)
+        plantilla.pendientes.extend(pendientes)
+
+        plantilla.inicio_miembros.append(len(plantilla.miembros))
+        plantilla.inicio_duplicados.append(len(plantilla.duplicados))
+        plantilla.inicio_emitidas.append(len(plantilla.emitidas))
+        plantilla.inicio_pendientes.append(len(plantilla.pendientes))
+        if final:
+            return plantilla
+        i += 1
+
+
+class _Voiceador:
+    """Asigna alturas a las corcheas de una ``PlantillaRitmo``, una a una.
+
+    Guarda el estado que enlaza cada corchea con la anterior: el bajo del
+    último acorde, el segmento del cifrado en curso y la última búsqueda en la
+    tabla de voicings.  Dentro de un segmento el voicing solo depende del bajo
+    anterior, así que en cuanto el bajo se estabiliza se reutiliza el último
+    voicing sin volver a buscarlo.
+
+    ``plan`` da, por índice de acorde, un voicing fijo que sustituye a la
+    búsqueda (ver ``plan_voicing.planificar_voicings``); los acordes sin
+    entrada, o con ``None``, se voicean como siempre.  Una ``CadenaVoicing``
+    da las búsquedas ya hechas del enlace voraz y solo se usa si se llega al
+    acorde con su ``bajo_entrada``; si no, o cuando se acaba sin ser
+    ``estable``, se busca como siempre.  El resultado es el mismo.
+    """
+
+    def __init__(self, plantilla, notas, segmentos, acordes_analizados, plan=None):
+        self.plantilla = plantilla
+        self.notas = notas
+        self.segmentos = segmentos
+        self.acordes_analizados = acordes_analizados
+        self.plan = plan or ()
+        self.tabla = tabla_voicings()
+        self.segmento = -1
+        self.fin_segmento = 0
+        self.clase = self.grados = self.fijo = self.cadena = None
+        self.paso = 0
+        self.reiniciar(0)
+
+    def reiniciar(self, corchea):
+        """Olvida el enlace de voces: ``corchea`` se voicea como la primera del cifrado."""
+        self.primera = corchea
+        self.bajo_anterior = None
+        self.ultima_busqueda = None
+        self.nuevas_alturas = None
+
+    def preparar(self, i, alturas=None):
+        """Crea las notas duplicadas de la corchea ``i`` y recorta sus miembros.
+
+        Las duplicadas copian la altura de su nota de origen o, si se indica,
+        la siguiente de ``alturas``.  Devuelve las posiciones de los miembros.
+        """
+        plantilla, notas = self.plantilla, self.notas
+        pitches, velocities = notas.pitch, notas.velocity
+        t0 = plantilla.tiempo_inicio + i * plantilla.dur_corchea
+        t1 = t0 + plantilla.dur_corchea
+        for origen in plantilla.duplicados_de(i):
+            altura = pitches[origen] if alturas is None else next(alturas)
+            notas.agregar(t0, t1, altura, velocities[origen])
+        desde, hasta = plantilla.miembros_de(i)
+        posiciones = plantilla.miembros[desde:hasta]
+        starts, ends = notas.start, notas.end
+        start_miembros, end_miembros = plantilla.start_miembros, plantilla.end_miembros
+        for k, p in enumerate(posiciones, desde):
+            starts[p] = start_miembros[k]
+            ends[p] = end_miembros[k]
+        return posiciones
+
+    def corchea(self, i, registro=None):
+        """Voicea la corchea ``i``.
+
+        Si se indica ``registro`` se le añaden las alturas escritas (las de
+        las duplicadas y luego las de los miembros), en el orden en que las
+        consume ``reproducir``.
+        """
+        pitches = self.notas.pitch
+        creadas = len(pitches)
+        posiciones = self.preparar(i)
+        if registro is not None:
+            registro.extend(pitches[creadas:])
+        # Mantener silencios del midi de referencia
+        if not posiciones:
+            return
+
+        while i >= self.fin_segmento:
+            self.segmento += 1
+            segmento = self.segmentos[self.segmento]
+            self.fin_segmento = segmento.inicio + segmento.largo
+            fundamental, self.grados = self.acordes_analizados[self.segmento]
+            self.clase = notas_naturales.get(fundamental, 0)
+            indice = segmento.indice
+            self.fijo = self.plan[indice] if indice < len(self.plan) else None
+            self.cadena = None
+            if isinstance(self.fijo, CadenaVoicing):
+                cadena, self.fijo = self.fijo, None
+                # Solo vale si se llega al acorde como la calculó el plan.
+                if cadena.bajo_entrada == self.bajo_anterior and (
+                    (cadena.bajo_entrada is None) == (i == self.primera)
+                ):
+                    self.cadena = cadena
+                    self.paso = 0
+        clase, grados, tabla = self.clase, self.grados, self.tabla
+        cadena = self.cadena
+        if self.fijo is not None:
+            self.nuevas_alturas = self.fijo
+        elif cadena is not None and (self.paso < len(cadena.voicings) or cadena.estable):
+            self.nuevas_alturas = cadena.voicings[min(self.paso, len(cadena.voicings) - 1)]
+            self.paso += 1
+        elif i == self.primera:
+            self.nuevas_alturas = _primer_voicing(tabla, clase, grados)
+        elif self.ultima_busqueda != (self.segmento, self.bajo_anterior):
+            self.nuevas_alturas = tabla.voicing(clase, grados, self.bajo_anterior)
+            self.ultima_busqueda = (self.segmento, self.bajo_anterior)
+        nuevas_alturas = self.nuevas_alturas
+        self.bajo_anterior = nuevas_alturas[0]
+        nuevas = enlazar_notas([pitches[p] for p in posiciones], nuevas_alturas)
+        for p, altura in zip(posiciones, nuevas):
+            pitches[p] = altura
+        if registro is not None:
+            registro.extend(nuevas)
+
+    def reproducir(self, i, alturas):
+        """Repite la corchea ``i`` tomando de ``alturas`` lo que escribió ``corchea``."""
+        pitches = self.notas.pitch
+        for p in self.preparar(i, alturas):
+            pitches[p] = next(alturas)
+
+
+def _voicear_seccion(plantilla, cifrado, corcheas_por_compas, desde, hasta, plan=None):
+    """Voicea las corcheas ``[desde, hasta)`` como si el cifrado empezara en ``desde``.
+
+    Parte de las alturas de la referencia, sin nada de las secciones
+    anteriores, y devuelve un ``array`` con las alturas escritas en el orden
+    de ``_Voiceador.reproducir``.  Se ejecuta en los procesos trabajadores de
+    ``voicear_plantilla``.
+    """
+    _, segmentos, acordes_analizados = _segmentos_cifrado(cifrado, corcheas_por_compas)
+    voiceador = _Voiceador(
+        plantilla, plantilla.notas_base(), segmentos, acordes_analizados, plan
+    )
+    ranuras = len(plantilla)
+    for i in range(min(desde, ranuras)):
+        voiceador.preparar(i)
+    voiceador.reiniciar(desde)
+    registro = array("h")
+    for i in range(desde, min(hasta, ranuras)):
+        voiceador.corchea(i, registro)
+    return registro
+
+
+def _alturas_secciones(plantilla, cifrado, corcheas_por_compas, procesos=None, plan=None):
+    """Voicea cada sección del cifrado por separado y encadena sus alturas.
+
+    Con ``procesos`` distinto de 1 y más de una sección se usa un grupo de
+    procesos (``procesos=None`` usa tantos como procesadores).
+    """
+    total_corcheas = len(compases_cifrado(cifrado)[0]) * corcheas_por_compas
+    rangos = secciones_cifrado(cifrado, total_corcheas, corcheas_por_compas)
+    with etapa("secciones", len(rangos)):
+        if procesos == 1 or len(rangos) < 2:
+            resultados = [
+                _voicear_seccion(plantilla, cifrado, corcheas_por_compas, desde, hasta, plan)
+                for desde, hasta in rangos
+            ]
+        else:
+            with ProcessPoolExecutor(max_workers=procesos) as ejecutor:
+                resultados = list(ejecutor.map(
+                    _voicear_seccion,
+                    [plantilla] * len(rangos),
+                    [cifrado] * len(rangos),
+                    [corcheas_por_compas] * len(rangos),
+                    [desde for desde, _ in rangos],
+                    [hasta for _, hasta in rangos],
+                    [plan] * len(rangos),
+                ))
+    return chain.from_iterable(resultados)
+
+
+def voicear_plantilla(
+    plantilla, cifrado, corcheas_por_compas=8, secciones=False, procesos=None, plan=None
+):
+    """Asigna las alturas del ``cifrado`` a una ``PlantillaRitmo``, compás a compás.
+
+    Produce, al terminar cada compás, un ``NotasColumnares`` con las notas que
+    ya no pueden cambiar, sin solapamientos.  El bajo y las alturas de la
+    corchea anterior se conservan entre compases, de modo que concatenar los
+    bloques da el resultado completo.  Una nota que aún
+    puede ser recortada por una nota posterior de su misma altura se retiene,
+    junto con el resto de su corchea y las siguientes, hasta el bloque en que
+    deja de poder cambiar; así cada corchea (ver ``corchea_de_inicio``) sale
+    entera en un solo bloque y las rotaciones y el spread reciben acordes
+    completos.  Las notas se voicean sobre una copia de las columnas de la
+    plantilla que dura todo el recorrido: la memoria crece con la referencia,
+    no con el compás; lo que se adelanta es el primer bloque.
+
+    Con ``secciones`` el enlace de voces se reinicia en cada doble barra
+    ``||`` o marca de ensayo (``[A]``) del cifrado: cada sección se voicea
+    como si el cifrado empezara en ella, partiendo de las alturas de la
+    referencia, y las secciones se calculan en paralelo en ``procesos``
+    procesos (ver ``_alturas_secciones``).  El resultado es el mismo que
+    voicear las secciones una tras otra con ``procesos=1``.
+
+    ``plan`` fija el voicing de cada acorde del cifrado, por índice (ver
+    ``normalizar_plan``); sin él cada acorde se enlaza con el anterior de
+    forma voraz.
+    """
+    plan = normalizar_plan(plan)
+    total_corcheas, segmentos, acordes_analizados = _segmentos_cifrado(
+        cifrado, corcheas_por_compas
+    )
+    if not total_corcheas:
+        return
+    alturas = None
+    if secciones:
+        alturas = _alturas_secciones(plantilla, cifrado, corcheas_por_compas, procesos, plan)
+    dur_corchea = plantilla.dur_corchea
+    tiempo_inicio = plantilla.tiempo_inicio
+    tiempo_fin = tiempo_inicio + total_corcheas * dur_corchea
+    ranuras = len(plantilla)
+
+    notas = plantilla.notas_base()
+    starts, ends, pitches = notas.start, notas.end, notas.pitch
+    voiceador = _Voiceador(plantilla, notas, segmentos, acordes_analizados, plan)
+    retenidas = []
+    abiertas = [None] * 128
+
+    def corchea_de(p):
+        return corchea_de_inicio(starts[p], tiempo_inicio, dur_corchea)
+
+    for compas in range(0, total_corcheas, corcheas_por_compas):
+        ultimo = compas + corcheas_por_compas == total_corcheas
+        with etapa("voicing", corcheas_por_compas):
+            for i in range(compas, min(compas + corcheas_por_compas, ranuras)):
+                if alturas is None:
+                    voiceador.corchea(i)
+                else:
+                    voiceador.reproducir(i, alturas)
+
+        # Fin de compás: las notas fijadas en sus corcheas, y en el último
+        # compás también las que seguían pendientes.
+        with etapa("evitar_solapamientos"):
+            fijadas = []
+            for i in range(compas, min(compas + corcheas_por_compas, ranuras)):
+                fijadas.extend(plantilla.emitidas_de(i))
+            if ultimo:
+                fijadas.extend(plantilla.pendientes_de(total_corcheas - 1))
+                fijadas = [p for p in fijadas if tiempo_inicio <= starts[p] < tiempo_fin]
+                fijadas.sort(key=lambda p: (starts[p], p))
+
+            # ``evitar_solapamientos`` sobre la secuencia global, nota a nota.
+            _recortar_por_altura(
+                starts, ends, pitches, fijadas, MARGEN_SOLAPAMIENTO, abiertas
+            )
+
+            bloque = retenidas + fijadas
+            if ultimo:
+                retenidas = []
+            else:
+                # Las notas futuras empiezan después del compás o, como
+                # pronto, donde empieza alguna nota aún pendiente.  Se retienen
+                # las notas que alguna de ellas puede recortar (la última
+                # abierta de su altura, si termina después de ese límite) o
+                # con las que puede compartir corchea, y con ellas todas las
+                # de su corchea y las siguientes: el bloque no está ordenado
+                # por inicio y las rotaciones y el spread agrupan por corchea.
+                limite = tiempo_inicio + (compas + corcheas_por_compas) * dur_corchea
+                for p in plantilla.pendientes_de(min(compas + corcheas_por_compas, ranuras) - 1):
+                    if starts[p] < limite:
+                        limite = starts[p]
+                corchea_limite = corchea_de_inicio(limite, tiempo_inicio, dur_corchea)
+                corcheas = [corchea_de(p) for p in bloque]
+                corte = None
+                for p, corchea in zip(bloque, corcheas):
+                    altura = pitches[p]
+                    if corchea >= corchea_limite or (
+                        0 <= altura < 128 and abiertas[altura] == p and ends[p] > limite
+                    ):
+                        if corte is None or corchea < corte:
+                            corte = corchea
+                if corte is None:
+                    retenidas = []
+                else:
+                    retenidas = [p for p, c in zip(bloque, corcheas) if c >= corte]
+                    bloque = [p for p, c in zip(bloque, corcheas) if c < corte]
+            contar("evitar_solapamientos", len(fijadas))
+        if bloque:
+            yield notas.seleccionar(bloque)
+
+
+def voicear_por_compases(notas, cifrado, corcheas_por_compas=8, dur_corchea=0.25):
+    """Versión incremental de ``voicear_notas`` (ver ``voicear_plantilla``)."""
+    plantilla = compilar_plantilla(notas, dur_corchea)
+    return voicear_plantilla(plantilla, cifrado, corcheas_por_compas)
+
+
+def _voicear_completo(
+    plantilla, cifrado, corcheas_por_compas, secciones=False, procesos=None, plan=None
+):
+    """Voicea el cifrado entero; es el valor de la etapa ``voicing``.
+
+    Devuelve ``(notas, indices_acordes, tiempo_inicio, cortes)``: ``cortes``
+    son las posiciones de ``notas`` donde termina cada bloque de
+    ``voicear_plantilla``, para que ``renderizar_por_compases`` pueda repetir
+    los mismos bloques a partir de la caché.
+    """
+    _, segmentos, _ = _segmentos_cifrado(cifrado, corcheas_por_compas)
+    indices_acordes = _indices_por_corchea(segmentos)
+    notas_finales = NotasColumnares()
+    cortes = []
+    for bloque in voicear_plantilla(
+        plantilla, cifrado, corcheas_por_compas, secciones, procesos, plan
+    ):
+        notas_finales.extender(bloque)
+        cortes.append(len(notas_finales))
+    return notas_finales, indices_acordes, plantilla.tiempo_inicio, tuple(cortes)
+
+
+def voicear_notas(notas, cifrado, corcheas_por_compas=8, dur_corchea=0.25):
+    """Asigna las alturas del ``cifrado`` al ritmo de ``notas``.
+
+    ``notas`` es un ``NotasColumnares`` ya reordenado por ventanas, que no se
+    modifica.  Devuelve ``(notas_finales, indices_acordes, tiempo_inicio)``:
+    las notas de la duración del cifrado con las alturas enlazadas y sin
+    solapamientos, el índice del acorde de cada corchea y el instante de la
+    primera corchea.
+    """
+    plantilla = compilar_plantilla(notas, dur_corchea)
+    return _voicear_completo(plantilla, cifrado, corcheas_por_compas)[:3]
+
+
+def _cargar_o_compilar_plantilla(referencia, dur_corchea, window_order):
+    """Lee la plantilla guardada de la referencia o la compila y la guarda.
+
+    La plantilla sin ``window_order`` se guarda junto a la referencia, con sus
+    mismos permisos, o en ``cache_disco`` si la carpeta no admite escritura.
+    Las de cada orden de ventanas solo se guardan en ``cache_disco``, indexadas
+    por el contenido del archivo: así no se acumula un archivo por orden
+    junto al ``.mid``.
+    """
+    orden = tuple(window_order) if window_order else None
+    ruta = ruta_plantilla(referencia.ruta, dur_corchea) if orden is None else None
+    clave = referencia.clave[1:]
+    cache = cache_disco.cache_por_defecto()
+    clave_cache = None
+    with etapa("plantilla_disco"):
+        plantilla = PlantillaRitmo.cargar(ruta, clave) if ruta is not None else None
+        if plantilla is None and cache is not None and (ruta is None or not os.path.exists(ruta)):
+            clave_cache = cache_disco.firma_archivo(referencia.ruta) + repr(
+                (float(dur_corchea), orden)
+            ).encode()
+            plantilla = PlantillaRitmo.desde_cache(cache, clave_cache)
+    if plantilla is not None:
+        return plantilla
+    with etapa("reordenar_ventanas", len(referencia.notas)):
+        ventanas = reordenar_ventanas(
+            referencia.notas_columnares(), dur_corchea, 8, window_order
+        )
+    with etapa("plantilla", len(ventanas)):
+        plantilla = compilar_plantilla(ventanas, dur_corchea)
+    if ruta is not None:
+        try:
+            plantilla.guardar(ruta, clave, os.stat(referencia.ruta).st_mode & 0o666)
+            return plantilla
+        except OSError:
+            # Sin permiso de escritura junto a la referencia.
+            pass
+    if clave_cache is not None:
+        plantilla.guardar_en_cache(cache, clave_cache)
+    return plantilla
+
+
+def plantilla_referencia(reference_midi_path, dur_corchea=0.25, window_order=None):
+    """Devuelve la ``PlantillaRitmo`` de una referencia (en caché y en disco)."""
+    referencia = cargar_referencia(reference_midi_path)
+    orden = tuple(window_order) if window_order else None
+    return _etapa(
+        "plantilla",
+        (referencia.clave, dur_corchea, orden),
+        lambda: _cargar_o_compilar_plantilla(referencia, dur_corchea, window_order),
+    )
+
+
+def _clave_voicing(
+    reference_midi_path, dur_corchea, window_order, cifrado, corcheas_por_compas, secciones,
+    plan,
+):
+    referencia = cargar_referencia(reference_midi_path)
+    orden = tuple(window_order) if window_order else None
+    if plan is not None:
+        # Las cadenas del enlace voraz dan las mismas alturas que buscarlas:
+        # el voicing se comparte con el de los renders sin plan.
+        plan = tuple(None if isinstance(v, CadenaVoicing) else v for v in plan)
+        if all(v is None for v in plan):
+            plan = None
+    return (referencia.clave, dur_corchea, orden, cifrado, corcheas_por_compas, secciones, plan)
+
+
+def renderizar_notas(
+    reference_midi_path="reference_comping.mid",
+    cifrado="",
+    corcheas_por_compas=8,
+    dur_corchea=0.25,
+    rotacion=0,
+    rotaciones=None,
+    octavas=None,
+    spread=False,
+    window_order=None,
+    secciones=False,
+    procesos=None,
+    plan=None,
+):
+    """Calcula las notas finales de ``procesa_midi`` sin crear un ``PrettyMIDI``.
+
+    Acepta los mismos parámetros que ``procesa_midi`` (salvo ``save``) y
+    devuelve un ``NotasColumnares`` nuevo, útil para reproducir el resultado
+    directamente.
+    """
+    plantilla = plantilla_referencia(reference_midi_path, dur_corchea, window_order)
+    plan = normalizar_plan(plan)
+    voicing = _etapa(
+        "voicing",
+        _clave_voicing(
+            reference_midi_path, dur_corchea, window_order, cifrado, corcheas_por_compas,
+            secciones, plan,
+        ),
+        lambda: _voicear_completo(
+            plantilla, cifrado, corcheas_por_compas, secciones, procesos, plan
+        ),
+    )
+    notas_voiceadas, indices_acordes, tiempo_inicio, _ = voicing
+    notas_finales = notas_voiceadas.copia()
+
+    with etapa("rotaciones", len(notas_finales)):
+        aplicar_rotaciones(
+            notas_finales,
+            rotacion,
+            rotaciones,
+            octavas,
+            indices_acordes,
+            dur_corchea,
+            tiempo_inicio,
+        )
+    if spread:
+        with etapa("spread", len(notas_finales)):
+            Spread(notas_finales)
+
+    return notas_finales
+
+
+def renderizar_por_compases(
+    reference_midi_path="reference_comping.mid",
+    cifrado="",
+    corcheas_por_compas=8,
+    dur_corchea=0.25,
+    rotacion=0,
+    rotaciones=None,
+    octavas=None,
+    spread=False,
+    window_order=None,
+    secciones=False,
+    procesos=None,
+    plan=None,
+):
+    """Versión incremental de ``renderizar_notas``.
+
+    Produce un ``NotasColumnares`` por compás en cuanto sus notas quedan
+    fijadas (ver ``voicear_plantilla``), con las rotaciones y el spread ya
+    aplicados, de modo que el resultado se puede reproducir, escribir o enviar
+    mientras se calculan los compases siguientes.  Concatenar los bloques da
+    las mismas notas que ``renderizar_notas``.
+
+    Comparte la caché de etapas con ``renderizar_notas``: si el voicing del
+    cifrado ya está calculado, los bloques salen de él sin volver a voicear
+    (cambiar solo ``rotacion``, ``rotaciones``, ``octavas`` o ``spread`` no
+    repite el voicing); si no, se voicea compás a compás y, cuando se
+    consumen todos los bloques, el voicing completo queda en la caché.
+    """
+    plantilla = plantilla_referencia(reference_midi_path, dur_corchea, window_order)
+    plan = normalizar_plan(plan)
+    clave = _clave_voicing(
+        reference_midi_path, dur_corchea, window_order, cifrado, corcheas_por_compas,
+        secciones, plan,
+    )
+    encontrado, voicing = _buscar_etapa("voicing", clave)
+    if encontrado:
+        notas_voiceadas, indices_acordes, tiempo_inicio, cortes = voicing
+        bloques = (
+            notas_voiceadas.seleccionar(range(desde, hasta))
+            for desde, hasta in zip((0,) + cortes, cortes)
+        )
+    else:
+        _, segmentos, _ = _segmentos_cifrado(cifrado, corcheas_por_compas)
+        indices_acordes = _indices_por_corchea(segmentos)
+        tiempo_inicio = plantilla.tiempo_inicio
+        bloques = _voicear_y_guardar(
+            plantilla, cifrado, corcheas_por_compas, secciones, procesos, plan,
+            indices_acordes, clave,
+        )
+    for bloque in bloques:
+        with etapa("rotaciones", len(bloque)):
+            aplicar_rotaciones(
+                bloque,
+                rotacion,
+                rotaciones,
+                octavas,
+                indices_acordes,
+                dur_corchea,
+                tiempo_inicio,
+            )
+        if spread:
+            with etapa("spread", len(bloque)):
+                Spread(bloque)
+        yield bloque
+
+
+def _voicear_y_guardar(
+    plantilla, cifrado, corcheas_por_compas, secciones, procesos, plan, indices_acordes, clave
+):
+    """Recorre ``voicear_plantilla`` y guarda el voicing completo como etapa.
+
+    Las notas de cada bloque se copian a la etapa antes de entregarlo, así
+    que quien lo recibe puede modificarlo.  Si el recorrido se interrumpe no
+    se guarda nada.
+    """
+    notas_voiceadas = NotasColumnares()
+    cortes = []
+    for bloque in voicear_plantilla(
+        plantilla, cifrado, corcheas_por_compas, secciones, procesos, plan
+    ):
+        notas_voiceadas.extender(bloque)
+        cortes.append(len(notas_voiceadas))
+        yield bloque
+    _guardar_etapa(
+        "voicing", clave,
+        (notas_voiceadas, indices_acordes, plantilla.tiempo_inicio, tuple(cortes)),
+    )
+
+
 def procesa_midi(
     reference_midi_path="reference_comping.mid",
     cifrado="",
@@ -429,117 +1492,70 @@ def procesa_midi(
     spread=False,
     window_order=None,
     save=True,
+    output_dir=None,
+    resumen=False,
+    secciones=False,
+    procesos=None,
+    plan=None,
 ):
     """Genera un archivo MIDI con el cifrado indicado.
 
     Si ``spread`` es ``True`` se duplica la segunda nota de cada acorde una y dos
     octavas por encima.  Cuando ``save`` es ``True`` (valor por defecto) el
-    resultado se escribe en un archivo dentro de ``~/Desktop/output`` y se
-    devuelve la ruta al mismo.  Si ``save`` es ``False`` se devuelve el objeto
+    resultado se escribe con el siguiente número libre dentro de
+    ``output_dir`` (``~/Desktop/output`` si no se indica), directamente desde
+    las columnas de notas con ``escritor_midi`` y el tempo y compás de la
+    referencia, y se devuelve la ruta al mismo; ``resumen`` muestra cuántos archivos se exportaron en la sesión
+    (ver ``salida.EscritorSalida``).  Si ``save`` es ``False`` se devuelve el objeto
     ``PrettyMIDI`` resultante sin persistirlo en disco, lo cual permite
     previsualizar el MIDI antes de exportarlo definitivamente.
-    """
-    import pretty_midi
-
-    midi = pretty_midi.PrettyMIDI(reference_midi_path)
-    pista = midi.instruments[0]
-    notas = reordenar_ventanas(pista.notes, dur_corchea, 8, window_order)
-    pista.notes = notas
 
-    compases = [c.strip() for c in cifrado.split('|') if c.strip()]
-    total_corcheas = len(compases) * corcheas_por_compas
-    tiempo_inicio = min(n.start for n in notas)
-    tiempo_fin = tiempo_inicio + total_corcheas * dur_corchea
+    La referencia se analiza una sola vez por sesión mediante
+    ``referencia.cargar_referencia``.  El proceso se divide en etapas cuyos
+    resultados se guardan en caché según sus entradas: el reordenamiento de
+    ventanas depende de la referencia y de ``window_order``, y el voicing
+    además del cifrado.  Cambiar solo ``rotacion``, ``rotaciones``,
+    ``octavas`` o ``spread`` recalcula únicamente la última etapa.  Para
+    obtener las notas compás a compás sin esperar al cifrado completo se puede
+    usar ``renderizar_por_compases``.
 
-    acordes_corchea, indices_acordes = expandir_cifrado_a_corcheas(
-        cifrado, total_corcheas, corcheas_por_compas, return_indices=True
-    )
-    cache = {}
-    acordes_analizados = []
-    for a in acordes_corchea:
-        if a not in cache:
-            cache[a] = analizar_cifrado(a)[0]
-        acordes_analizados.append(cache[a])
-
-    bajo_anterior = None
-    for i in range(total_corcheas):
-        t0 = tiempo_inicio + i * dur_corchea
-        t1 = t0 + dur_corchea
-        # Nuevo filtrado para incluir notas activas en el segmento (no solo las que inician)
-        notas_corchea = [
-            n for n in notas if not (n.end <= t0 or n.start >= t1) and n.velocity > 1
-        ]
+    Con ``secciones`` el enlace de voces se reinicia en cada doble barra
+    ``||`` o marca de ensayo (``[A]``) del cifrado y las secciones se voicean
+    en paralelo en ``procesos`` procesos (ver ``voicear_plantilla``).
 
-        # Mantener silencios del midi de referencia
-        if not notas_corchea:
-            continue
+    ``plan`` fija el voicing de cada acorde, por ejemplo el camino de
+    movimiento mínimo de ``plan_voicing.planificar_voicings``; sin él cada
+    acorde elige el voicing cuyo bajo queda más cerca del anterior.
 
-        if len(notas_corchea) > 4:
-            notas_corchea = notas_corchea[:4]
-        elif len(notas_corchea) < 4:
-            # Duplicar notas existentes para garantizar cuatro eventos
-            base_nota = notas_corchea[0]
-            for _ in range(4 - len(notas_corchea)):
-                nueva = pretty_midi.Note(velocity=base_nota.velocity,
-                                         pitch=base_nota.pitch,
-                                         start=t0,
-                                         end=t1)
-                notas.append(nueva)
-                notas_corchea.append(nueva)
-
-        # Evitar legato forzando las notas a encajar en los límites del segmento
-        recortar_notas_a_segmento(notas_corchea, t0, t1)
-
-        fundamental, grados = acordes_analizados[i]
-        if i == 0:
-            nuevas_alturas = None
-            for inv in range(4):
-                cand = notas_midi_acorde(
-                    fundamental, grados, base_octava=4, prev_bajo=None, inversion=inv
-                )
-                if cand[0] >= 57:
-                    nuevas_alturas = cand
-                    break
-            if nuevas_alturas is None:
-                nuevas_alturas = cand
-        else:
-            nuevas_alturas = notas_midi_acorde(
-                fundamental, grados, base_octava=4, prev_bajo=bajo_anterior
-            )
-        bajo_anterior = nuevas_alturas[0]
-        alturas_previas = [n.pitch for n in notas_corchea]
-        nuevas = enlazar_notas(alturas_previas, nuevas_alturas)
-        for nota, altura in zip(notas_corchea, nuevas):
-            nota.pitch = altura
-
-    notas_finales = [n for n in notas if tiempo_inicio <= n.start < tiempo_fin]
-    evitar_solapamientos(notas_finales)
-
-    aplicar_rotaciones(
-        notas_finales,
+    Dentro de un bloque ``perfil.perfilar()`` se mide el tiempo de cada etapa
+    y la tasa de aciertos de las cachés.
+    """
+    notas_finales = renderizar_notas(
+        reference_midi_path,
+        cifrado,
+        corcheas_por_compas,
+        dur_corchea,
         rotacion,
         rotaciones,
         octavas,
-        indices_acordes,
-        dur_corchea,
-        tiempo_inicio,
+        spread,
+        window_order,
+        secciones,
+        procesos,
+        plan,
     )
-    if spread:
-        Spread(notas_finales)
-
-    pista.notes = notas_finales
+    referencia = cargar_referencia(reference_midi_path)
 
     if save:
-        out_dir = Path.home() / "Desktop" / "output"
-        out_dir.mkdir(parents=True, exist_ok=True)
-        indices = [int(p.stem) for p in out_dir.glob("*.mid") if p.stem.isdigit()]
-        next_idx = max(indices, default=0) + 1
-        out_path = out_dir / f"{next_idx}.mid"
-        midi.write(str(out_path))
-        print(f"Archivo exportado: {out_path}")
-        archivos = sorted(out_dir.glob("*.mid"), key=lambda p: int(p.stem))
-        for p in archivos:
-            print(p.name)
+        # Las columnas se escriben directamente, sin pasar por ``pretty_midi``.
+        escritor = escritor_salida(output_dir)
+        with etapa("escritura", len(notas_finales)):
+            archivo = ArchivoMidi(referencia.cabecera_midi(), notas_finales)
+            out_path = escritor.escribir(archivo, resumen)
         return str(out_path)
-    else:
-        return midi
+
+    # Las notas se convierten a ``pretty_midi`` solo si se pide el objeto.
+    with etapa("pretty_midi", len(notas_finales)):
+        midi = referencia.nueva_midi()
+        midi.instruments[0].notes = notas_finales.a_notas()
+    return midi
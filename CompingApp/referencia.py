@@ -0,0 +1,194 @@
+import copy
+import os
+import threading
+from collections import OrderedDict
+
+import cache_disco
+from escritor_midi import leer_cabecera
+from notas_columnares import NotasColumnares
+from perfil import contar, etapa, registrar_cache
+
+# Número máximo de archivos de referencia que se mantienen analizados.
+MAX_REFERENCIAS = 8
+
+# Tipo y versión de las notas analizadas en ``cache_disco``.
+TIPO_NOTAS = b"NOTA"
+VERSION_NOTAS = 1
+
+
+class Referencia:
+    """Archivo MIDI de referencia analizado una sola vez.
+
+    ``notas`` es un ``NotasColumnares`` con las notas de la primera pista, en
+    el orden del archivo; se comparte entre renders y no debe modificarse
+    (``notas_columnares`` devuelve una copia para trabajar).  La plantilla
+    guarda el resto del ``PrettyMIDI`` (tempo, compases, otras pistas) sin esas
+    notas, de modo que copiarla para cada render es barato.
+
+    Si las notas se leyeron de la caché en disco, la plantilla es ``None``
+    hasta que ``nueva_midi`` la necesita: los renders que no escriben un
+    ``PrettyMIDI`` no llegan a analizar el archivo.  Para exportar basta con
+    ``cabecera_midi``, que lee el tempo y el compás sin ``pretty_midi``.
+    """
+
+    __slots__ = ("ruta", "clave", "notas", "_plantilla", "_cabecera", "_lock")
+
+    def __init__(self, ruta, clave, notas, plantilla):
+        self.ruta = ruta
+        self.clave = clave
+        self.notas = notas
+        self._plantilla = plantilla
+        self._cabecera = None
+        self._lock = threading.Lock()
+
+    def cabecera_midi(self):
+        """Devuelve la ``escritor_midi.CabeceraMidi`` del archivo, leída una sola vez."""
+        with self._lock:
+            if self._cabecera is None:
+                self._cabecera = leer_cabecera(self.ruta)
+            return self._cabecera
+
+    def nueva_midi(self):
+        """Devuelve una copia independiente del ``PrettyMIDI`` sin notas."""
+        with self._lock:
+            if self._plantilla is None:
+                with etapa("referencia"):
+                    _, self._plantilla = _parsear_referencia(self.ruta)
+            return copy.deepcopy(self._plantilla)
+
+    def notas_columnares(self):
+        """Devuelve una copia columnar de las notas que se puede modificar."""
+        return self.notas.copia()
+
+    def notas_pretty_midi(self):
+        """Devuelve notas ``pretty_midi.Note`` nuevas que se pueden modificar."""
+        return self.notas.a_notas()
+
+
+_cache = OrderedDict()
+_en_curso = {}
+_lock = threading.Lock()
+_estadisticas = {"aciertos": 0, "analisis": 0}
+
+
+def _clave(ruta):
+    info = os.stat(ruta)
+    return (os.path.abspath(ruta), info.st_mtime_ns, info.st_size)
+
+
+def _parsear_referencia(ruta):
+    import pretty_midi
+
+    midi = pretty_midi.PrettyMIDI(ruta)
+    pista = midi.instruments[0]
+    notas = NotasColumnares.desde_notas(pista.notes)
+    pista.notes = []
+    return notas, midi
+
+
+def _analizar(ruta):
+    """Devuelve ``(notas, plantilla)`` usando la caché en disco si está activa.
+
+    La caché se indexa por el hash del contenido del archivo, así que dos
+    copias de la misma referencia comparten la entrada.  Las notas leídas de
+    ella están mapeadas en memoria y son de solo lectura.
+    """
+    cache = cache_disco.cache_por_defecto()
+    if cache is not None:
+        firma = cache_disco.firma_archivo(ruta)
+        leido = cache.leer(TIPO_NOTAS, firma, VERSION_NOTAS)
+        if leido is not None:
+            columnas = leido[1]
+            notas = NotasColumnares.sobre_buffers(
+                columnas["start"], columnas["end"], columnas["pitch"], columnas["velocity"]
+            )
+            return notas, None
+    with etapa("referencia"):
+        notas, plantilla = _parsear_referencia(ruta)
+    if cache is not None:
+        cache.escribir(
+            TIPO_NOTAS,
+            firma,
+            {"start": notas.start, "end": notas.end, "pitch": notas.pitch,
+             "velocity": notas.velocity},
+            version=VERSION_NOTAS,
+        )
+    return notas, plantilla
+
+
+def cargar_referencia(ruta):
+    """Devuelve la ``Referencia`` de ``ruta`` analizándola solo si cambió.
+
+    La caché se indexa por ruta absoluta, fecha de modificación y tamaño, por
+    lo que editar el archivo provoca un nuevo análisis.  Si otro hilo ya está
+    analizando el mismo archivo se espera a su resultado.  Entre procesos, las
+    notas analizadas se comparten mediante ``cache_disco``.
+    """
+    clave = _clave(ruta)
+    while True:
+        with _lock:
+            referencia = _cache.get(clave)
+            if referencia is not None:
+                _cache.move_to_end(clave)
+                _estadisticas["aciertos"] += 1
+                return referencia
+            evento = _en_curso.get(clave)
+            if evento is None:
+                evento = _en_curso[clave] = threading.Event()
+                break
+        evento.wait()
+
+    try:
+        notas, plantilla = _analizar(ruta)
+        contar("referencia", len(notas))
+        referencia = Referencia(ruta, clave, notas, plantilla)
+        with _lock:
+            _estadisticas["analisis"] += 1
+            _cache[clave] = referencia
+            while len(_cache) > MAX_REFERENCIAS:
+                _cache.popitem(last=False)
+        return referencia
+    finally:
+        with _lock:
+            del _en_curso[clave]
+        evento.set()
+
+
+def precargar_referencia(ruta):
+    """Analiza ``ruta`` en un hilo en segundo plano y devuelve el hilo.
+
+    Los errores se ignoran: el render que use el archivo los volverá a
+    encontrar y los mostrará.
+    """
+
+    def cargar():
+        try:
+            cargar_referencia(ruta)
+        except Exception:
+            pass
+
+    hilo = threading.Thread(target=cargar, daemon=True)
+    hilo.start()
+    return hilo
+
+
+def estadisticas_cache_referencias():
+    """Devuelve los aciertos y análisis realizados por la caché."""
+    with _lock:
+        return dict(_estadisticas, referencias=len(_cache))
+
+
+def _aciertos_referencias():
+    with _lock:
+        return _estadisticas["aciertos"], _estadisticas["analisis"]
+
+
+registrar_cache("referencias", _aciertos_referencias)
+
+
+def limpiar_cache_referencias():
+    """Olvida todas las referencias analizadas."""
+    with _lock:
+        _cache.clear()
+        _estadisticas["aciertos"] = 0
+        _estadisticas["analisis"] = 0
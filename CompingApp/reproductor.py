@@ -0,0 +1,88 @@
+import heapq
+import threading
+import time
+
+
+def eventos_desde_notas(notas):
+    """Convierte notas en eventos MIDI ordenados por tiempo.
+
+    ``notas`` es un iterable de tuplas ``(start, end, pitch, velocity)``
+    ordenado por ``start``; puede ser un generador que produce las notas a
+    medida que se calculan.  Se producen tuplas ``(tiempo, tipo, altura,
+    velocidad)`` con ``tipo`` igual a ``"note_on"`` o ``"note_off"``.  Los
+    ``note_off`` pendientes se guardan en un montículo y se emiten en cuanto
+    ninguna nota posterior puede empezar antes; a igual tiempo, los
+    ``note_off`` van antes que los ``note_on``.  Las alturas fuera del rango
+    MIDI se descartan.
+    """
+    pendientes = []
+    for start, end, pitch, velocity in notas:
+        if not 0 <= pitch <= 127:
+            continue
+        while pendientes and pendientes[0][0] <= start:
+            fin, altura = heapq.heappop(pendientes)
+            yield fin, "note_off", altura, 0
+        yield start, "note_on", pitch, velocity
+        heapq.heappush(pendientes, (end, pitch))
+    while pendientes:
+        fin, altura = heapq.heappop(pendientes)
+        yield fin, "note_off", altura, 0
+
+
+def _mensaje_mido(tipo, altura, velocidad):
+    import mido
+
+    return mido.Message(tipo, note=altura, velocity=velocidad)
+
+
+class Reproductor:
+    """Envía notas a un puerto MIDI siguiendo un reloj monótono.
+
+    Cada evento se programa en ``inicio + tiempo`` respecto al instante en que
+    empezó la reproducción, no respecto al evento anterior, de modo que los
+    retrasos (por ejemplo, mientras se calculan compases posteriores) no se
+    acumulan: si un evento llega tarde se envía de inmediato y los siguientes
+    recuperan su hora prevista.  ``detener`` interrumpe la espera en curso al
+    instante y apaga las notas que estaban sonando.
+
+    ``puerto`` solo necesita un método ``send``.  ``crear_mensaje``, ``reloj``
+    y ``esperar`` se pueden sustituir en las pruebas; ``esperar(segundos)``
+    debe devolver ``True`` si se pidió detener la reproducción.
+    """
+
+    def __init__(self, puerto, crear_mensaje=None, reloj=time.monotonic, esperar=None,
+                 evento_detener=None):
+        self.puerto = puerto
+        self._crear_mensaje = crear_mensaje or _mensaje_mido
+        self._reloj = reloj
+        self._detener = evento_detener or threading.Event()
+        self._esperar = esperar or self._detener.wait
+
+    def detener(self):
+        self._detener.set()
+
+    def reproducir(self, notas):
+        """Reproduce ``notas`` (ver ``eventos_desde_notas``) y bloquea hasta el final.
+
+        Devuelve ``True`` si la reproducción terminó y ``False`` si se detuvo.
+        El tiempo 0 de las notas corresponde al inicio de la reproducción.
+        """
+        sonando = {}
+        inicio = self._reloj()
+        try:
+            for tiempo, tipo, altura, velocidad in eventos_desde_notas(notas):
+                if self._detener.is_set():
+                    return False
+                restante = inicio + tiempo - self._reloj()
+                if restante > 0 and self._esperar(restante):
+                    return False
+                self.puerto.send(self._crear_mensaje(tipo, altura, velocidad))
+                if tipo == "note_on":
+                    sonando[altura] = sonando.get(altura, 0) + 1
+                elif sonando.get(altura):
+                    sonando[altura] -= 1
+            return True
+        finally:
+            for altura, veces in sonando.items():
+                if veces:
+                    self.puerto.send(self._crear_mensaje("note_off", altura, 0))
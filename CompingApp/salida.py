@@ -0,0 +1,113 @@
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+# Carpeta de exportación por defecto de ``procesa_midi``.
+DIRECTORIO_SALIDA = Path.home() / "Desktop" / "output"
+
+# Archivo con el siguiente número libre, dentro de la carpeta de salida.
+ARCHIVO_CONTADOR = ".siguiente"
+
+
+class EscritorSalida:
+    """Escribe archivos MIDI numerados (``1.mid``, ``2.mid``, ...) en una carpeta.
+
+    El siguiente número se lee de un archivo contador y se reserva creando el
+    archivo con ``O_CREAT | O_EXCL``, de modo que dos procesos nunca obtienen
+    el mismo nombre: si el número ya existe se prueba el siguiente.  El
+    contador es solo una pista y se reescribe de forma atómica tras cada
+    reserva; si falta o está dañado se reconstruye recorriendo la carpeta una
+    única vez.  El contenido se escribe en un temporal que luego reemplaza al
+    archivo reservado, por lo que nunca se ve un MIDI a medio escribir.
+    """
+
+    def __init__(self, directorio=None):
+        self.directorio = Path(directorio) if directorio else DIRECTORIO_SALIDA
+        self.exportados = 0
+        self._lock = threading.Lock()
+
+    @property
+    def _contador(self):
+        return self.directorio / ARCHIVO_CONTADOR
+
+    def _leer_contador(self):
+        try:
+            return max(1, int(self._contador.read_text().strip()))
+        except (OSError, ValueError):
+            pass
+        numeros = [
+            int(Path(e.name).stem)
+            for e in os.scandir(self.directorio)
+            if e.name.endswith(".mid") and Path(e.name).stem.isdigit()
+        ]
+        return max(numeros, default=0) + 1
+
+    def _guardar_contador(self, siguiente):
+        descriptor, temporal = tempfile.mkstemp(dir=self.directorio, prefix=ARCHIVO_CONTADOR)
+        try:
+            with os.fdopen(descriptor, "w") as f:
+                f.write(str(siguiente))
+            os.replace(temporal, self._contador)
+        except OSError:
+            try:
+                os.unlink(temporal)
+            except OSError:
+                pass
+
+    def reservar(self):
+        """Crea un archivo vacío con el siguiente número libre y devuelve su ruta."""
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        numero = self._leer_contador()
+        while True:
+            ruta = self.directorio / f"{numero}.mid"
+            try:
+                descriptor = os.open(ruta, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                numero += 1
+                continue
+            os.close(descriptor)
+            self._guardar_contador(numero + 1)
+            return ruta
+
+    def escribir(self, midi, resumen=False):
+        """Escribe ``midi`` (cualquier objeto con ``write(ruta)``) y devuelve la ruta.
+
+        Con ``resumen`` se informa además cuántos archivos se exportaron en la
+        sesión, en lugar de listar la carpeta completa.
+        """
+        ruta = self.reservar()
+        descriptor, temporal = tempfile.mkstemp(
+            dir=self.directorio, prefix=f".{ruta.stem}-", suffix=".mid"
+        )
+        os.close(descriptor)
+        try:
+            midi.write(temporal)
+            os.replace(temporal, ruta)
+        except BaseException:
+            for sobrante in (temporal, ruta):
+                try:
+                    os.unlink(sobrante)
+                except OSError:
+                    pass
+            raise
+        with self._lock:
+            self.exportados += 1
+        print(f"Archivo exportado: {ruta}")
+        if resumen:
+            print(f"Exportados en esta sesión: {self.exportados} (carpeta {self.directorio})")
+        return ruta
+
+
+_escritores = {}
+_lock_escritores = threading.Lock()
+
+
+def escritor_salida(directorio=None):
+    """Devuelve el ``EscritorSalida`` compartido de ``directorio``."""
+    clave = os.path.abspath(directorio or DIRECTORIO_SALIDA)
+    with _lock_escritores:
+        escritor = _escritores.get(clave)
+        if escritor is None:
+            escritor = _escritores[clave] = EscritorSalida(clave)
+        return escritor
@@ -0,0 +1,207 @@
+"""Tabla densa de voicings para el vocabulario de acordes de ``acordes_dict``.
+
+Las cualidades de ``acordes_dict.acordes`` y las sustituciones de extensiones
+que aplica ``cifrado_utils.analizar_acorde`` (novena en el primer grado,
+oncena o trecena en el tercero) forman un conjunto finito de ``grados``.  Con
+12 fundamentales y un bajo previo dentro de una ventana acotada, todas las
+elecciones de ``notas_midi_acorde`` caben en un ``array`` de bytes: cuatro
+alturas por combinación.
+
+La tabla se rellena de forma perezosa, entrada a entrada, la primera vez que se
+consulta cada combinación; ``construir`` la completa y la guarda en la caché
+en disco, de donde los procesos siguientes la abren con ``mmap``.  Las
+consultas fuera del vocabulario o de la ventana de bajos se calculan con la
+función original.  ``verificar`` compara cada entrada con la función
+original, y ``python tabla_voicings.py --verificar`` construye la tabla y la
+verifica completa.
+"""
+import hashlib
+import types
+from array import array
+
+from acordes_dict import acordes
+from cifrado_utils import _EXT_MAP
+
+TIPO = b"VOIC"
+VERSION = 1
+
+# Ventana de bajos previos cubierta por la tabla (C2–C6).  Los voicings se
+# mantienen en D3–C5, pero el bajo puede derivar unas cuantas notas fuera.
+BAJO_MINIMO = 36
+BAJO_MAXIMO = 84
+
+# Columnas de cada fila: las cuatro inversiones del primer acorde
+# (``prev_bajo=None``) y luego un bajo previo por columna.
+INVERSIONES = 4
+COLUMNAS = INVERSIONES + BAJO_MAXIMO - BAJO_MINIMO + 1
+
+_SIN_CALCULAR = 0
+_SIN_VOICING = 255
+
+
+def vocabulario():
+    """Devuelve, ordenados, todos los ``grados`` que puede producir ``analizar_acorde``."""
+    novenas = sorted({v for k, v in _EXT_MAP.items() if "9" in k})
+    terceros = sorted({v for k, v in _EXT_MAP.items() if "11" in k or "13" in k})
+    grados = set()
+    for base in acordes.values():
+        grados.add(tuple(base))
+        for novena in novenas:
+            con_novena = [novena] + list(base[1:])
+            grados.add(tuple(con_novena))
+            for tercero in terceros:
+                grados.add(tuple(con_novena[:2] + [tercero] + con_novena[3:]))
+    return sorted(grados)
+
+
+def _firma_codigo(codigo, h):
+    h.update(codigo.co_code)
+    for constante in codigo.co_consts:
+        if isinstance(constante, types.CodeType):
+            _firma_codigo(constante, h)
+        else:
+            h.update(repr(constante).encode())
+
+
+class TablaVoicings:
+    """Voicings precalculados de ``funcion`` con ``base_octava=4``.
+
+    ``funcion(clase_fundamental, grados, base_octava, prev_bajo, inversion)``
+    debe devolver una tupla de alturas o ``None`` (como
+    ``procesa_midi._notas_midi_acorde``).  Es segura entre hilos: dos hilos que
+    rellenan la misma entrada escriben el mismo valor.
+    """
+
+    def __init__(self, funcion, cache=None):
+        self.funcion = funcion
+        self.grados = vocabulario()
+        self._filas = {g: k for k, g in enumerate(self.grados)}
+        self.aciertos = 0
+        self.fallos = 0
+        self.datos = None
+        if cache is not None:
+            leido = cache.leer(TIPO, self.clave(), VERSION)
+            if leido is not None and len(leido[1].get("voicings", ())) == self._tamano():
+                self.datos = leido[1]["voicings"]
+        if self.datos is None:
+            self.datos = array("B", bytes(self._tamano()))
+
+    def _tamano(self):
+        return len(self.grados) * 12 * COLUMNAS * 4
+
+    def clave(self):
+        """Clave de la tabla en la caché: cambia si cambia la función o el vocabulario."""
+        h = hashlib.sha256(repr((BAJO_MINIMO, BAJO_MAXIMO, self.grados)).encode())
+        _firma_codigo(getattr(self.funcion, "__wrapped__", self.funcion).__code__, h)
+        return h.digest()
+
+    def _posicion(self, clase, grados, prev_bajo, inversion):
+        fila = self._filas.get(grados)
+        if fila is None:
+            return None
+        if prev_bajo is None:
+            columna = inversion % INVERSIONES
+        elif BAJO_MINIMO <= prev_bajo <= BAJO_MAXIMO:
+            columna = INVERSIONES + prev_bajo - BAJO_MINIMO
+        else:
+            return None
+        return ((fila * 12 + clase) * COLUMNAS + columna) * 4
+
+    def voicing(self, clase, grados, prev_bajo=None, inversion=0):
+        """Devuelve la tupla de alturas de ``funcion`` para estos argumentos.
+
+        ``clase`` es la clase de altura de la fundamental (0–11) y ``grados``
+        una tupla.  ``inversion`` solo cuenta si ``prev_bajo`` es ``None``.
+        """
+        fila = self._filas.get(grados)
+        if prev_bajo is None:
+            columna = inversion % INVERSIONES
+        else:
+            columna = prev_bajo - BAJO_MINIMO + INVERSIONES
+            if not INVERSIONES <= columna < COLUMNAS:
+                fila = None
+        if fila is None:
+            return self.funcion(
+                clase, grados, 4, prev_bajo, inversion % INVERSIONES if prev_bajo is None else 0
+            )
+        k = ((fila * 12 + clase) * COLUMNAS + columna) * 4
+        datos = self.datos
+        primera = datos[k]
+        if primera == _SIN_CALCULAR:
+            return self._rellenar(k, clase, grados, prev_bajo, inversion)
+        self.aciertos += 1
+        if primera == _SIN_VOICING:
+            return None
+        return (primera, datos[k + 1], datos[k + 2], datos[k + 3])
+
+    def _rellenar(self, k, clase, grados, prev_bajo, inversion):
+        self.fallos += 1
+        resultado = self.funcion(
+            clase, grados, 4, prev_bajo, inversion % INVERSIONES if prev_bajo is None else 0
+        )
+        if isinstance(self.datos, array):
+            if resultado is None:
+                self.datos[k] = _SIN_VOICING
+            elif all(_SIN_CALCULAR < n < _SIN_VOICING for n in resultado):
+                self.datos[k + 1:k + 4] = array("B", resultado[1:])
+                self.datos[k] = resultado[0]
+        return resultado
+
+    def combinaciones(self):
+        """Recorre todos los argumentos ``(clase, grados, prev_bajo, inversion)`` de la tabla."""
+        for grados in self.grados:
+            for clase in range(12):
+                for inversion in range(INVERSIONES):
+                    yield clase, grados, None, inversion
+                for prev_bajo in range(BAJO_MINIMO, BAJO_MAXIMO + 1):
+                    yield clase, grados, prev_bajo, 0
+
+    def construir(self, cache=None):
+        """Calcula todas las entradas que falten y guarda la tabla en ``cache``."""
+        for argumentos in self.combinaciones():
+            self.voicing(*argumentos)
+        if cache is not None and isinstance(self.datos, array):
+            cache.escribir(TIPO, self.clave(), {"voicings": self.datos}, version=VERSION)
+        return self
+
+    def verificar(self):
+        """Compara cada entrada calculada con ``funcion``.
+
+        Devuelve la lista de discrepancias ``(argumentos, tabla, funcion)``;
+        vacía si la tabla es correcta.
+        """
+        errores = []
+        for clase, grados, prev_bajo, inversion in self.combinaciones():
+            k = self._posicion(clase, grados, prev_bajo, inversion)
+            if self.datos[k] == _SIN_CALCULAR:
+                continue
+            guardado = None if self.datos[k] == _SIN_VOICING else tuple(self.datos[k:k + 4])
+            vivo = self.funcion(clase, grados, 4, prev_bajo, inversion)
+            if guardado != vivo:
+                errores.append(((clase, grados, prev_bajo, inversion), guardado, vivo))
+        return errores
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from cache_disco import cache_por_defecto
+    from procesa_midi import tabla_voicings
+
+    parser = argparse.ArgumentParser(
+        description="Construye la tabla de voicings y la guarda en la caché en disco."
+    )
+    parser.add_argument(
+        "--verificar", action="store_true",
+        help="comprobar cada entrada contra notas_midi_acorde",
+    )
+    args = parser.parse_args()
+
+    tabla = tabla_voicings().construir(cache_por_defecto())
+    print(f"{len(tabla.grados)} grados, {len(tabla.datos)} bytes")
+    if args.verificar:
+        errores = tabla.verificar()
+        for argumentos, guardado, vivo in errores[:20]:
+            print(f"Discrepancia en {argumentos}: tabla {guardado}, función {vivo}")
+        print("Tabla correcta." if not errores else f"{len(errores)} discrepancias.")
+        raise SystemExit(1 if errores else 0)
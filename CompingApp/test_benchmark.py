@@ -0,0 +1,41 @@
+import json
+
+import benchmark
+
+
+def test_datos_sinteticos_son_reproducibles():
+    assert benchmark.cifrado_sintetico(16, 3) == benchmark.cifrado_sintetico(16, 3)
+    a = benchmark.referencia_sintetica(4, 2, semilla=5)
+    b = benchmark.referencia_sintetica(4, 2, semilla=5)
+    assert list(a.tuplas()) == list(b.tuplas())
+    assert len(benchmark.cifrado_sintetico(16).split("|")) == 16
+
+
+def test_ejecutar_genera_json(tmp_path):
+    datos = benchmark.ejecutar(compases=(2,), densidades=(1,), voces=(4,), repeticiones=1)
+    casos = {fila["caso"] for fila in datos["resultados"]}
+    assert {
+        "analizar_cifrado",
+        "notas_midi_acorde",
+        "enlazar_notas",
+        "reordenar_ventanas",
+        "voicear_notas",
+        "aplicar_rotaciones",
+        "Spread",
+        "codificar_midi",
+    } <= casos
+    ruta = tmp_path / "resultados.json"
+    ruta.write_text(json.dumps(datos))
+    assert json.loads(ruta.read_text())["resultados"] == datos["resultados"]
+
+
+def test_comparar_resultados_detecta_regresiones():
+    def ejecucion(segundos):
+        return {"resultados": [
+            {"caso": "voicear_notas", "parametros": {"compases": 8}, "minimo": segundos}
+        ]}
+
+    filas, regresiones = benchmark.comparar_resultados(ejecucion(1.0), ejecucion(1.5))
+    assert len(filas) == 1 and len(regresiones) == 1
+    _, regresiones = benchmark.comparar_resultados(ejecucion(1.0), ejecucion(1.1))
+    assert regresiones == []
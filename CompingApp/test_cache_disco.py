@@ -0,0 +1,59 @@
+import os
+from array import array
+
+import cache_disco
+from cache_disco import CacheDisco, abrir_columnas, escribir_columnas
+
+
+def columnas():
+    return {
+        "start": array("d", [0.0, 0.5, 1.25]),
+        "pitch": array("h", [60, -3, 72]),
+        "velocity": array("B", [100, 1, 64]),
+    }
+
+
+def test_columnas_se_abren_con_mmap(tmp_path):
+    ruta = tmp_path / "a.bin"
+    escribir_columnas(ruta, b"PRUE", 3, columnas(), (0.25, 1.5), b"firma")
+    escalares, leidas = abrir_columnas(ruta, b"PRUE", 3, b"firma")
+    assert escalares == (0.25, 1.5)
+    assert {k: v.tolist() for k, v in leidas.items()} == {
+        k: v.tolist() for k, v in columnas().items()
+    }
+    assert isinstance(leidas["start"], memoryview) and leidas["start"].readonly
+
+
+def test_rechaza_tipo_version_firma_o_truncado(tmp_path):
+    ruta = tmp_path / "a.bin"
+    escribir_columnas(ruta, b"PRUE", 3, columnas(), firma=b"firma")
+    assert abrir_columnas(ruta, b"OTRO", 3) is None
+    assert abrir_columnas(ruta, b"PRUE", 4) is None
+    assert abrir_columnas(ruta, b"PRUE", 3, b"otra") is None
+    ruta.write_bytes(ruta.read_bytes()[:-16])
+    assert abrir_columnas(ruta, b"PRUE", 3) is None
+    assert abrir_columnas(tmp_path / "no_existe.bin", b"PRUE", 3) is None
+
+
+def test_expulsa_las_entradas_menos_usadas(tmp_path):
+    cache = CacheDisco(tmp_path, tamano_maximo=10**9)
+    for clave in (b"a", b"b", b"c"):
+        assert cache.escribir(b"PRUE", clave, columnas())
+    tamano = cache.entradas()[0][1]
+    for segundos, clave in enumerate((b"a", b"b", b"c"), 1):
+        os.utime(cache._ruta(b"PRUE", clave), ns=(segundos * 10**9, segundos * 10**9))
+    # Leer "a" la convierte en la más reciente.
+    assert cache.leer(b"PRUE", b"a") is not None
+    cache.tamano_maximo = 3 * tamano
+    cache.escribir(b"PRUE", b"d", columnas())
+    assert cache.leer(b"PRUE", b"b") is None
+    for clave in (b"a", b"c", b"d"):
+        assert cache.leer(b"PRUE", clave) is not None
+    assert cache.leer(b"PRUE", b"a", version=2) is None
+
+
+def test_configurar_none_desactiva_la_cache(tmp_path):
+    assert cache_disco.configurar(tmp_path).directorio == tmp_path
+    assert cache_disco.cache_por_defecto().directorio == tmp_path
+    assert cache_disco.configurar(None) is None
+    assert cache_disco.cache_por_defecto() is None
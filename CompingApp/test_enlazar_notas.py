@@ -0,0 +1,63 @@
+import itertools
+import random
+import time
+
+from asignacion import asignacion_minima
+from procesa_midi import enlazar_notas
+
+
+def enlazar_exhaustivo(previas, nuevas):
+    if len(nuevas) >= len(previas):
+        candidatos = itertools.permutations(nuevas, len(previas))
+    else:
+        candidatos = itertools.product(nuevas, repeat=len(previas))
+    mejor, mejor_costo = None, None
+    for cand in candidatos:
+        costo = sum(abs(p - q) for p, q in zip(cand, previas))
+        if mejor_costo is None or costo < mejor_costo:
+            mejor, mejor_costo = cand, costo
+    return list(mejor)
+
+
+def test_coincide_con_busqueda_exhaustiva():
+    rng = random.Random(3)
+    for _ in range(500):
+        previas = [rng.randint(48, 76) for _ in range(rng.randint(1, 6))]
+        nuevas = [rng.randint(48, 76) for _ in range(rng.randint(1, 6))]
+        assert enlazar_notas(previas, nuevas) == enlazar_exhaustivo(previas, nuevas)
+
+
+def test_empates_y_alturas_repetidas():
+    assert enlazar_notas([60, 60], [59, 61]) == enlazar_exhaustivo([60, 60], [59, 61])
+    assert enlazar_notas([62, 62, 62], [60, 64, 64]) == [60, 64, 64]
+    assert enlazar_notas([60, 64, 67, 70], [60]) == [60, 60, 60, 60]
+
+
+def test_asignacion_rectangular():
+    costos = [[4, 1, 3], [2, 0, 5]]
+    assert asignacion_minima(costos) == [1, 0]
+
+
+def costo_optimo_en_recta(previas, nuevas):
+    """Costo mínimo emparejando en orden ``previas`` con una subsecuencia de ``nuevas``."""
+    p, q = sorted(previas), sorted(nuevas)
+    infinito = float("inf")
+    dp = [0] + [infinito] * len(p)
+    for altura in q:
+        for i in range(len(p), 0, -1):
+            dp[i] = min(dp[i], dp[i - 1] + abs(p[i - 1] - altura))
+    return dp[len(p)]
+
+
+def test_escala_a_doce_voces():
+    rng = random.Random(7)
+    previas = [rng.randint(36, 96) for _ in range(12)]
+    nuevas = [rng.randint(36, 96) for _ in range(14)]
+    inicio = time.perf_counter()
+    resultado = enlazar_notas(previas, nuevas)
+    assert time.perf_counter() - inicio < 1.0
+    restantes = list(nuevas)
+    for altura in resultado:
+        restantes.remove(altura)
+    costo = sum(abs(p - q) for p, q in zip(previas, resultado))
+    assert costo == costo_optimo_en_recta(previas, nuevas)
@@ -0,0 +1,154 @@
+import os
+import struct
+
+import pytest
+
+import procesa_midi as pm
+from escritor_midi import (
+    META_TEMPO,
+    ArchivoMidi,
+    CabeceraMidi,
+    _escribir_vlq,
+    _leer_vlq,
+    codificar_midi,
+    leer_cabecera,
+    segundos_a_ticks,
+)
+from notas_columnares import NotasColumnares
+
+REFERENCIA = os.path.join(os.path.dirname(__file__), "reference_comping.mid")
+
+
+def cabecera(*tempos, resolucion=480):
+    metaeventos = tuple(
+        (tick, META_TEMPO, microsegundos.to_bytes(3, "big")) for tick, microsegundos in tempos
+    )
+    return CabeceraMidi(resolucion, metaeventos, 0, b"")
+
+
+def eventos_pista(datos):
+    """Decodifica la pista de notas: ``(tick, altura, velocidad)`` y los bytes de estado."""
+    assert datos[:4] == b"MThd"
+    _, pistas, _ = struct.unpack(">HHH", datos[8:14])
+    assert pistas == 2
+    i = 14
+    for _ in range(2):
+        largo, = struct.unpack(">I", datos[i + 4:i + 8])
+        pista, i = datos[i + 8:i + 8 + largo], i + 8 + largo
+    eventos, estados = [], []
+    j = tick = 0
+    while j < len(pista):
+        delta, j = _leer_vlq(pista, j)
+        tick += delta
+        if pista[j] == 0xFF:
+            largo, j = _leer_vlq(pista, j + 2)
+            j += largo
+            continue
+        if pista[j] & 0x80:
+            estados.append(pista[j])
+            j += 1
+            if estados[-1] & 0xF0 == 0xC0:
+                j += 1
+                continue
+        eventos.append((tick, pista[j], pista[j + 1]))
+        j += 2
+    return eventos, estados
+
+
+def test_vlq():
+    for valor, codificado in [
+        (0, b"\x00"), (0x7F, b"\x7f"), (0x80, b"\x81\x00"), (0x3FFF, b"\xff\x7f"),
+        (0x4000, b"\x81\x80\x00"), (0x0FFFFFFF, b"\xff\xff\xff\x7f"),
+    ]:
+        destino = bytearray(4)
+        k = _escribir_vlq(destino, 0, valor)
+        assert bytes(destino[:k]) == codificado
+        assert _leer_vlq(codificado, 0) == (valor, len(codificado))
+
+
+def test_segundos_a_ticks_sigue_el_mapa_de_tempo():
+    a_ticks = segundos_a_ticks(cabecera((0, 500000), (960, 250000)))
+    assert a_ticks(0.5) == 480
+    assert a_ticks(1.0) == 960
+    assert a_ticks(1.25) == 960 + 480
+    assert a_ticks(-1.0) == 0
+    # Sin tempo en el tick 0 rige el del estándar, 120 negras por minuto.
+    assert segundos_a_ticks(cabecera((960, 1000000)))(1.0 + 1.0) == 960 + 480
+
+
+def test_eventos_con_running_status_y_orden_en_el_mismo_tick():
+    notas = NotasColumnares.desde_tuplas([
+        (0.5, 1.0, 62, 80),
+        (0.0, 0.5, 60, 100),
+        (0.5, 0.5, 64, 90),
+        (0.0, 0.5, 62, 70),
+        (100.0, 100.5, 60, 100),
+    ])
+    eventos, estados = eventos_pista(codificar_midi(cabecera((0, 500000)), notas))
+    assert estados == [0xC0, 0x90]
+    assert eventos == [
+        (0, 60, 100), (0, 62, 70),
+        (480, 60, 0), (480, 62, 0), (480, 62, 80),
+        (480, 64, 0), (480, 64, 90),
+        (960, 62, 0),
+        (96000, 60, 100), (96480, 60, 0),
+    ]
+
+
+def test_notas_fuera_de_rango():
+    with pytest.raises(ValueError):
+        codificar_midi(cabecera(), NotasColumnares.desde_tuplas([(0.0, 1.0, 128, 90)]))
+
+
+def test_cabecera_de_la_referencia_y_pista_de_tempo():
+    original = leer_cabecera(REFERENCIA)
+    assert original.resolucion == 480
+    assert original.nombre == b"COMPING"
+    assert {tipo for _, tipo, _ in original.metaeventos} >= {META_TEMPO, 0x58}
+    escrito = codificar_midi(original, NotasColumnares.desde_tuplas([(0.0, 1.0, 60, 90)]))
+    assert leer_cabecera(escrito).metaeventos == original.metaeventos
+    assert leer_cabecera(escrito).nombre == b"COMPING"
+    with pytest.raises(ValueError):
+        leer_cabecera(b"RIFF" + bytes(20))
+
+
+def leer_con_pretty_midi(pretty_midi, ruta):
+    midi = pretty_midi.PrettyMIDI(str(ruta))
+    notas = [n for pista in midi.instruments for n in pista.notes]
+    return midi, sorted((n.start, n.end, n.pitch, n.velocity) for n in notas)
+
+
+def comparar_con_pretty_midi(tmp_path, referencia, notas):
+    """Escribe ``notas`` con ``pretty_midi`` y directamente, y compara lo leído."""
+    pretty_midi = pytest.importorskip("pretty_midi")
+    midi = pretty_midi.PrettyMIDI(referencia)
+    midi.instruments[0].notes = notas.a_notas()
+    midi.write(str(tmp_path / "pretty.mid"))
+    ArchivoMidi(leer_cabecera(referencia), notas).write(tmp_path / "directo.mid")
+
+    esperado, notas_esperadas = leer_con_pretty_midi(pretty_midi, tmp_path / "pretty.mid")
+    obtenido, notas_obtenidas = leer_con_pretty_midi(pretty_midi, tmp_path / "directo.mid")
+    assert obtenido.resolution == esperado.resolution
+    assert [list(x) for x in obtenido.get_tempo_changes()] == [
+        list(x) for x in esperado.get_tempo_changes()
+    ]
+    assert [(c.numerator, c.denominator, c.time) for c in obtenido.time_signature_changes] == [
+        (c.numerator, c.denominator, c.time) for c in esperado.time_signature_changes
+    ]
+    assert [p.program for p in obtenido.instruments] == [p.program for p in esperado.instruments]
+    assert notas_obtenidas == notas_esperadas
+    return notas_obtenidas
+
+
+def test_nota_de_duracion_nula_no_apaga_otra_de_la_misma_altura(tmp_path):
+    notas = NotasColumnares.desde_tuplas([(2.0, 2.0, 60, 80), (2.0, 2.5, 60, 80)])
+    leidas = comparar_con_pretty_midi(tmp_path, REFERENCIA, notas)
+    assert (2.0, 2.5, 60, 80) in leidas
+
+
+def test_coincide_con_pretty_midi_con_una_referencia_humanizada(tmp_path, referencia_humanizada):
+    cifrados = ["Dm7 G7 | C∆ | A7(b9) | Dm7", "F#m7(b5) B7 | Em7 Eb7 | Dm7 Db7 | C∆"]
+    for cifrado in (" | ".join([c] * 4) for c in cifrados):
+        for opciones in ({}, {"spread": True}, {"rotacion": 2, "octavas": {1: 1}}):
+            notas = pm.renderizar_notas(referencia_humanizada, cifrado, **opciones)
+            comparar_con_pretty_midi(tmp_path, referencia_humanizada, notas)
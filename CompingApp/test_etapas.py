@@ -0,0 +1,184 @@
+import random
+
+import pytest
+
+from notas_columnares import NotasColumnares
+import procesa_midi as pm
+
+
+def ritmo(compases):
+    notas = []
+    for i in range(compases * 8):
+        for altura in (60, 64, 67, 71):
+            notas.append((i * 0.25, i * 0.25 + 0.2, altura, 90))
+    return NotasColumnares.desde_tuplas(notas)
+
+
+def test_voicear_notas_asigna_alturas_del_cifrado():
+    finales, indices, inicio = pm.voicear_notas(ritmo(2), "C∆ | G7")
+    assert inicio == 0.0
+    assert indices == [0] * 8 + [1] * 8
+    primeras = sorted(p for s, _, p, _ in finales.tuplas() if s == 0.0)
+    assert sorted(p % 12 for p in primeras) == [0, 4, 7, 11]
+    ultimas = sorted(p % 12 for s, _, p, _ in finales.tuplas() if s == 3.75)
+    assert ultimas == [2, 5, 7, 11]
+
+
+def test_etapa_reutiliza_resultados():
+    pm.limpiar_cache_etapas()
+    llamadas = []
+
+    def calcular():
+        llamadas.append(1)
+        return "resultado"
+
+    assert pm._etapa("prueba", (1, 2), calcular) == "resultado"
+    assert pm._etapa("prueba", (1, 2), calcular) == "resultado"
+    assert len(llamadas) == 1
+    assert pm.estadisticas_cache_etapas()["prueba"] == {"aciertos": 1, "fallos": 1}
+
+
+def test_cambiar_rotacion_solo_recalcula_la_ultima_etapa(referencia_temporal):
+    pytest.importorskip("pretty_midi")
+    pm.limpiar_cache_etapas()
+    cifrado = "Dm7 G7 | C∆ | A7 | Dm7"
+    base = pm.procesa_midi(referencia_temporal, cifrado, save=False)
+    rotado = pm.procesa_midi(referencia_temporal, cifrado, rotacion=1, spread=True, save=False)
+    assert pm.estadisticas_cache_etapas()["voicing"] == {"aciertos": 1, "fallos": 1}
+    assert len(rotado.instruments[0].notes) > len(base.instruments[0].notes)
+
+
+def ritmo_ligado():
+    # Notas largas que cruzan compases, silencios y notas que empiezan a la vez.
+    notas = []
+    for i in range(0, 48, 3):
+        notas.append((i * 0.25, i * 0.25 + 0.9, 48 + i % 24, 80))
+        notas.append((i * 0.25, i * 0.25 + 0.1, 60, 80))
+    notas.append((1.9, 5.0, 55, 100))
+    return notas
+
+
+def test_voicear_por_compases_coincide_con_voicear_notas():
+    cifrado = "Dm7 G7 | C∆ | F#m7(b5) B7 | Em7 | A7"
+    lote, _, _ = pm.voicear_notas(NotasColumnares.desde_tuplas(ritmo_ligado()), cifrado)
+    bloques = list(
+        pm.voicear_por_compases(NotasColumnares.desde_tuplas(ritmo_ligado()), cifrado)
+    )
+    assert len(bloques) > 1
+    concatenadas = [t for b in bloques for t in b.tuplas()]
+    assert concatenadas == list(lote.tuplas())
+    # Ningún inicio se reparte entre dos bloques.
+    for anterior, siguiente in zip(bloques, bloques[1:]):
+        assert max(anterior.start) < min(siguiente.start)
+
+
+def test_una_nota_que_pasa_por_redondeo_del_inicio_de_la_corchea_siguiente():
+    # Con este inicio, ``inicio + 32 * 0.25`` queda una ulp antes del final de
+    # la corchea 31: la nota que la llena sigue sonando en la corchea 32.
+    inicio = 0.2435
+    t0 = inicio + 31 * 0.25
+    assert t0 + 0.25 > inicio + 32 * 0.25
+    notas = [(inicio, inicio + 0.1, 60, 90), (t0, t0 + 0.25, 64, 90)]
+    cifrado = "C7 | Dm7 | G7 | C∆ | F7 | Bb∆ | Em7 A7 | Dm7"
+    finales, _, _ = pm.voicear_notas(NotasColumnares.desde_tuplas(notas), cifrado)
+    ultimas = [t for t in finales.tuplas() if t[0] > t0 - 0.1]
+    assert len(ultimas) == 4
+    assert {s for s, _, _, _ in ultimas} == {inicio + 32 * 0.25}
+    bloques = pm.voicear_por_compases(NotasColumnares.desde_tuplas(notas), cifrado)
+    assert [t for b in bloques for t in b.tuplas()] == list(finales.tuplas())
+
+
+def test_renderizar_por_compases_coincide_con_renderizar_notas(monkeypatch, tmp_path):
+    import referencia
+
+    monkeypatch.setattr(
+        referencia,
+        "_parsear_referencia",
+        lambda ruta: (NotasColumnares.desde_tuplas(ritmo_ligado()), None),
+    )
+    referencia.limpiar_cache_referencias()
+    pm.limpiar_cache_etapas()
+    ruta = tmp_path / "ref.mid"
+    ruta.write_bytes(b"MThd")
+    opciones = dict(rotacion=1, rotaciones={2: -1}, octavas={1: 1}, spread=True)
+    cifrado = "Dm7 G7 | C∆ | A7 | Dm7"
+    lote = pm.renderizar_notas(str(ruta), cifrado, **opciones)
+    pm.limpiar_cache_etapas()
+    bloques = pm.renderizar_por_compases(str(ruta), cifrado, **opciones)
+    assert sorted(t for b in bloques for t in b.tuplas()) == sorted(lote.tuplas())
+
+
+def ritmo_humanizado(semilla):
+    # Acordes fuera de la rejilla, con notas muy cortas y otras que se
+    # sostienen varios compases.
+    azar = random.Random(semilla)
+    notas = []
+    t = 0.0
+    for _ in range(60):
+        t += azar.choice((0.1, 0.2, 0.3))
+        for altura in azar.sample(range(50, 80), azar.randint(1, 4)):
+            inicio = max(0.0, t + azar.uniform(-0.05, 0.05))
+            largo = azar.uniform(0.01, 0.3) if azar.random() < 0.6 else azar.uniform(0.3, 2)
+            notas.append((inicio, inicio + largo, altura, azar.randint(2, 100)))
+    return notas
+
+
+# Semillas cuyo render por compases partía una corchea entre dos bloques
+# cuando el corte dependía del orden de las notas en el bloque.
+@pytest.mark.parametrize("semilla", [56, 197])
+def test_renderizar_por_compases_con_una_referencia_humanizada(monkeypatch, tmp_path, semilla):
+    import referencia
+
+    monkeypatch.setattr(
+        referencia,
+        "_parsear_referencia",
+        lambda ruta: (NotasColumnares.desde_tuplas(ritmo_humanizado(semilla)), None),
+    )
+    referencia.limpiar_cache_referencias()
+    pm.limpiar_cache_etapas()
+    ruta = tmp_path / "ref.mid"
+    ruta.write_bytes(b"MThd")
+    cifrado = " | ".join(["Dm7 G7", "C∆", "A7", "F"] * 3)
+    for opciones in (dict(rotacion=1, spread=True), dict(rotacion=-2, rotaciones={1: 1})):
+        lote = pm.renderizar_notas(str(ruta), cifrado, **opciones)
+        pm.limpiar_cache_etapas()
+        bloques = list(pm.renderizar_por_compases(str(ruta), cifrado, **opciones))
+        assert sorted(t for b in bloques for t in b.tuplas()) == sorted(lote.tuplas())
+        # Cada corchea sale entera en un mismo bloque.
+        for anterior, siguiente in zip(bloques, bloques[1:]):
+            assert max(anterior.start) < min(siguiente.start)
+
+
+def test_la_previsualizacion_reutiliza_el_voicing_en_cache(monkeypatch, tmp_path):
+    import referencia
+
+    monkeypatch.setattr(
+        referencia,
+        "_parsear_referencia",
+        lambda ruta: (NotasColumnares.desde_tuplas(ritmo_ligado()), None),
+    )
+    referencia.limpiar_cache_referencias()
+    pm.limpiar_cache_etapas()
+    ruta = str(tmp_path / "ref.mid")
+    (tmp_path / "ref.mid").write_bytes(b"MThd")
+    cifrado = "Dm7 G7 | C∆ | A7 | Dm7"
+
+    def bloques(**opciones):
+        return [list(b.tuplas()) for b in pm.renderizar_por_compases(ruta, cifrado, **opciones)]
+
+    # Un recorrido interrumpido no deja nada en la caché.
+    next(pm.renderizar_por_compases(ruta, cifrado))
+    voiceados = bloques(rotacion=1)
+    assert pm.estadisticas_cache_etapas()["voicing"] == {"aciertos": 0, "fallos": 2}
+
+    voicear = pm.voicear_plantilla
+    llamadas = []
+    monkeypatch.setattr(
+        pm, "voicear_plantilla", lambda *a: llamadas.append(a) or voicear(*a)
+    )
+    assert bloques(rotacion=1) == voiceados
+    rotados = bloques(rotacion=-1, octavas={1: 1}, spread=True)
+    lote = pm.renderizar_notas(ruta, cifrado, rotacion=-1, octavas={1: 1}, spread=True)
+    assert llamadas == []
+    assert pm.estadisticas_cache_etapas()["voicing"] == {"aciertos": 3, "fallos": 2}
+    assert sorted(t for b in rotados for t in b) == sorted(lote.tuplas())
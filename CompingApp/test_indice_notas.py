@@ -0,0 +1,30 @@
+import random
+
+from indice_notas import IndiceNotas
+
+
+def activas_lineal(inicios, finales, t0, t1):
+    return [
+        i for i, (s, e) in enumerate(zip(inicios, finales))
+        if not (e <= t0 or s >= t1)
+    ]
+
+
+def test_coincide_con_filtrado_lineal():
+    rng = random.Random(0)
+    inicios = [rng.uniform(0, 20) for _ in range(300)]
+    finales = [s + rng.choice([0.0, 0.1, 0.25, 1.0, 4.0]) for s in inicios]
+    indice = IndiceNotas(inicios, finales)
+    for i in range(100):
+        t0 = i * 0.25
+        t1 = t0 + 0.25
+        assert indice.activas(t0, t1) == activas_lineal(inicios, finales, t0, t1)
+
+
+def test_consulta_hacia_atras_reinicia_barrido():
+    inicios = [0.0, 1.0, 2.0]
+    finales = [3.0, 1.5, 2.5]
+    indice = IndiceNotas(inicios, finales)
+    assert indice.activas(2.0, 2.25) == [0, 2]
+    assert indice.activas(1.0, 1.25) == [0, 1]
+    assert indice.activas(0.0, 0.25) == [0]
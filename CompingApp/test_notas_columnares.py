@@ -0,0 +1,51 @@
+from notas_columnares import NotasColumnares
+from procesa_midi import Spread, aplicar_rotaciones, evitar_solapamientos
+
+
+class Note:
+    def __init__(self, velocity, pitch, start, end):
+        self.velocity = velocity
+        self.pitch = pitch
+        self.start = start
+        self.end = end
+
+
+def tuplas(notas):
+    return [(n.start, n.end, n.pitch, n.velocity) for n in notas]
+
+
+def ejemplo():
+    return [
+        Note(90, 60, 0.0, 0.3), Note(80, 64, 0.0, 0.25), Note(70, 67, 0.0, 0.25),
+        Note(60, 60, 0.25, 0.5), Note(100, 62, 0.25, 0.5), Note(100, 65, 0.25, 0.4),
+    ]
+
+
+def test_conversion_ida_y_vuelta():
+    notas = ejemplo()
+    columnar = NotasColumnares.desde_notas(notas)
+    assert len(columnar) == 6
+    assert tuplas(columnar.a_notas(Note)) == tuplas(notas)
+    assert list(columnar.tuplas()) == tuplas(notas)
+
+
+def test_vista_escribe_en_columnas():
+    columnar = NotasColumnares.desde_notas(ejemplo())
+    nota = columnar[1]
+    nota.pitch = 72
+    nota.end = 0.2
+    assert columnar.pitch[1] == 72
+    assert columnar.end[1] == 0.2
+
+
+def test_mismo_resultado_que_con_objetos():
+    objetos = ejemplo()
+    columnar = NotasColumnares.desde_notas(objetos)
+    for funcion, args in (
+        (evitar_solapamientos, ()),
+        (aplicar_rotaciones, (1, {1: -2}, {0: 1})),
+        (Spread, ()),
+    ):
+        funcion(objetos, *args)
+        funcion(columnar, *args)
+        assert list(columnar.tuplas()) == tuplas(objetos)
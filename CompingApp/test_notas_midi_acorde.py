@@ -1,6 +1,10 @@
 import signal
 import pytest
-from procesa_midi import notas_midi_acorde
+from procesa_midi import (
+    estadisticas_cache_voicings,
+    limpiar_cache_voicings,
+    notas_midi_acorde,
+)
 
 
 def test_notas_midi_acorde_no_infinite_loop():
@@ -17,3 +21,14 @@ def test_notas_midi_acorde_no_infinite_loop():
     finally:
         signal.alarm(0)
     assert len(notas) == 4
+
+
+def test_notas_midi_acorde_cache():
+    limpiar_cache_voicings()
+    primero = notas_midi_acorde('C', [0, 4, 7, 10], prev_bajo=60)
+    primero.append(99)
+    segundo = notas_midi_acorde('C', (0, 4, 7, 10), prev_bajo=60)
+    assert segundo == [60, 64, 67, 70]
+    info = estadisticas_cache_voicings()
+    assert info.hits == 1
+    assert info.misses == 1
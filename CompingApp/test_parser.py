@@ -1,5 +1,11 @@
 from cifrado_utils import analizar_cifrado
-from procesa_midi import notas_midi_acorde, enlazar_notas
+from procesa_midi import (
+    SegmentoAcorde,
+    enlazar_notas,
+    expandir_cifrado_a_corcheas,
+    notas_midi_acorde,
+    segmentar_cifrado,
+)
 
 
 def test_m7b5_aliases():
@@ -71,3 +77,44 @@ def test_rango_de_voces():
     assert abs(segundo[0] - 65) <= 5
     assert segundo[0] >= 50
     assert max(segundo) <= 72
+
+
+def test_analizar_acorde_usa_cache_global():
+    from cifrado_utils import analizar_acorde, estadisticas_cache_cifrados
+
+    antes = estadisticas_cache_cifrados().hits
+    assert analizar_acorde("F#m7(11)") == ("F#", (2, 3, 5, 10))
+    assert analizar_acorde("F#m7(11)") == ("F#", (2, 3, 5, 10))
+    assert estadisticas_cache_cifrados().hits >= antes + 1
+
+
+def test_alias_prioridad_de_la_lista():
+    from cifrado_utils import alias_a_clave_acordes
+
+    # "m" aparece antes que "maj" en la lista de alias, por lo que gana.
+    assert alias_a_clave_acordes("maj7") == ("m", "aj7")
+    assert alias_a_clave_acordes("ø7") == ("m7(b5)", "")
+    assert alias_a_clave_acordes("sus4") == ("sus", "")
+    assert alias_a_clave_acordes("7") == (None, "7")
+
+
+def test_segmentar_cifrado_coincide_con_la_expansion():
+    casos = [
+        ("Dm7 G7 | C∆", 16, 8),
+        ("C D E | F", 16, 8),
+        ("C D E F G A B C D | E", 16, 8),
+        ("C | D", 24, 8),
+        ("C | D | E", 12, 8),
+    ]
+    for cifrado, total, cpc in casos:
+        segmentos = segmentar_cifrado(cifrado, total, cpc)
+        acordes, indices = expandir_cifrado_a_corcheas(cifrado, total, cpc, return_indices=True)
+        assert sum(s.largo for s in segmentos) == total
+        for s in segmentos:
+            assert acordes[s.inicio:s.inicio + s.largo] == [s.acorde] * s.largo
+            assert indices[s.inicio:s.inicio + s.largo] == [s.indice] * s.largo
+    assert segmentar_cifrado("Dm7 G7 | C∆", 24, 8) == [
+        SegmentoAcorde("Dm7", 0, 0, 4),
+        SegmentoAcorde("G7", 1, 4, 4),
+        SegmentoAcorde("C∆", 2, 8, 16),
+    ]
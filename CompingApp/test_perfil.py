@@ -0,0 +1,58 @@
+import perfil
+from notas_columnares import NotasColumnares
+import procesa_midi as pm
+
+
+def ritmo(compases):
+    notas = []
+    for i in range(compases * 8):
+        for altura in (60, 64, 67, 71):
+            notas.append((i * 0.25, i * 0.25 + 0.2, altura, 90))
+    return NotasColumnares.desde_tuplas(notas)
+
+
+def test_sin_perfil_no_se_mide_nada():
+    assert perfil.perfil_actual() is None
+    assert perfil.etapa("voicing") is perfil.etapa("spread")
+    perfil.contar("voicing", 3)
+
+
+def test_perfilar_registra_etapas_y_caches():
+    pm.limpiar_cache_voicings()
+    with perfil.perfilar(publicar=False) as p:
+        pm.voicear_notas(ritmo(2), "C∆ | G7")
+    datos = p.como_dict()
+    assert perfil.perfil_actual() is None
+    assert datos["etapas"]["voicing"]["llamadas"] == 2
+    assert datos["etapas"]["voicing"]["elementos"] == 16
+    assert datos["etapas"]["evitar_solapamientos"]["elementos"] == 64
+    voicings = datos["caches"]["tabla_voicings"]
+    # Una búsqueda al entrar en cada acorde y otra hasta que el bajo se estabiliza.
+    assert 0 < voicings["aciertos"] + voicings["fallos"] <= 4
+    assert voicings["tasa_aciertos"] == voicings["aciertos"] / (
+        voicings["aciertos"] + voicings["fallos"]
+    )
+
+
+def test_sumideros_reciben_el_perfil():
+    recibidos = []
+    perfil.registrar_sumidero(recibidos.append)
+    try:
+        with perfil.perfilar():
+            with perfil.etapa("prueba", 5):
+                pass
+        with perfil.perfilar(publicar=False):
+            pass
+    finally:
+        perfil.quitar_sumidero(recibidos.append)
+    assert len(recibidos) == 1
+    assert recibidos[0]["etapas"]["prueba"]["elementos"] == 5
+
+
+def test_perfiles_anidados():
+    with perfil.perfilar(publicar=False) as exterior:
+        with perfil.perfilar(publicar=False) as interior:
+            perfil.contar("a", 1)
+        perfil.contar("b", 1)
+    assert set(interior.etapas) == {"a"}
+    assert set(exterior.etapas) == {"b"}
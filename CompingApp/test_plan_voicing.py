@@ -0,0 +1,230 @@
+import random
+from collections import defaultdict
+from itertools import product
+
+import procesa_midi as pm
+from cifrado_utils import analizar_acorde
+from notas_columnares import NotasColumnares
+from plan_voicing import (
+    analizar_inversiones,
+    cadena_voicing,
+    cadenas_voraces,
+    candidatos_voicing,
+    distancia_voces,
+    estadisticas_cache_planes,
+    extraer_acordes,
+    limpiar_cache_planes,
+    plan_cifrado,
+    planificar_inversiones,
+    planificar_voicings,
+)
+from procesa_midi import notas_naturales
+
+
+def test_extraer_acordes():
+    assert extraer_acordes("Dm7 G7 | C∆ |\n| A7") == ["Dm7", "G7", "C∆", "A7"]
+
+
+def test_primer_acorde_busca_bajo_desde_la3():
+    entradas = analizar_inversiones(["C∆"])
+    assert entradas[0].prev_bajo is None
+    assert entradas[0].notas[0] >= 57
+    assert entradas[0].inversion == 0
+
+
+def test_reutiliza_entradas_sin_cambios():
+    acordes = ["Dm7", "G7", "C∆", "A7", "Dm7", "G7"]
+    previo = analizar_inversiones(acordes)
+    editado = list(acordes)
+    editado[3] = "Ab7"
+    nuevo = analizar_inversiones(editado, previo)
+    assert all(n is p for n, p in zip(nuevo[:3], previo[:3]))
+    assert nuevo[3] is not previo[3]
+    assert nuevo == analizar_inversiones(editado)
+
+
+def test_simbolo_no_analizable_no_interrumpe():
+    entradas = analizar_inversiones(["C7", "x", "F7"])
+    assert entradas[1].notas is None
+    assert entradas[2].prev_bajo == entradas[0].notas[0]
+
+
+def test_extraer_acordes_ignora_marcas_de_ensayo():
+    assert extraer_acordes("[A] Dm7 G7 || [B] C∆") == ["Dm7", "G7", "C∆"]
+
+
+def test_candidatos_respetan_el_registro():
+    for acorde in ["C∆", "F#m7(b5)", "Bb7(9)", "Ab∆(#11)", "E7(b9,b13)"]:
+        candidatos = candidatos_voicing(*analizar_acorde(acorde))
+        assert candidatos
+        assert len(set(candidatos)) == len(candidatos)
+        for cand in candidatos:
+            assert list(cand) == sorted(cand)
+            assert cand[0] >= 50 and cand[-1] <= 72
+            assert cand[-1] - cand[0] <= 12
+
+
+def _coste(plan):
+    voicings = [v for v in plan if v is not None]
+    return sum(distancia_voces(a, b) for a, b in zip(voicings, voicings[1:]))
+
+
+def _permitido(plan):
+    voicings = [v for v in plan if v is not None]
+    return all(abs(a[0] - b[0]) <= 5 for a, b in zip(voicings, voicings[1:]))
+
+
+def test_plan_es_el_de_menor_movimiento():
+    rnd = random.Random(1)
+    simbolos = ["Dm7", "G7", "C∆", "A7(b9)", "F#m7(b5)", "B7", "Em7", "Bb7(9)", "Eb∆", "Abm6"]
+    for _ in range(30):
+        analizados = [analizar_acorde(rnd.choice(simbolos)) for _ in range(rnd.randint(1, 5))]
+        plan = planificar_voicings(analizados)
+        caminos = [
+            c for c in product(*(candidatos_voicing(*a) for a in analizados)) if _permitido(c)
+        ]
+        assert _permitido(plan)
+        assert _coste(plan) == min(_coste(c) for c in caminos)
+
+
+def test_plan_no_mueve_mas_que_el_enlace_voraz():
+    acordes = ["Dm7", "G7", "C∆", "A7", "Dm7", "G7", "Em7", "A7(b9)", "Dm7", "G7(13)", "C∆"]
+    plan = [e.notas for e in planificar_inversiones(acordes)]
+    voraz = [e.notas for e in analizar_inversiones(acordes)]
+    assert _coste(plan) <= _coste(voraz)
+
+
+def test_planificar_inversiones_salta_simbolos_no_analizables():
+    entradas = planificar_inversiones(["C7", "x", "F7"])
+    assert entradas[1].notas is None
+    assert entradas[2].prev_bajo == entradas[0].notas[0]
+    for e in (entradas[0], entradas[2]):
+        fundamental, grados = analizar_acorde(e.acorde)
+        assert (e.notas[0] - notas_naturales[fundamental]) % 12 == grados[e.inversion] % 12
+
+
+def test_render_usa_los_voicings_del_plan():
+    notas = NotasColumnares.desde_tuplas(
+        [(i * 0.25, i * 0.25 + 0.2, altura, 90) for i in range(24) for altura in (60, 64, 67, 71)]
+    )
+    cifrado = "Dm7 | G7 | C∆"
+    plan = planificar_voicings([analizar_acorde(a) for a in extraer_acordes(cifrado)])
+    resultado = pm.voicear_plantilla(pm.compilar_plantilla(notas), cifrado, plan=plan)
+    alturas = defaultdict(set)
+    for bloque in resultado:
+        for start, _, pitch, _ in bloque.tuplas():
+            alturas[round(start / 0.25)].add(pitch)
+    for i in range(24):
+        assert alturas[i] == set(plan[i // 8])
+
+
+def test_plan_cifrado_se_comparte_por_texto():
+    limpiar_cache_planes()
+    plan = plan_cifrado("Dm7 G7 | C∆ |", optimo=True)
+    assert plan_cifrado("Dm7  G7 |\nC∆", optimo=True) is plan
+    assert plan_cifrado("Dm7 G7 | C∆") is not plan
+    assert estadisticas_cache_planes() == {"aciertos": 1, "fallos": 2, "planes": 2}
+
+    assert plan.acordes == ("Dm7", "G7", "C∆")
+    assert plan.voicings == tuple(planificar_voicings([analizar_acorde(a) for a in plan.acordes]))
+    for e in plan.entradas:
+        assert (e.fundamental, e.grados) == analizar_acorde(e.acorde)
+    assert plan.inversiones == [e.inversion for e in planificar_inversiones(plan.acordes)]
+
+
+def test_plan_voraz_reutiliza_el_anterior_y_sus_cadenas():
+    limpiar_cache_planes()
+    previo = plan_cifrado("Dm7 G7 | C∆ | A7")
+    plan = plan_cifrado("Dm7 G7 | C∆ | Ab7", previo=previo)
+    assert all(n is p for n, p in zip(plan.entradas[:3], previo.entradas[:3]))
+    assert list(plan.entradas) == analizar_inversiones(plan.acordes)
+    assert plan.voicings is plan.cadenas
+    assert all(n is p for n, p in zip(plan.cadenas[:3], previo.cadenas[:3]))
+    assert plan.cadenas == cadenas_voraces(plan.entradas)
+    assert plan.cadenas[0].bajo_entrada is None
+    for anterior, cadena in zip(plan.cadenas, plan.cadenas[1:]):
+        assert cadena.bajo_entrada == anterior.voicings[-1][0]
+
+
+def test_cadena_voicing_repite_las_busquedas_del_render():
+    tabla = pm.tabla_voicings()
+    fundamental, grados = analizar_acorde("A7(b9)")
+    clase = notas_naturales[fundamental]
+    for bajo in (None, 50, 55, 61, 66):
+        cadena = cadena_voicing(fundamental, grados, bajo)
+        assert cadena.bajo_entrada == bajo
+        bajos = [bajo] + [v[0] for v in cadena.voicings[:-1]]
+        for anterior, voicing in zip(bajos, cadena.voicings):
+            if anterior is None:
+                assert voicing == pm._primer_voicing(tabla, clase, grados)
+            else:
+                assert voicing == tabla.voicing(clase, grados, anterior)
+        if cadena.estable:
+            assert tabla.voicing(clase, grados, cadena.voicings[-1][0]) == cadena.voicings[-1]
+
+
+def test_render_acepta_el_plan_compartido():
+    notas = NotasColumnares.desde_tuplas(
+        [(i * 0.25, i * 0.25 + 0.2, altura, 90) for i in range(24) for altura in (60, 64, 67, 71)]
+    )
+    plantilla = pm.compilar_plantilla(notas)
+    cifrado = "Dm7 | G7 | C∆"
+
+    def render(plan):
+        return [list(b.tuplas()) for b in pm.voicear_plantilla(plantilla, cifrado, plan=plan)]
+
+    optimo = plan_cifrado(cifrado, optimo=True)
+    assert render(optimo) == render(list(optimo.voicings))
+    assert render(plan_cifrado(cifrado)) == render(None)
+
+
+def test_render_voraz_usa_las_cadenas_del_plan():
+    rnd = random.Random(3)
+    notas = NotasColumnares.desde_tuplas(
+        [(0.0, 0.1, 60, 90)] + [
+            (s, s + rnd.choice((0.05, 0.3, 1.0)), rnd.randint(50, 80), rnd.choice((1, 90)))
+            for s in (rnd.uniform(0, 12) for _ in range(80))
+        ]
+    )
+    plantilla = pm.compilar_plantilla(notas)
+    cifrado = "Dm7 G7 | C∆ | F#m7(b5) B7 || [B] Em7 Eb7 | Dm7 Db7 A7(b9) | C∆"
+    plan = plan_cifrado(cifrado)
+    tabla = pm.tabla_voicings()
+
+    def render(plan, secciones):
+        consultas = tabla.aciertos + tabla.fallos
+        bloques = pm.voicear_plantilla(
+            plantilla, cifrado, secciones=secciones, procesos=1, plan=plan
+        )
+        return [list(b.tuplas()) for b in bloques], tabla.aciertos + tabla.fallos - consultas
+
+    for secciones in (False, True):
+        esperado, consultas = render(None, secciones)
+        obtenido, consultas_plan = render(plan, secciones)
+        assert obtenido == esperado
+        assert consultas_plan < consultas
+
+    # Una cadena que no parte del bajo con que se llega al acorde se ignora.
+    cadenas = list(plan.cadenas)
+    cadenas[2] = cadena_voicing(*analizar_acorde("F#m7(b5)"), bajo_entrada=70)
+    assert render(cadenas, False)[0] == render(None, False)[0]
+
+
+def test_el_plan_voraz_comparte_la_etapa_de_voicing(monkeypatch, tmp_path):
+    import referencia
+
+    notas = [(i * 0.25, i * 0.25 + 0.2, altura, 90) for i in range(24) for altura in (60, 64, 67)]
+    monkeypatch.setattr(
+        referencia,
+        "_parsear_referencia",
+        lambda ruta: (NotasColumnares.desde_tuplas(notas), None),
+    )
+    referencia.limpiar_cache_referencias()
+    pm.limpiar_cache_etapas()
+    ruta = tmp_path / "ref.mid"
+    ruta.write_bytes(b"MThd")
+    cifrado = "Dm7 | G7 | C∆"
+    sin_plan = pm.renderizar_notas(str(ruta), cifrado)
+    con_plan = pm.renderizar_notas(str(ruta), cifrado, plan=plan_cifrado(cifrado))
+    assert list(con_plan.tuplas()) == list(sin_plan.tuplas())
+    assert pm.estadisticas_cache_etapas()["voicing"] == {"aciertos": 1, "fallos": 1}
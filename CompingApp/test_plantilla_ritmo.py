@@ -0,0 +1,111 @@
+import os
+import stat
+
+import cache_disco
+import referencia
+import procesa_midi as pm
+from notas_columnares import NotasColumnares
+from plantilla_ritmo import MAGIA, PlantillaRitmo, VERSION, ruta_plantilla
+
+
+def ritmo():
+    notas = []
+    for i in range(0, 40, 3):
+        notas.append((i * 0.25, i * 0.25 + 0.9, 48 + i % 24, 80))
+        notas.append((i * 0.25, i * 0.25 + 0.1, 60, 1 if i % 2 else 80))
+    notas.append((1.9, 5.0, 55, 100))
+    return NotasColumnares.desde_tuplas(notas)
+
+
+def test_una_plantilla_sirve_para_cualquier_cifrado():
+    plantilla = pm.compilar_plantilla(ritmo())
+    for cifrado in ("C∆", "Dm7 G7 | C∆ | A7", "F7 | Bb7 | F7 | C7 | F7 | Bb7 | F7 | C7"):
+        directo, _, _ = pm.voicear_notas(ritmo(), cifrado)
+        bloques = pm.voicear_plantilla(plantilla, cifrado)
+        assert [t for b in bloques for t in b.tuplas()] == list(directo.tuplas())
+
+
+def test_la_plantilla_no_depende_del_cifrado_ni_modifica_las_notas():
+    notas = ritmo()
+    antes = list(notas.tuplas())
+    plantilla = pm.compilar_plantilla(notas)
+    assert list(notas.tuplas()) == antes
+    assert list(plantilla.notas_base().tuplas()) == antes
+    # Cada ranura con sonido tiene exactamente cuatro notas.
+    for i in range(len(plantilla)):
+        desde, hasta = plantilla.miembros_de(i)
+        assert hasta - desde in (0, 4)
+
+
+def test_guardar_y_cargar(tmp_path):
+    plantilla = pm.compilar_plantilla(ritmo())
+    ruta = tmp_path / "ref.ritmo"
+    plantilla.guardar(ruta, (123, 456))
+    leida = PlantillaRitmo.cargar(ruta, (123, 456))
+    for nombre in PlantillaRitmo.__slots__:
+        assert getattr(leida, nombre) == getattr(plantilla, nombre)
+    assert PlantillaRitmo.cargar(ruta, (124, 456)) is None
+    assert PlantillaRitmo.cargar(tmp_path / "no_existe.ritmo") is None
+
+
+def test_rechaza_otra_version_o_datos_truncados(tmp_path):
+    ruta = tmp_path / "ref.ritmo"
+    pm.compilar_plantilla(ritmo()).guardar(ruta)
+    datos = ruta.read_bytes()
+    ruta.write_bytes(datos[:4] + (VERSION + 1).to_bytes(2, "little") + datos[6:])
+    assert PlantillaRitmo.cargar(ruta) is None
+    ruta.write_bytes(datos[:-3])
+    assert PlantillaRitmo.cargar(ruta) is None
+
+
+def test_render_guarda_la_plantilla_junto_a_la_referencia(monkeypatch, tmp_path):
+    monkeypatch.setattr(referencia, "_parsear_referencia", lambda ruta: (ritmo(), None))
+    referencia.limpiar_cache_referencias()
+    pm.limpiar_cache_etapas()
+    ruta = tmp_path / "ref.mid"
+    ruta.write_bytes(b"MThd")
+    primera = list(pm.renderizar_notas(str(ruta), "Dm7 G7 | C∆").tuplas())
+    guardada = ruta_plantilla(str(ruta), 0.25)
+    assert PlantillaRitmo.cargar(guardada) is not None
+
+    llamadas = []
+    compilar = pm.compilar_plantilla
+    monkeypatch.setattr(pm, "compilar_plantilla", lambda *a: llamadas.append(a) or compilar(*a))
+    pm.limpiar_cache_etapas()
+    assert list(pm.renderizar_notas(str(ruta), "Dm7 G7 | C∆").tuplas()) == primera
+    assert llamadas == []
+
+
+def test_las_plantillas_de_cada_orden_van_a_la_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(referencia, "_parsear_referencia", lambda ruta: (ritmo(), None))
+    referencia.limpiar_cache_referencias()
+    pm.limpiar_cache_etapas()
+    carpeta = tmp_path / "referencias"
+    carpeta.mkdir()
+    ruta = carpeta / "ref.mid"
+    ruta.write_bytes(b"MThd")
+    os.chmod(ruta, 0o644)
+    ordenes = [list(range(8))[::-1], [1, 0, 3, 2, 5, 4, 7, 6]]
+    primeras = [
+        list(pm.renderizar_notas(str(ruta), "Dm7 G7 | C∆", window_order=orden).tuplas())
+        for orden in ordenes
+    ]
+    pm.renderizar_notas(str(ruta), "Dm7 G7 | C∆")
+    # Junto a la referencia solo queda la plantilla sin reordenar.
+    assert sorted(os.listdir(carpeta)) == sorted(["ref.mid", os.path.basename(
+        ruta_plantilla(str(ruta), 0.25)
+    )])
+    assert stat.S_IMODE(os.stat(ruta_plantilla(str(ruta), 0.25)).st_mode) == 0o644
+    entradas = [
+        os.path.basename(r) for _, _, r in cache_disco.cache_por_defecto().entradas()
+    ]
+    assert sum(e.startswith(MAGIA.decode()) for e in entradas) == len(ordenes)
+
+    llamadas = []
+    compilar = pm.compilar_plantilla
+    monkeypatch.setattr(pm, "compilar_plantilla", lambda *a: llamadas.append(a) or compilar(*a))
+    pm.limpiar_cache_etapas()
+    for orden, primera in zip(ordenes, primeras):
+        notas = pm.renderizar_notas(str(ruta), "Dm7 G7 | C∆", window_order=orden)
+        assert list(notas.tuplas()) == primera
+    assert llamadas == []
@@ -0,0 +1,34 @@
+import json
+
+from procesa_lote import leer_manifiesto, nombre_salida, resumen_latencias
+
+
+def test_leer_manifiesto(tmp_path):
+    manifiesto = tmp_path / "lote.json"
+    manifiesto.write_text(json.dumps({
+        "referencia": "ref.mid",
+        "opciones": {"spread": True, "rotacion": 1},
+        "cifrados": [
+            {"nombre": "Blues en F", "cifrado": "F7 | Bb7 | F7"},
+            {"cifrado": "Dm7 G7 | C∆", "rotacion": -1, "rotaciones": {"1": 2}},
+            "C7 | F7",
+        ],
+    }), encoding="utf-8")
+    referencia, trabajos = leer_manifiesto(str(manifiesto))
+    assert referencia == str(tmp_path / "ref.mid")
+    assert [t[0] for t in trabajos] == ["0001-Blues_en_F.mid", "0002.mid", "0003.mid"]
+    assert trabajos[0][2] == {"spread": True, "rotacion": 1}
+    assert trabajos[1][2] == {"spread": True, "rotacion": -1, "rotaciones": {1: 2}}
+
+
+def test_nombre_salida_determinista():
+    assert nombre_salida(0) == "0001.mid"
+    assert nombre_salida(41, "A/B tema") == "0042-A_B_tema.mid"
+
+
+def test_resumen_latencias():
+    resumen = resumen_latencias([0.1, 0.3, 0.2, 0.4], 2.0)
+    assert resumen["cifrados"] == 4
+    assert resumen["cifrados_por_segundo"] == 2.0
+    assert resumen["p50"] in (0.2, 0.3)
+    assert resumen["maxima"] == 0.4
@@ -0,0 +1,84 @@
+import os
+
+import referencia
+from notas_columnares import NotasColumnares
+
+
+class MidiFalso:
+    def __init__(self):
+        self.tempo = 120
+
+
+def preparar(monkeypatch, tmp_path):
+    llamadas = []
+
+    def parsear(ruta):
+        llamadas.append(ruta)
+        notas = NotasColumnares.desde_tuplas([(0.0, 0.5, 60, 100), (0.5, 1.0, 64, 90)])
+        return notas, MidiFalso()
+
+    monkeypatch.setattr(referencia, "_parsear_referencia", parsear)
+    referencia.limpiar_cache_referencias()
+    ruta = tmp_path / "ref.mid"
+    ruta.write_bytes(b"MThd")
+    return ruta, llamadas
+
+
+def test_analiza_una_sola_vez(monkeypatch, tmp_path):
+    ruta, llamadas = preparar(monkeypatch, tmp_path)
+    primera = referencia.cargar_referencia(str(ruta))
+    segunda = referencia.cargar_referencia(str(ruta))
+    assert primera is segunda
+    assert len(llamadas) == 1
+    assert referencia.estadisticas_cache_referencias()["aciertos"] == 1
+
+
+def test_invalida_si_cambia_el_archivo(monkeypatch, tmp_path):
+    ruta, llamadas = preparar(monkeypatch, tmp_path)
+    referencia.cargar_referencia(str(ruta))
+    info = os.stat(ruta)
+    ruta.write_bytes(b"MThd\x00")
+    os.utime(ruta, ns=(info.st_atime_ns, info.st_mtime_ns + 10**9))
+    referencia.cargar_referencia(str(ruta))
+    assert len(llamadas) == 2
+
+
+def test_copias_independientes(monkeypatch, tmp_path):
+    ruta, _ = preparar(monkeypatch, tmp_path)
+    ref = referencia.cargar_referencia(str(ruta))
+    copia = ref.nueva_midi()
+    copia.tempo = 90
+    assert ref.nueva_midi().tempo == 120
+
+
+def test_precarga_en_segundo_plano(monkeypatch, tmp_path):
+    ruta, llamadas = preparar(monkeypatch, tmp_path)
+    referencia.precargar_referencia(str(ruta)).join()
+    referencia.cargar_referencia(str(ruta))
+    assert len(llamadas) == 1
+
+
+def test_notas_compartidas_por_la_cache_en_disco(monkeypatch, tmp_path):
+    ruta, llamadas = preparar(monkeypatch, tmp_path)
+    primera = referencia.cargar_referencia(str(ruta))
+    # Otro proceso: caché en memoria vacía, misma caché en disco.
+    referencia.limpiar_cache_referencias()
+    segunda = referencia.cargar_referencia(str(ruta))
+    assert len(llamadas) == 1
+    assert list(segunda.notas.tuplas()) == list(primera.notas.tuplas())
+    assert isinstance(segunda.notas.start, memoryview)
+    copia = segunda.notas_columnares()
+    copia.agregar(2.0, 2.5, 67, 80)
+    assert len(segunda.notas) == 2
+    # La plantilla ``PrettyMIDI`` se analiza solo cuando hace falta.
+    assert segunda.nueva_midi().tempo == 120
+    assert len(llamadas) == 2
+
+
+def test_misma_referencia_con_otro_mtime_no_se_vuelve_a_analizar(monkeypatch, tmp_path):
+    ruta, llamadas = preparar(monkeypatch, tmp_path)
+    referencia.cargar_referencia(str(ruta))
+    info = os.stat(ruta)
+    os.utime(ruta, ns=(info.st_atime_ns, info.st_mtime_ns + 10**9))
+    referencia.cargar_referencia(str(ruta))
+    assert len(llamadas) == 1
@@ -0,0 +1,75 @@
+import random
+
+from notas_columnares import NotasColumnares
+from procesa_midi import reordenar_ventanas
+
+
+def reordenar_por_ventana(notas, dur_corchea, ventana_corcheas, orden):
+    """Versión original: recorre todas las notas para cada ventana."""
+    inicio = min(n[0] for n in notas)
+    fin = max(n[1] for n in notas)
+    dur_ventana = ventana_corcheas * dur_corchea
+    num_ventanas = int((fin - inicio) // dur_ventana)
+    ventanas = []
+    for i in range(num_ventanas):
+        v_ini = inicio + i * dur_ventana
+        v_fin = v_ini + dur_ventana
+        grupo = []
+        for s, e, p, v in notas:
+            if e <= v_ini or s >= v_fin:
+                continue
+            grupo.append((max(s, v_ini) - v_ini, min(e, v_fin) - v_ini, p, v))
+        first_end = dur_corchea
+        last_start = dur_ventana - dur_corchea
+        if not any(s < first_end and e > 0 for s, e, _, _ in grupo):
+            grupo.append((0, first_end, 0, 1))
+        if not any(s < dur_ventana and e > last_start for s, e, _, _ in grupo):
+            grupo.append((last_start, dur_ventana, 0, 1))
+        ventanas.append(grupo)
+    nuevas = []
+    cursor = inicio
+    for idx in orden:
+        if idx >= len(ventanas):
+            continue
+        for s, e, p, v in ventanas[idx]:
+            nuevas.append((cursor + s, cursor + e, p, v))
+        cursor += dur_ventana
+    return nuevas
+
+
+def notas_aleatorias(rng, n, duracion, inicio=0.0):
+    notas = []
+    for _ in range(n):
+        s = inicio + rng.choice([rng.uniform(0, duracion), rng.randrange(int(duracion * 4)) / 4])
+        e = s + rng.choice([0.1, 0.25, 0.5, 2.0, 3.7])
+        notas.append((s, e, rng.randint(40, 80), rng.randint(2, 127)))
+    return notas
+
+
+def test_igual_que_la_version_por_ventana():
+    rng = random.Random(11)
+    for inicio in (0.0, 0.1, 1.3):
+        notas = notas_aleatorias(rng, 400, 64.0, inicio)
+        orden = list(range(32))
+        rng.shuffle(orden)
+        orden += [40, 3]
+        esperado = reordenar_por_ventana(notas, 0.25, 8, orden)
+        columnar = NotasColumnares.desde_tuplas(notas)
+        obtenido = reordenar_ventanas(columnar, 0.25, 8, orden)
+        assert list(obtenido.tuplas()) == esperado
+
+
+def test_ventanas_vacias_reciben_notas_dummy():
+    notas = NotasColumnares.desde_tuplas([(0.0, 0.25, 60, 100), (3.0, 4.0, 62, 100)])
+    obtenido = reordenar_ventanas(notas, 0.25, 8, [1, 0])
+    assert list(obtenido.tuplas()) == [
+        (1.0, 2.0, 62, 100),
+        (0.0, 0.25, 0, 1),
+        (2.0, 2.25, 60, 100),
+        (3.75, 4.0, 0, 1),
+    ]
+
+
+def test_sin_orden_devuelve_las_mismas_notas():
+    notas = NotasColumnares.desde_tuplas([(0.0, 0.25, 60, 100)])
+    assert reordenar_ventanas(notas, orden=None) is notas
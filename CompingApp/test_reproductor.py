@@ -0,0 +1,82 @@
+from reproductor import Reproductor, eventos_desde_notas
+
+
+class PuertoFalso:
+    def __init__(self, reloj):
+        self.reloj = reloj
+        self.enviados = []
+
+    def send(self, mensaje):
+        self.enviados.append((round(self.reloj.ahora, 6),) + mensaje)
+
+
+class RelojFalso:
+    def __init__(self):
+        self.ahora = 100.0
+        self.detener_en = None
+
+    def __call__(self):
+        return self.ahora
+
+    def esperar(self, segundos):
+        if self.detener_en is not None and self.ahora + segundos > self.detener_en:
+            self.ahora = self.detener_en
+            return True
+        self.ahora += segundos
+        return False
+
+
+def crear_reproductor():
+    reloj = RelojFalso()
+    puerto = PuertoFalso(reloj)
+    reproductor = Reproductor(
+        puerto,
+        crear_mensaje=lambda tipo, altura, vel: (tipo, altura, vel),
+        reloj=reloj,
+        esperar=reloj.esperar,
+    )
+    return reproductor, puerto, reloj
+
+
+def test_eventos_ordenados_con_note_off_primero():
+    notas = [(0.0, 0.5, 60, 90), (0.5, 1.0, 60, 80), (0.25, 0.5, 200, 80)]
+    assert list(eventos_desde_notas(notas)) == [
+        (0.0, "note_on", 60, 90),
+        (0.5, "note_off", 60, 0),
+        (0.5, "note_on", 60, 80),
+        (1.0, "note_off", 60, 0),
+    ]
+
+
+def test_programa_los_eventos_en_su_tiempo():
+    reproductor, puerto, _ = crear_reproductor()
+    assert reproductor.reproducir([(0.0, 0.25, 60, 90), (0.5, 0.75, 64, 90)])
+    assert puerto.enviados == [
+        (100.0, "note_on", 60, 90),
+        (100.25, "note_off", 60, 0),
+        (100.5, "note_on", 64, 90),
+        (100.75, "note_off", 64, 0),
+    ]
+
+
+def test_los_retrasos_no_se_acumulan():
+    reproductor, puerto, reloj = crear_reproductor()
+
+    def notas_lentas():
+        yield (0.0, 0.1, 60, 90)
+        reloj.ahora += 0.3  # cálculo lento del siguiente compás
+        yield (0.2, 0.3, 62, 90)
+        yield (1.0, 1.1, 64, 90)
+
+    reproductor.reproducir(notas_lentas())
+    tiempos = [t for t, tipo, altura, _ in puerto.enviados if tipo == "note_on"]
+    # La nota atrasada sale en cuanto está lista y la siguiente vuelve a su hora.
+    assert tiempos == [100.0, 100.3, 101.0]
+
+
+def test_detener_apaga_las_notas_que_suenan():
+    reproductor, puerto, reloj = crear_reproductor()
+    reloj.detener_en = 100.5
+    terminado = reproductor.reproducir([(0.0, 2.0, 60, 90), (1.0, 2.0, 64, 90)])
+    assert not terminado
+    assert puerto.enviados == [(100.0, "note_on", 60, 90), (100.5, "note_off", 60, 0)]
@@ -1,3 +1,5 @@
+import random
+
 from procesa_midi import aplicar_rotaciones
 
 class Note:
@@ -48,3 +50,44 @@ def test_rotacion_forzada_duracion_completa():
         assert grupos[i] == [64, 67, 72, 72]
     for i in range(4, 8):
         assert grupos[i] == [61, 65, 68, 73]
+
+
+def rotar_paso_a_paso(notas, rot):
+    # Implementación original: subir la más grave (o bajar la más aguda) una
+    # octava, un paso cada vez.
+    for _ in range(abs(rot)):
+        if rot > 0:
+            min(notas, key=lambda n: n.pitch).pitch += 12
+        else:
+            max(notas, key=lambda n: n.pitch).pitch -= 12
+
+
+def test_rotacion_coincide_con_el_calculo_paso_a_paso():
+    rnd = random.Random(0)
+    for _ in range(500):
+        alturas = [rnd.choice([48, 55, 60, 60, 64, 67, 72, 79, rnd.randint(36, 90)])
+                   for _ in range(rnd.randint(1, 6))]
+        rot = rnd.randint(-9, 9)
+        notas = [Note(p, 0.5) for p in alturas]
+        esperadas = [Note(p, 0.5) for p in alturas]
+        aplicar_rotaciones(notas, rotacion=rot)
+        rotar_paso_a_paso(esperadas, rot)
+        assert [n.pitch for n in notas] == [n.pitch for n in esperadas]
+
+
+def test_agrupa_por_corchea():
+    # Notas con inicios que solo difieren por redondeo forman un mismo acorde.
+    notas = [Note(60, 0.1 + 0.2), Note(64, 0.3), Note(67, 0.30000000001)]
+    aplicar_rotaciones(notas, rotacion=1, dur_corchea=0.1)
+    assert [n.pitch for n in notas] == [72, 64, 67]
+
+
+def test_una_nota_en_la_segunda_mitad_de_la_corchea_no_pasa_a_la_siguiente():
+    # Referencia fuera de la rejilla: una nota suelta a 0.15 s sigue en la
+    # primera corchea y no le quita la rotación al acorde de la segunda.
+    notas = [Note(60, 0.0), Note(64, 0.0), Note(67, 0.0), Note(60, 0.15)]
+    notas += [Note(p, 0.25) for p in (65, 69, 72, 75)]
+    aplicar_rotaciones(notas, rotacion=1)
+    grupos = group_pitches(notas)
+    assert grupos[0.25] == [69, 72, 75, 77]
+    assert sorted(grupos[0.0] + grupos[0.15]) == [60, 64, 67, 72]
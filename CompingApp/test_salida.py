@@ -0,0 +1,62 @@
+import threading
+
+from salida import ARCHIVO_CONTADOR, EscritorSalida
+
+
+class MidiFalso:
+    def __init__(self, contenido=b"MThd"):
+        self.contenido = contenido
+
+    def write(self, ruta):
+        with open(ruta, "wb") as f:
+            f.write(self.contenido)
+
+
+def test_numera_de_forma_consecutiva(tmp_path, capsys):
+    escritor = EscritorSalida(tmp_path)
+    rutas = [escritor.escribir(MidiFalso()) for _ in range(3)]
+    assert [r.name for r in rutas] == ["1.mid", "2.mid", "3.mid"]
+    assert (tmp_path / ARCHIVO_CONTADOR).read_text() == "4"
+    assert rutas[0].read_bytes() == b"MThd"
+    salida = capsys.readouterr().out
+    assert salida.count("Archivo exportado") == 3
+    assert "2.mid\n3.mid" not in salida
+
+
+def test_continua_tras_archivos_existentes(tmp_path):
+    (tmp_path / "7.mid").write_bytes(b"")
+    (tmp_path / "notas.mid").write_bytes(b"")
+    assert EscritorSalida(tmp_path).escribir(MidiFalso()).name == "8.mid"
+
+
+def test_contador_atrasado_o_danado(tmp_path):
+    (tmp_path / "1.mid").write_bytes(b"")
+    (tmp_path / "2.mid").write_bytes(b"")
+    (tmp_path / ARCHIVO_CONTADOR).write_text("1")
+    assert EscritorSalida(tmp_path).reservar().name == "3.mid"
+    (tmp_path / ARCHIVO_CONTADOR).write_text("basura")
+    assert EscritorSalida(tmp_path).reservar().name == "4.mid"
+
+
+def test_resumen_en_lugar_del_listado(tmp_path, capsys):
+    escritor = EscritorSalida(tmp_path)
+    escritor.escribir(MidiFalso())
+    escritor.escribir(MidiFalso(), resumen=True)
+    assert "Exportados en esta sesión: 2" in capsys.readouterr().out
+
+
+def test_escrituras_concurrentes_no_se_pisan(tmp_path):
+    rutas = []
+
+    def exportar():
+        escritor = EscritorSalida(tmp_path)
+        for _ in range(20):
+            rutas.append(escritor.reservar())
+
+    hilos = [threading.Thread(target=exportar) for _ in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert len(set(rutas)) == 160
+    assert sorted(int(r.stem) for r in rutas) == list(range(1, 161))
@@ -0,0 +1,61 @@
+from notas_columnares import NotasColumnares
+import procesa_midi as pm
+
+
+def ritmo(compases):
+    notas = []
+    for i in range(compases * 8):
+        for altura in (60, 64, 67, 71):
+            notas.append((i * 0.25, i * 0.25 + 0.2, altura, 90))
+    return NotasColumnares.desde_tuplas(notas)
+
+
+def ritmo_ligado(compases):
+    # Notas largas que cruzan compases, silencios y notas que empiezan a la vez.
+    notas = []
+    for i in range(0, compases * 8, 3):
+        notas.append((i * 0.25, i * 0.25 + 0.9, 48 + i % 24, 80))
+        notas.append((i * 0.25, i * 0.25 + 0.1, 60, 80))
+    notas.append((1.9, 5.0, 55, 100))
+    return NotasColumnares.desde_tuplas(notas)
+
+
+def voicear(notas, cifrado, **opciones):
+    plantilla = pm.compilar_plantilla(notas)
+    resultado = NotasColumnares()
+    for bloque in pm.voicear_plantilla(plantilla, cifrado, **opciones):
+        resultado.extender(bloque)
+    return list(resultado.tuplas())
+
+
+def test_compases_y_secciones_del_cifrado():
+    cifrado = "|| [A] Dm7 G7 | C∆ || [B] F | Bb7 | [C] Eb"
+    compases, inicios = pm.compases_cifrado(cifrado)
+    assert compases == [["Dm7", "G7"], ["C∆"], ["F"], ["Bb7"], ["Eb"]]
+    assert inicios == [2, 4]
+    assert pm.secciones_cifrado(cifrado, 40, 8) == [(0, 16), (16, 32), (32, 40)]
+    assert pm.secciones_cifrado(cifrado, 20, 8) == [(0, 16), (16, 20)]
+
+
+def test_las_marcas_no_cambian_el_render_normal():
+    assert voicear(ritmo(3), "[A] C∆ | G7 || Dm7") == voicear(ritmo(3), "C∆ | G7 | Dm7")
+    assert voicear(ritmo(3), "C∆ | G7 | Dm7", secciones=True) == voicear(
+        ritmo(3), "C∆ | G7 | Dm7"
+    )
+
+
+def test_cada_seccion_empieza_como_un_cifrado_nuevo():
+    seccionado = voicear(ritmo(4), "C∆ | G7 || Dm7 | G7", secciones=True, procesos=1)
+    segunda = [(round(s - 4.0, 6), round(e - 4.0, 6), p, v)
+               for s, e, p, v in seccionado if s >= 4.0]
+    nuevo = [(round(s, 6), round(e, 6), p, v) for s, e, p, v in voicear(ritmo(2), "Dm7 | G7")]
+    assert segunda == nuevo
+    assert seccionado != voicear(ritmo(4), "C∆ | G7 | Dm7 | G7")
+
+
+def test_secciones_en_paralelo_coinciden_con_el_orden_secuencial():
+    cifrado = "[A] Dm7 G7 | C∆ | A7 || [B] F#m7(b5) B7 | Em7 | [C] A7 | Dm7 G7 | C∆"
+    for notas in (ritmo(8), ritmo_ligado(8)):
+        secuencial = voicear(notas, cifrado, secciones=True, procesos=1)
+        paralelo = voicear(notas, cifrado, secciones=True, procesos=2)
+        assert paralelo == secuencial
@@ -1,4 +1,9 @@
+import random
 import types
+
+import pytest
+
+from notas_columnares import NotasColumnares
 from procesa_midi import evitar_solapamientos
 
 class DummyNote:
@@ -20,3 +25,33 @@ def test_no_cambio_sin_solapamiento():
     notas = [n1, n2]
     evitar_solapamientos(notas)
     assert n1.end == 0.5
+
+def test_recorta_aunque_haya_otras_notas_entre_medias():
+    n1 = DummyNote(0.0, 1.0, 60)
+    n2 = DummyNote(0.5, 1.0, 64)
+    n3 = DummyNote(0.9, 1.5, 60)
+    notas = [n1, n2, n3]
+    evitar_solapamientos(notas)
+    assert n1.end == pytest.approx(0.89)
+    assert n2.end == 1.0 and n3.end == 1.5
+
+
+def test_estres_100k_notas():
+    rnd = random.Random(0)
+    tuplas = []
+    for _ in range(100_000):
+        inicio = rnd.randrange(200_000) * 0.01
+        tuplas.append((inicio, inicio + rnd.choice([0.05, 0.25, 1.0, 4.0]), rnd.randint(36, 84), 100))
+    notas = NotasColumnares.desde_tuplas(tuplas)
+    originales = {}
+    for inicio, fin, altura, _ in tuplas:
+        originales.setdefault((inicio, altura), []).append(fin)
+
+    evitar_solapamientos(notas)
+
+    ultima = {}
+    for inicio, fin, altura, _ in notas.tuplas():
+        assert inicio <= fin <= max(originales[(inicio, altura)])
+        if altura in ultima:
+            assert ultima[altura] <= inicio
+        ultima[altura] = fin
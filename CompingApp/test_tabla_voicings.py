@@ -0,0 +1,65 @@
+import random
+
+import cache_disco
+import procesa_midi as pm
+from cifrado_utils import analizar_acorde
+from procesa_midi import notas_midi_acorde, notas_naturales
+from tabla_voicings import BAJO_MAXIMO, BAJO_MINIMO, TablaVoicings, vocabulario
+
+
+def test_vocabulario_cubre_los_acordes_analizados():
+    grados = set(vocabulario())
+    sufijos = ["", "7", "∆", "m7", "m6", "6", "ø", "º7", "+7", "sus4", "m∆", "7(b5)"]
+    extensiones = ["", "(9)", "(b9)", "(#9)", "(11)", "(#11)", "(13)", "(b13)",
+                   "(b9,#11)", "(#9,b13)", "9", "13"]
+    for sufijo in sufijos:
+        for extension in extensiones:
+            assert analizar_acorde("C" + sufijo + extension)[1] in grados
+
+
+def test_tabla_coincide_con_notas_midi_acorde():
+    tabla = pm.tabla_voicings()
+    rnd = random.Random(0)
+    grados = vocabulario() + [(0, 4, 7, 14)]
+    raices = list(notas_naturales)
+    for _ in range(2000):
+        fundamental = rnd.choice(raices)
+        g = rnd.choice(grados)
+        prev_bajo = rnd.choice([None, rnd.randint(BAJO_MINIMO - 10, BAJO_MAXIMO + 10)])
+        inversion = rnd.randrange(4)
+        esperado = notas_midi_acorde(fundamental, g, prev_bajo=prev_bajo, inversion=inversion)
+        for _ in range(2):
+            obtenido = tabla.voicing(notas_naturales[fundamental], g, prev_bajo, inversion)
+            assert list(obtenido) == esperado
+
+
+def test_verificar_detecta_entradas_incorrectas():
+    tabla = TablaVoicings(pm._notas_midi_acorde.__wrapped__)
+    g = vocabulario()[0]
+    for prev_bajo in range(55, 60):
+        tabla.voicing(2, g, prev_bajo)
+    assert tabla.verificar() == []
+
+    k = tabla._posicion(2, g, 57, 0)
+    tabla.datos[k + 3] += 1
+    errores = tabla.verificar()
+    assert [argumentos for argumentos, _, _ in errores] == [(2, g, 57, 0)]
+
+
+def test_tabla_completa_se_comparte_por_la_cache(tmp_path):
+    llamadas = []
+
+    def funcion(clase, grados, base_octava, prev_bajo, inversion):
+        llamadas.append(prev_bajo)
+        return (50 + clase, 54 + clase, 57 + clase, 60 + inversion)
+
+    cache = cache_disco.CacheDisco(tmp_path)
+    TablaVoicings(funcion, cache).construir(cache)
+    llamadas.clear()
+
+    tabla = TablaVoicings(funcion, cache)
+    assert isinstance(tabla.datos, memoryview)
+    assert tabla.voicing(3, vocabulario()[5], None, 2) == (53, 57, 60, 62)
+    assert tabla.voicing(3, vocabulario()[5], 60) == (53, 57, 60, 60)
+    assert llamadas == []
+    assert tabla.verificar() == []